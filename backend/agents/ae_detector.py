@@ -3,27 +3,17 @@ Adverse Event (AE) Detector Agent - Clinical Post-Surgery Focus
 Identifies adverse events in post-surgery patient calls with medical precision
 """
 
-from openai import OpenAI
-import json
-
-
-class AdverseEventDetector:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
-        
-    def analyze(self, current_text, conversation_history):
-        """
-        Analyze text for post-surgery adverse events with clinical precision
-        Returns: dict with detection results
-        """
-        
-        # Build context from conversation history
-        context = "\n".join([
-            f"{entry['speaker']}: {entry['text']}" 
-            for entry in conversation_history[-5:]  # Last 5 exchanges
-        ])
-        
-        prompt = f"""You are a clinical AI assistant analyzing post-surgery patient calls for adverse events.
+from agents.base import BaseAgent
+
+
+class AdverseEventDetector(BaseAgent):
+    name = 'ae'
+    error_label = 'AE Detection'
+    temperature = 0.3
+    flag_key = 'detected'
+    system_prompt = "You are a clinical adverse event detection expert for post-surgery patients. Respond ONLY with valid JSON, no other text. Be thorough and conservative - patient safety is paramount."
+
+    INSTRUCTIONS = """You are a clinical AI assistant analyzing post-surgery patient calls for adverse events.
 
 CRITICAL RED FLAGS (must detect):
 1. **Infection Symptoms:**
@@ -55,15 +45,12 @@ CRITICAL RED FLAGS (must detect):
 6. **Other Complications:**
    - Unable to urinate/move bowels
    - Confusion, disorientation
-   - Persistent nausea preventing eating/drinking
-
-Recent conversation context:
-{context}
+   - Persistent nausea preventing eating/drinking"""
 
-Current patient statement: {current_text}
+    CONTEXT_LABEL = "Recent conversation context:"
+    STATEMENT_LABEL = "Current patient statement:"
 
-Analyze if an adverse event is being reported. Respond in JSON format:
-{{
+    RESPONSE_SCHEMA = """{
     "detected": true/false,
     "confidence": 0-100,
     "ae_category": "infection/severe_pain/medication/bleeding/respiratory/other",
@@ -75,44 +62,21 @@ Analyze if an adverse event is being reported. Respond in JSON format:
     "description": "brief clinical description",
     "clinical_reasoning": "1-2 sentence justification for severity",
     "recommended_action": "specific next steps (immediate callback, ER visit, medication adjustment, etc.)"
-}}
+}"""
+
+    RESPONSE_FORMAT = f"""Analyze if an adverse event is being reported. Respond in JSON format:
+{RESPONSE_SCHEMA}
 
 Be conservative - flag anything potentially serious. Better safe than sorry."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a clinical adverse event detection expert for post-surgery patients. Respond ONLY with valid JSON, no other text. Be thorough and conservative - patient safety is paramount."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            
-            content = response.choices[0].message.content.strip()
-            # Try to extract JSON if there's extra text
-            if not content.startswith('{'):
-                start = content.find('{')
-                if start != -1:
-                    content = content[start:]
-            if not content.endswith('}'):
-                end = content.rfind('}')
-                if end != -1:
-                    content = content[:end+1]
-            
-            result = json.loads(content)
-            
-            if result.get('detected'):
-                severity_emoji = {"mild": "⚠️", "moderate": "🔴", "severe": "🚨"}
-                emoji = severity_emoji.get(result.get('severity', 'moderate'), "⚠️")
-                
-                # Enhanced message with clinical details
-                symptoms = ", ".join(result.get('specific_symptoms', ['adverse event']))
-                pain = f" (Pain: {result['pain_level']}/10)" if result.get('pain_level') else ""
-                result['message'] = f"{emoji} Post-Surgery AE Detected: {symptoms}{pain}"
-            
-            return result
-            
-        except Exception as e:
-            print(f"AE Detection Error: {e}")
-            return {"detected": False, "error": str(e)}
\ No newline at end of file
+    def decorate(self, result):
+        if result.get('detected'):
+            severity_emoji = {"mild": "⚠️", "moderate": "🔴", "severe": "🚨"}
+            emoji = severity_emoji.get(result.get('severity', 'moderate'), "⚠️")
+
+            # Enhanced message with clinical details
+            symptoms = ", ".join(result.get('specific_symptoms', ['adverse event']))
+            pain = f" (Pain: {result['pain_level']}/10)" if result.get('pain_level') else ""
+            result['message'] = f"{emoji} Post-Surgery AE Detected: {symptoms}{pain}"
+
+        return result
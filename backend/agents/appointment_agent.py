@@ -3,26 +3,17 @@ Appointment Agent - Post-Surgery Follow-up Management
 Identifies scheduling conflicts, missed appointments, and follow-up needs
 """
 
-from openai import OpenAI
-import json
+from agents.base import BaseAgent
 
 
-class AppointmentAgent:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
-        
-    def analyze(self, current_text, conversation_history):
-        """
-        Analyze text for post-surgery appointment and follow-up issues
-        Returns: dict with analysis results
-        """
-        
-        context = "\n".join([
-            f"{entry['speaker']}: {entry['text']}" 
-            for entry in conversation_history[-5:]
-        ])
-        
-        prompt = f"""You are a post-surgery appointment scheduling assistant. Analyze the conversation for scheduling issues.
+class AppointmentAgent(BaseAgent):
+    name = 'appointment'
+    error_label = 'Appointment Analysis'
+    temperature = 0.3
+    flag_key = 'issue_detected'
+    system_prompt = "You are a post-surgery appointment scheduling expert. Respond ONLY with valid JSON, no other text. Consider impact on patient recovery."
+
+    INSTRUCTIONS = """You are a post-surgery appointment scheduling assistant. Analyze the conversation for scheduling issues.
 
 DETECT:
 1. **Missed Appointments:**
@@ -46,64 +37,38 @@ DETECT:
 4. **Urgent Rescheduling:**
    - Symptoms require earlier follow-up
    - Post-op check needed sooner than scheduled
-   - Complication requiring re-evaluation
-
-Recent conversation:
-{context}
+   - Complication requiring re-evaluation"""
 
-Current statement: {current_text}
+    CONTEXT_LABEL = "Recent conversation:"
+    STATEMENT_LABEL = "Current statement:"
 
-Respond in JSON format:
-{{
+    RESPONSE_SCHEMA = """{
     "issue_detected": true/false,
     "issue_type": "missed_appointment/scheduling_conflict/follow_up_needed/urgent_reschedule",
-    "appointment_context": {{
+    "appointment_context": {
         "original_date": "if mentioned",
         "original_time": "if mentioned",
         "appointment_type": "follow-up/wound check/PT/suture removal/etc.",
         "days_post_surgery": "if calculable from context",
         "reason_for_issue": "why they missed or need to reschedule"
-    }},
+    },
     "urgency": "low/medium/high",
     "clinical_impact": "does this scheduling issue affect patient recovery? (yes/no/maybe)",
     "description": "brief description of scheduling issue",
     "suggested_action": "specific next steps (offer immediate reschedule, find alternative time, arrange transport, etc.)",
     "timeline": "when this needs to be resolved (today, this week, flexible)"
-}}"""
+}"""
+
+    RESPONSE_FORMAT = f"""Respond in JSON format:
+{RESPONSE_SCHEMA}"""
+
+    def decorate(self, result):
+        if result.get('issue_detected'):
+            issue_type = result.get('issue_type', 'scheduling issue')
+            urgency_emoji = {"low": "📅", "medium": "⚠️", "high": "🔴"}
+            emoji = urgency_emoji.get(result.get('urgency', 'medium'), "📅")
+            issue_label = issue_type.replace('_', ' ').title()
+            clinical_impact = " · Affects Recovery" if result.get('clinical_impact') == 'yes' else ""
+            result['message'] = f"{emoji} {issue_label}{clinical_impact}"
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are a post-surgery appointment scheduling expert. Respond ONLY with valid JSON, no other text. Consider impact on patient recovery."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.3
-            )
-            
-            content = response.choices[0].message.content.strip()
-            # Try to extract JSON if there's extra text
-            if not content.startswith('{'):
-                start = content.find('{')
-                if start != -1:
-                    content = content[start:]
-            if not content.endswith('}'):
-                end = content.rfind('}')
-                if end != -1:
-                    content = content[:end+1]
-            
-            result = json.loads(content)
-            
-            if result.get('issue_detected'):
-                issue_type = result.get('issue_type', 'scheduling issue')
-                urgency_emoji = {"low": "📅", "medium": "⚠️", "high": "🔴"}
-                emoji = urgency_emoji.get(result.get('urgency', 'medium'), "📅")
-                issue_label = issue_type.replace('_', ' ').title()
-                clinical_impact = " · Affects Recovery" if result.get('clinical_impact') == 'yes' else ""
-                result['message'] = f"{emoji} {issue_label}{clinical_impact}"
-            
-            return result
-            
-        except Exception as e:
-            print(f"Appointment Analysis Error: {e}")
-            return {"issue_detected": False, "error": str(e)}
\ No newline at end of file
+        return result
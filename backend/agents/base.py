@@ -0,0 +1,394 @@
+"""
+Base Agent
+Shared request/response handling for the OpenAI-backed clinical agents
+"""
+
+import json
+import threading
+import time
+from core.openai_pool import get_factory
+from core.deadline import is_timeout, retry_call, retry_call_async
+from core.scheduler import get_scheduler, is_rate_limited, scheduled, scheduled_async
+from agents.memo import ResultMemo, memo_key, normalize_text, prompt_version
+from agents.stream_json import IncrementalJSONParser
+
+
+def format_context(conversation_history, window=5):
+    """Render the last `window` transcript entries as speaker-prefixed lines"""
+    return "\n".join([
+        f"{entry['speaker']}: {entry['text']}"
+        for entry in conversation_history[-window:]
+    ])
+
+
+def extract_json(content):
+    """Parse a model response, tolerating text around the JSON object"""
+    content = content.strip()
+    if not content.startswith('{'):
+        start = content.find('{')
+        if start != -1:
+            content = content[start:]
+    if not content.endswith('}'):
+        end = content.rfind('}')
+        if end != -1:
+            content = content[:end+1]
+    return json.loads(content)
+
+
+def cached_prompt_tokens(usage):
+    """Prompt tokens the provider served from its prefix cache"""
+    details = getattr(usage, 'prompt_tokens_details', None)
+    # Older SDK models keep unknown fields as plain dicts
+    if isinstance(details, dict):
+        return details.get('cached_tokens') or 0
+    return getattr(details, 'cached_tokens', 0) or 0
+
+
+def usage_dict(usage, latency):
+    """Token usage and wall time of one completion as a plain dict"""
+    return {
+        "prompt_tokens": getattr(usage, 'prompt_tokens', 0) or 0,
+        "completion_tokens": getattr(usage, 'completion_tokens', 0) or 0,
+        "cached_tokens": cached_prompt_tokens(usage),
+        "latency": latency
+    }
+
+
+class StreamState:
+    """
+    Accumulates a streamed completion and reports the first partial result
+    worth acting on, as decided by the agent's `early_result` hook
+    """
+
+    def __init__(self, early_result):
+        self.parser = IncrementalJSONParser()
+        self.usage = None
+        self._early_result = early_result
+        self._early_sent = False
+
+    def consume(self, chunk):
+        """Feed one stream chunk; returns a partial result the first time one is ready"""
+        if getattr(chunk, 'usage', None):
+            self.usage = chunk.usage
+        for choice in chunk.choices:
+            if choice.delta and choice.delta.content:
+                self.parser.feed(choice.delta.content)
+        if self._early_sent:
+            return None
+        partial = self._early_result(self.parser.fields)
+        if partial is not None:
+            self._early_sent = True
+        return partial
+
+
+# Completion size assumed for the rate limiter until an agent has real usage
+COMPLETION_TOKEN_ESTIMATE = 400
+
+
+def estimate_tokens(messages, usage_stats):
+    """Rough token cost of a request (~4 characters per token) for the TPM budget"""
+    prompt = sum(len(message['content']) for message in messages) // 4
+    snapshot = usage_stats.snapshot()
+    completion = snapshot['avg_completion_tokens'] if snapshot['calls'] else COMPLETION_TOKEN_ESTIMATE
+    return prompt + int(completion)
+
+
+def settle_usage(model, estimate, usage):
+    """Let the scheduler swap a request's estimated tokens for the real count"""
+    actual = usage['prompt_tokens'] + usage['completion_tokens']
+    if actual:
+        get_scheduler().settle(model, estimate, actual)
+
+
+# Ask for the usage block on the final chunk of a streamed completion
+STREAM_OPTIONS = {"stream": True, "extra_body": {"stream_options": {"include_usage": True}}}
+
+
+class UsageStats:
+    """Thread-safe running totals of token usage and latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cached_tokens = 0
+        self.latency_total = 0.0
+
+    def record(self, prompt_tokens=0, completion_tokens=0, latency=0.0, cached_tokens=0):
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.cached_tokens += cached_tokens
+            self.latency_total += latency
+
+    def snapshot(self):
+        with self._lock:
+            calls = self.calls or 1
+            return {
+                "calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cached_tokens": self.cached_tokens,
+                "cache_hit_rate": self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+                "avg_prompt_tokens": self.prompt_tokens / calls,
+                "avg_completion_tokens": self.completion_tokens / calls,
+                "avg_latency": self.latency_total / calls
+            }
+
+
+class BaseAgent:
+    """
+    Common plumbing for a single-prompt JSON agent
+
+    Subclasses provide the static prompt pieces (INSTRUCTIONS,
+    RESPONSE_FORMAT, system_prompt) and a decorate() hook that adds the
+    human-readable alert message to a positive result.
+
+    Requests are laid out for provider-side prefix caching: a byte-stable
+    system message (role, instructions, JSON schema) built once per agent,
+    followed by a user message holding only the conversation: the session's
+    clinical summary (whole-call memory, see ClinicalState), the recent
+    context window and the current statement. Caching kicks
+    in once the shared prefix passes the provider minimum (1024 tokens for
+    OpenAI); `usage` tracks how many prompt tokens were served from cache.
+
+    Successful results are memoized per agent on the normalized statement
+    and context window, under a fingerprint of the prompt template
+    (`prompt_version`); refresh_prompt() invalidates the memo when it changes.
+    """
+
+    name = 'agent'
+    error_label = 'Agent'
+    model = "gpt-4o-mini"
+    temperature = 0.3
+    context_window = 5
+    flag_key = 'detected'
+    timeout = 20.0  # per-call seconds, overrides the pool default
+    max_retries = 2  # transient-error retries, bounded by the chunk deadline
+    system_prompt = ""
+
+    INSTRUCTIONS = ""
+    SUMMARY_LABEL = "Call so far:"
+    CONTEXT_LABEL = "Recent conversation:"
+    STATEMENT_LABEL = "Current statement:"
+    RESPONSE_FORMAT = ""
+
+    def __init__(self, api_key):
+        self.clients = get_factory(api_key)
+        # Retries are handled by retry_call() so they can respect the deadline
+        self.client = self.clients.client().with_options(max_retries=0)
+        self._async_client = None
+        self.usage = UsageStats()
+        self.memo = ResultMemo()
+        self.static_prefix = self.build_static_prefix()
+        self.prompt_version = self.build_prompt_version()
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = self.clients.async_client().with_options(max_retries=0)
+        return self._async_client
+
+    def build_static_prefix(self):
+        """Messages that never change between calls, so the provider can cache them"""
+        return [{
+            "role": "system",
+            "content": f"{self.system_prompt}\n\n{self.INSTRUCTIONS}\n\n{self.RESPONSE_FORMAT}"
+        }]
+
+    def build_prompt_version(self):
+        return prompt_version(
+            self.static_prefix[0]['content'], self.CONTEXT_LABEL, self.STATEMENT_LABEL, self.context_window
+        )
+
+    def refresh_prompt(self):
+        """Rebuild the prompt after a template change, dropping results memoized under the old one"""
+        self.static_prefix = self.build_static_prefix()
+        version = self.build_prompt_version()
+        if version != self.prompt_version:
+            print(f"🧹 {self.name} prompt changed ({self.prompt_version} -> {version}), memo invalidated")
+            self.prompt_version = version
+            self.memo.invalidate()
+
+    def memo_inputs(self, current_text, conversation_history, **inputs):
+        """Everything besides the template that shapes the request, normalized"""
+        normalized = [
+            normalize_text(current_text),
+            [[entry['speaker'], normalize_text(entry['text'])] for entry in conversation_history[-self.context_window:]]
+        ]
+        inputs = {key: value for key, value in inputs.items() if value}
+        if inputs:
+            normalized.append(sorted(inputs.items()))
+        return normalized
+
+    def memo_key(self, current_text, conversation_history, **inputs):
+        return memo_key(
+            self.name, self.prompt_version, self.model, self.temperature,
+            self.memo_inputs(current_text, conversation_history, **inputs)
+        )
+
+    def _recall(self, key):
+        return self.memo.get(key) if self.memo.enabled else None
+
+    def _remember(self, key, result):
+        self.memo.put(key, result)
+        return result
+
+    def build_prompt(self, current_text, context, summary=None, **inputs):
+        """User message; agent-specific `inputs` (e.g. acoustic features) come from analyze()"""
+        prompt = (
+            f"{self.CONTEXT_LABEL}\n{context}\n\n"
+            f"{self.STATEMENT_LABEL} {current_text}"
+        )
+        if summary:
+            prompt = f"{self.SUMMARY_LABEL}\n{summary}\n\n{prompt}"
+        return prompt
+
+    def build_messages(self, current_text, conversation_history, **inputs):
+        context = format_context(conversation_history, self.context_window)
+        return self.static_prefix + [
+            {"role": "user", "content": self.build_prompt(current_text, context, **inputs)}
+        ]
+
+    def decorate(self, result):
+        """Attach the alert message to a positive result"""
+        return result
+
+    def _request(self, current_text, conversation_history, **inputs):
+        return {
+            "model": self.model,
+            "messages": self.build_messages(current_text, conversation_history, **inputs),
+            "temperature": self.temperature
+        }
+
+    def early_result(self, fields):
+        """
+        Partial result that is safe to act on while the response is still
+        streaming, built from the top-level fields parsed so far; None to wait
+        """
+        return None
+
+    def _create(self, request, estimate, deadline, **options):
+        """One completion through the rate-limit scheduler, retried within the deadline"""
+        return retry_call(
+            scheduled(self.name, estimate, self.model, deadline,
+                      lambda timeout: self.client.chat.completions.create(**request, **options, timeout=timeout)),
+            self.timeout, deadline, self.max_retries
+        )
+
+    async def _create_async(self, request, estimate, deadline, **options):
+        return await retry_call_async(
+            scheduled_async(self.name, estimate, self.model, deadline,
+                            lambda timeout: self.async_client.chat.completions.create(**request, **options, timeout=timeout)),
+            self.timeout, deadline, self.max_retries
+        )
+
+    def _finish(self, content, usage, started, estimate):
+        usage = usage_dict(usage, time.perf_counter() - started)
+        self.usage.record(**usage)
+        settle_usage(self.model, estimate, usage)
+
+        result = self.decorate(extract_json(content))
+        result['usage'] = usage
+        return result
+
+    def _failed(self, error):
+        print(f"{self.error_label} Error: {error}")
+        result = {self.flag_key: False, "error": str(error)}
+        if is_timeout(error):
+            result['timed_out'] = True
+        elif is_rate_limited(error):
+            result['rate_limited'] = True
+        return result
+
+    def analyze(self, current_text, conversation_history, deadline=None, **inputs):
+        """
+        Run the agent on the current statement
+        Returns: dict with detection results plus a `usage` entry
+        """
+        key = self.memo_key(current_text, conversation_history, **inputs)
+        cached = self._recall(key)
+        if cached is not None:
+            return cached
+
+        request = self._request(current_text, conversation_history, **inputs)
+        estimate = estimate_tokens(request['messages'], self.usage)
+        try:
+            started = time.perf_counter()
+            response = self._create(request, estimate, deadline)
+            result = self._finish(response.choices[0].message.content, response.usage, started, estimate)
+            return self._remember(key, result)
+
+        except Exception as e:
+            return self._failed(e)
+
+    async def analyze_async(self, current_text, conversation_history, deadline=None, **inputs):
+        """Same as analyze(), awaiting the completion on the AsyncOpenAI client"""
+        key = self.memo_key(current_text, conversation_history, **inputs)
+        cached = self._recall(key)
+        if cached is not None:
+            return cached
+
+        request = self._request(current_text, conversation_history, **inputs)
+        estimate = estimate_tokens(request['messages'], self.usage)
+        try:
+            started = time.perf_counter()
+            response = await self._create_async(request, estimate, deadline)
+            result = self._finish(response.choices[0].message.content, response.usage, started, estimate)
+            return self._remember(key, result)
+
+        except Exception as e:
+            return self._failed(e)
+
+    def analyze_stream(self, current_text, conversation_history, on_early=None, deadline=None, **inputs):
+        """
+        Streaming variant of analyze(): on_early(name, partial) is called as
+        soon as early_result() accepts the fields parsed so far, before the
+        completion ends. Returns the full result like analyze().
+        Only opening the stream is retried; a stream that fails midway is not.
+        A memoized result is returned at once, without on_early.
+        """
+        key = self.memo_key(current_text, conversation_history, **inputs)
+        cached = self._recall(key)
+        if cached is not None:
+            return cached
+
+        request = self._request(current_text, conversation_history, **inputs)
+        estimate = estimate_tokens(request['messages'], self.usage)
+        try:
+            started = time.perf_counter()
+            state = StreamState(self.early_result)
+            stream = self._create(request, estimate, deadline, **STREAM_OPTIONS)
+            for chunk in stream:
+                partial = state.consume(chunk)
+                if partial is not None and on_early:
+                    on_early(self.name, partial)
+            return self._remember(key, self._finish(state.parser.text, state.usage, started, estimate))
+
+        except Exception as e:
+            return self._failed(e)
+
+    async def analyze_stream_async(self, current_text, conversation_history, on_early=None, deadline=None,
+                                   **inputs):
+        """Async counterpart of analyze_stream(); on_early is awaited"""
+        key = self.memo_key(current_text, conversation_history, **inputs)
+        cached = self._recall(key)
+        if cached is not None:
+            return cached
+
+        request = self._request(current_text, conversation_history, **inputs)
+        estimate = estimate_tokens(request['messages'], self.usage)
+        try:
+            started = time.perf_counter()
+            state = StreamState(self.early_result)
+            stream = await self._create_async(request, estimate, deadline, **STREAM_OPTIONS)
+            async for chunk in stream:
+                partial = state.consume(chunk)
+                if partial is not None and on_early:
+                    await on_early(self.name, partial)
+            return self._remember(key, self._finish(state.parser.text, state.usage, started, estimate))
+
+        except Exception as e:
+            return self._failed(e)
@@ -0,0 +1,211 @@
+"""
+Clinical State - Whole-call memory for the agents
+A per-session record of what the call has established so far (symptoms
+reported or denied, pain scores, temperatures, days since surgery,
+medications and appointments mentioned), updated incrementally from each
+utterance with the lexicon in clinical_terms.json, the vitals extractor's
+readings and a few patterns. It renders to a compact
+summary with a fixed character budget that every agent gets alongside the
+recent conversation, so a fever mentioned at minute 2 still counts at
+minute 12 without the prompt growing with the call.
+"""
+
+import os
+import re
+import threading
+from collections import deque
+from agents.red_flags import RedFlagMatcher
+from config import CLINICAL_SUMMARY_MAX_CHARS
+
+TERMS_PATH = os.path.join(os.path.dirname(__file__), 'clinical_terms.json')
+
+PAIN_TREND_RES = {
+    'worse': re.compile(r"\bpain\b[\w\s']{0,25}\b(?:worse|worsening|increasing|getting bad|unbearable)\b"
+                        r"|\b(?:worse|more) pain\b"),
+    'better': re.compile(r"\bpain\b[\w\s']{0,25}\b(?:better|improving|easing|less|going down)\b"
+                         r"|\bless pain\b"),
+}
+APPOINTMENT_RE = re.compile(
+    r"[^.?!]*\b(?:appointment|follow[- ]?up|check[- ]?up|visit|see (?:the|my) (?:doctor|surgeon))\b[^.?!]*"
+)
+APPOINTMENT_WHEN_RE = re.compile(
+    r"\b(?:monday|tuesday|wednesday|thursday|friday|saturday|sunday|tomorrow|today|next week|"
+    r"in \w+ (?:days?|weeks?)|\d{1,2}(?::\d{2})?\s*(?:am|pm)|january|february|march|april|may|june|july|"
+    r"august|september|october|november|december|cancel\w*|reschedul\w*|missed)\b"
+)
+
+MAX_PAIN_SCORES = 6
+MAX_TEMPERATURES = 3
+MAX_APPOINTMENTS = 3
+APPOINTMENT_CHARS = 70
+
+
+def _minute(seconds):
+    return int(seconds // 60)
+
+
+class ClinicalState:
+    """
+    Rolling clinical facts of one call
+
+    update() folds in one utterance (cheap: a lexicon pass and a few
+    regexes); render() returns the summary, cached until the next update
+    changes something. Every collection is bounded (symptoms and medications
+    by the lexicon, pain scores and appointments by count), and the rendered
+    text by `max_chars`, so its prompt cost is constant over the call.
+    """
+
+    _terms = None
+
+    def __init__(self, max_chars=CLINICAL_SUMMARY_MAX_CHARS):
+        self._lock = threading.Lock()
+        self.max_chars = max_chars
+        self.utterances = 0
+        self.last_minute = 0
+        self.symptoms = {}  # label -> {"first", "last", "mentions", "denied"}
+        self.medications = {}  # label -> {"first", "stopped"}
+        self.first_pain = None  # (minute, score)
+        self.pain_scores = deque(maxlen=MAX_PAIN_SCORES - 1)
+        self.pain_trend = None  # 'worse' / 'better', as last stated
+        self.temperatures = deque(maxlen=MAX_TEMPERATURES)  # (minute, °F)
+        self.post_op_days = None  # (days, minute stated)
+        self.appointments = deque(maxlen=MAX_APPOINTMENTS)
+        self._rendered = None
+
+    @classmethod
+    def terms(cls):
+        # Compiled once per process, shared by every session
+        if cls._terms is None:
+            cls._terms = RedFlagMatcher.load(TERMS_PATH, name="Clinical terms lexicon")
+        return cls._terms
+
+    @property
+    def enabled(self):
+        return self.max_chars > 0
+
+    def update(self, text, elapsed_seconds, readings=()):
+        """Fold one utterance, said `elapsed_seconds` into the call, and its vitals readings into the state"""
+        if not self.enabled or not text:
+            return
+        minute = _minute(elapsed_seconds)
+        lowered = text.lower().replace("’", "'")
+        terms = self.terms()
+        with self._lock:
+            self.utterances += 1
+            self.last_minute = minute
+            self._rendered = None
+            seen = set()
+            for flag_index, _, negated in terms.matches(text):
+                if flag_index in seen:
+                    continue  # first hit per term and utterance
+                seen.add(flag_index)
+                flag = terms.flags[flag_index]
+                if flag['kind'] == 'medication':
+                    entry = self.medications.setdefault(flag['label'], {"first": minute, "stopped": False})
+                    entry['stopped'] = negated
+                    continue
+                entry = self.symptoms.setdefault(
+                    flag['label'], {"first": None, "last": minute, "mentions": 0, "denied": False}
+                )
+                if negated:
+                    entry['denied'] = True
+                else:
+                    entry['first'] = minute if entry['first'] is None else entry['first']
+                    entry['last'] = minute
+                    entry['mentions'] += 1
+                    entry['denied'] = False
+
+            for reading in readings:
+                if reading['kind'] == 'pain':
+                    if self.first_pain is None:
+                        self.first_pain = (minute, reading['value'])
+                    elif reading['value'] != self._pain_history()[-1][1]:
+                        self.pain_scores.append((minute, reading['value']))
+                elif reading['kind'] == 'temperature':
+                    self.temperatures.append((minute, reading['value']))
+                elif reading['kind'] == 'post_op_day':
+                    self.post_op_days = (reading['value'], minute)
+            for trend, pattern in PAIN_TREND_RES.items():
+                if pattern.search(lowered):
+                    self.pain_trend = trend
+
+            for match in APPOINTMENT_RE.finditer(lowered):
+                mention = match.group(0).strip(" ,;")
+                if APPOINTMENT_WHEN_RE.search(mention):
+                    mention = mention[-APPOINTMENT_CHARS:]
+                    if mention not in self.appointments:
+                        self.appointments.append(mention)
+
+    def _pain_history(self):
+        # The first rating is kept for the whole call, then the latest few
+        return ([self.first_pain] if self.first_pain else []) + list(self.pain_scores)
+
+    def _symptom(self, label, entry):
+        detail = f"min {entry['first']}"
+        if entry['last'] != entry['first']:
+            detail += f"-{entry['last']}"
+        if entry['mentions'] > 1:
+            detail += f", {entry['mentions']}x"
+        if entry['denied']:
+            detail += ", later denied"
+        return f"{label} ({detail})"
+
+    def _lines(self):
+        lines = []
+        reported = [(label, entry) for label, entry in self.symptoms.items() if entry['mentions']]
+        # Latest first, so the budget cut drops the oldest news
+        reported.sort(key=lambda item: item[1]['last'], reverse=True)
+        if reported:
+            lines.append("- Symptoms: " + "; ".join(self._symptom(label, entry) for label, entry in reported))
+        denied = [label for label, entry in self.symptoms.items() if not entry['mentions']]
+        if denied:
+            lines.append("- Denied: " + ", ".join(denied))
+        if self.first_pain is not None:
+            pain = " -> ".join(f"{score}/10 (min {minute})" for minute, score in self._pain_history())
+            if self.pain_trend:
+                pain += f"; says it is getting {self.pain_trend}"
+            lines.append(f"- Pain: {pain}")
+        elif self.pain_trend:
+            lines.append(f"- Pain: says it is getting {self.pain_trend}")
+        if self.temperatures:
+            lines.append("- Temperature: " + ", ".join(
+                f"{fahrenheit:g}°F (min {minute})" for minute, fahrenheit in self.temperatures
+            ))
+        if self.post_op_days is not None:
+            days, minute = self.post_op_days
+            lines.append(f"- Post-op: day {days} (stated at min {minute})")
+        if self.medications:
+            lines.append("- Medications: " + ", ".join(
+                f"{label}{' (not taking)' if entry['stopped'] else ''}" for label, entry in self.medications.items()
+            ))
+        if self.appointments:
+            lines.append("- Appointments: " + "; ".join(f'"{mention}"' for mention in self.appointments))
+        return lines
+
+    def render(self):
+        """Summary for the agents' prompts (empty until something clinical was said)"""
+        with self._lock:
+            if self._rendered is None:
+                lines = self._lines()
+                if not lines:
+                    self._rendered = ""
+                else:
+                    # Clinical facts only: a call-time header would make every memo key unique (see memo_inputs)
+                    summary = "\n".join(lines)
+                    if len(summary) > self.max_chars:
+                        summary = summary[:self.max_chars - 3].rstrip() + "..."
+                    self._rendered = summary
+            return self._rendered
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "utterances": self.utterances,
+                "symptoms": {label: dict(entry) for label, entry in self.symptoms.items()},
+                "pain_scores": [list(score) for score in self._pain_history()],
+                "pain_trend": self.pain_trend,
+                "temperatures": [list(temperature) for temperature in self.temperatures],
+                "post_op_days": self.post_op_days[0] if self.post_op_days else None,
+                "medications": {label: dict(entry) for label, entry in self.medications.items()},
+                "appointments": list(self.appointments)
+            }
@@ -3,26 +3,17 @@ Emergency Detector Agent - Post-Surgery Emergency Focus
 Identifies sudden health concerns requiring immediate medical attention
 """
 
-from openai import OpenAI
-import json
+from agents.base import BaseAgent
 
 
-class EmergencyDetector:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
-        
-    def analyze(self, current_text, conversation_history):
-        """
-        Analyze text for post-surgery emergencies requiring immediate action
-        Returns: dict with detection results
-        """
-        
-        context = "\n".join([
-            f"{entry['speaker']}: {entry['text']}" 
-            for entry in conversation_history[-5:]
-        ])
-        
-        prompt = f"""You are an emergency medical triage system specializing in post-surgery complications.
+class EmergencyDetector(BaseAgent):
+    name = 'emergency'
+    error_label = 'Emergency Detection'
+    temperature = 0.2
+    flag_key = 'is_emergency'
+    system_prompt = "You are an emergency medical triage expert for post-surgery patients. Respond ONLY with valid JSON, no other text. Patient safety is paramount - when in doubt, escalate."
+
+    INSTRUCTIONS = """You are an emergency medical triage system specializing in post-surgery complications.
 
 POST-SURGERY EMERGENCIES (require immediate action):
 
@@ -52,61 +43,42 @@ POST-SURGERY EMERGENCIES (require immediate action):
 - Low-grade fever (100-101°F)
 - Moderate wound drainage
 - Pain increasing gradually
-- Mild swelling at surgical site
-
-Recent conversation:
-{context}
+- Mild swelling at surgical site"""
 
-Current patient statement: {current_text}
+    CONTEXT_LABEL = "Recent conversation:"
+    STATEMENT_LABEL = "Current patient statement:"
 
-Respond in JSON format:
-{{
+    RESPONSE_SCHEMA = """{
     "is_emergency": true/false,
     "severity": "critical/urgent/moderate",
     "emergency_type": "type of emergency",
+    "action": "specific immediate action (Call 911, Go to ER, Call surgeon immediately, etc.)",
     "confidence": 0-100,
     "post_surgery_complication": "specific complication type (PE, infection, DVT, etc.)",
     "symptoms_duration": "how long symptoms present if mentioned",
-    "vital_signs_mentioned": {{"fever": "temp if mentioned", "pain_level": "0-10 if mentioned"}},
+    "vital_signs_mentioned": {"fever": "temp if mentioned", "pain_level": "0-10 if mentioned"},
     "symptoms": ["list of concerning symptoms"],
-    "action": "specific immediate action (Call 911, Go to ER, Call surgeon immediately, etc.)",
     "time_sensitivity": "immediate/within 1 hour/within 24 hours",
     "description": "brief clinical explanation"
-}}
+}"""
+
+    # Keys are ordered so the decision (is_emergency, severity, action) streams first
+    RESPONSE_FORMAT = f"""Respond in JSON format, keeping the keys in this order:
+{RESPONSE_SCHEMA}
 
 Be cautious - err on the side of escalation for patient safety."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": "You are an emergency medical triage expert for post-surgery patients. Respond ONLY with valid JSON, no other text. Patient safety is paramount - when in doubt, escalate."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.2
-            )
-            
-            content = response.choices[0].message.content.strip()
-            # Try to extract JSON if there's extra text
-            if not content.startswith('{'):
-                start = content.find('{')
-                if start != -1:
-                    content = content[start:]
-            if not content.endswith('}'):
-                end = content.rfind('}')
-                if end != -1:
-                    content = content[:end+1]
-            
-            result = json.loads(content)
-            
-            if result.get('is_emergency'):
-                severity = result.get('severity', 'urgent')
-                emoji = "🚨" if severity == "critical" else "⚠️" if severity == "urgent" else "🔴"
-                emergency_type = result.get('emergency_type', 'Emergency')
-                result['message'] = f"{emoji} {emergency_type}"
-            
-            return result
-            
-        except Exception as e:
-            print(f"Emergency Detection Error: {e}")
-            return {"is_emergency": False, "error": str(e)}
\ No newline at end of file
+    def early_result(self, fields):
+        """Dispatch as soon as the stream has committed to an emergency and its action"""
+        if fields.get('is_emergency') is True and 'severity' in fields and 'action' in fields:
+            return self.decorate(dict(fields))
+        return None
+
+    def decorate(self, result):
+        if result.get('is_emergency'):
+            severity = result.get('severity', 'urgent')
+            emoji = "🚨" if severity == "critical" else "⚠️" if severity == "urgent" else "🔴"
+            emergency_type = result.get('emergency_type', 'Emergency')
+            result['message'] = f"{emoji} {emergency_type}"
+
+        return result
@@ -0,0 +1,297 @@
+"""
+Fused Analyzer - Single-call AE, appointment and emergency analysis
+Sends the conversation context once and gets all three agent answers back
+in one JSON object, keyed exactly like the parallel three-call path
+"""
+
+import time
+from core.openai_pool import get_factory
+from core.deadline import is_timeout, retry_call, retry_call_async
+from core.scheduler import is_rate_limited, scheduled, scheduled_async
+from agents.base import (
+    STREAM_OPTIONS, StreamState, UsageStats, estimate_tokens, extract_json, format_context,
+    settle_usage, usage_dict
+)
+
+
+class FusedAnalyzer:
+    model = "gpt-4o-mini"
+    temperature = 0.2
+    context_window = 5
+    timeout = 30.0
+    max_retries = 2
+    work_class = 'emergency'  # carries the emergency analysis, so it gets its priority
+
+    system_prompt = "You are a post-surgery clinical call analysis system running three analyses at once: adverse event detection, appointment scheduling and emergency triage. Respond ONLY with valid JSON, no other text. Patient safety is paramount - when in doubt, escalate."
+
+    SECTION_TITLES = {
+        'ae': "ADVERSE EVENT DETECTION",
+        'appointment': "APPOINTMENT & FOLLOW-UP ISSUES",
+        'emergency': "EMERGENCY TRIAGE",
+    }
+
+    def __init__(self, api_key, agents):
+        """
+        Args:
+            api_key: OpenAI API key
+            agents: the AE, appointment and emergency agent instances; their
+                instructions, schemas and message formatting are reused
+        """
+        self.clients = get_factory(api_key)
+        self.client = self.clients.client().with_options(max_retries=0)
+        self._async_client = None
+        self.agents = {agent.name: agent for agent in agents}
+        self.usage = UsageStats()
+        self.static_prefix = self.build_static_prefix()
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            self._async_client = self.clients.async_client().with_options(max_retries=0)
+        return self._async_client
+
+    def build_static_prefix(self):
+        """Byte-stable system message (see BaseAgent) shared by every fused call"""
+        sections = []
+        for key, agent in self.agents.items():
+            sections.append(
+                f"=== {self.SECTION_TITLES.get(key, key.upper())} (JSON key \"{key}\") ===\n"
+                f"{agent.INSTRUCTIONS}\n\n"
+                f"Schema for \"{key}\":\n{agent.RESPONSE_SCHEMA}"
+            )
+        analyses = "\n\n".join(sections)
+        keys = ", ".join(f'"{key}": {{...}}' for key in self.agents)
+        content = f"""{self.system_prompt}
+
+Run each of the following analyses on the same conversation.
+
+{analyses}
+
+Respond with ONE JSON object holding every analysis under its key:
+{{{keys}}}
+
+Be conservative - flag anything potentially serious and err on the side of escalation."""
+        return [{"role": "system", "content": content}]
+
+    def build_messages(self, current_text, conversation_history, summary=None):
+        context = format_context(conversation_history, self.context_window)
+        content = f"Recent conversation:\n{context}\n\nCurrent patient statement: {current_text}"
+        if summary:
+            content = f"Call so far:\n{summary}\n\n{content}"
+        return self.static_prefix + [{"role": "user", "content": content}]
+
+    def _baseline_prompt_chars(self, current_text, conversation_history, summary=None):
+        """Characters the three separate agent requests would have sent"""
+        return sum(
+            len(message['content'])
+            for agent in self.agents.values()
+            for message in agent.build_messages(current_text, conversation_history, summary=summary)
+        )
+
+    def _request(self, messages):
+        return {
+            "model": self.model,
+            "messages": messages,
+            "temperature": self.temperature,
+            "response_format": {"type": "json_object"}
+        }
+
+    def early_result(self, fields):
+        """
+        (key, partial) for the first completed section its agent deems safe to
+        act on early. Sections stream in prompt order, so list the emergency
+        agent first to get its alert out before the other sections are written.
+        """
+        for key, agent in self.agents.items():
+            section = fields.get(key)
+            if isinstance(section, dict):
+                partial = agent.early_result(section)
+                if partial is not None:
+                    return key, partial
+        return None
+
+    def _create(self, request, estimate, deadline, **options):
+        """One completion through the rate-limit scheduler, retried within the deadline"""
+        return retry_call(
+            scheduled(self.work_class, estimate, self.model, deadline,
+                      lambda timeout: self.client.chat.completions.create(**request, **options, timeout=timeout)),
+            self.timeout, deadline, self.max_retries
+        )
+
+    async def _create_async(self, request, estimate, deadline, **options):
+        return await retry_call_async(
+            scheduled_async(self.work_class, estimate, self.model, deadline,
+                            lambda timeout: self.async_client.chat.completions.create(**request, **options, timeout=timeout)),
+            self.timeout, deadline, self.max_retries
+        )
+
+    def _finish(self, content, usage, started, estimate, messages, current_text, conversation_history, summary=None):
+        usage = usage_dict(usage, time.perf_counter() - started)
+        self.usage.record(**usage)
+        settle_usage(self.model, estimate, usage)
+
+        # Estimate what the three-call path would have sent, scaling the
+        # measured prompt tokens by the prompt size ratio
+        fused_chars = sum(len(message['content']) for message in messages) or 1
+        baseline_chars = self._baseline_prompt_chars(current_text, conversation_history, summary)
+        usage['baseline_prompt_tokens'] = round(usage['prompt_tokens'] * baseline_chars / fused_chars)
+
+        combined = extract_json(content)
+        results = {}
+        for key, agent in self.agents.items():
+            section = combined.get(key)
+            if isinstance(section, dict):
+                results[key] = agent.decorate(section)
+            else:
+                results[key] = {agent.flag_key: False, "error": f"'{key}' missing from fused response"}
+        results['usage'] = usage
+        return results
+
+    def _failed(self, error):
+        print(f"Fused Analysis Error: {error}")
+        results = {}
+        for key, agent in self.agents.items():
+            results[key] = {agent.flag_key: False, "error": str(error)}
+            if is_timeout(error):
+                results[key]['timed_out'] = True
+            elif is_rate_limited(error):
+                results[key]['rate_limited'] = True
+        return results
+
+    def analyze(self, current_text, conversation_history, deadline=None, summary=None):
+        """
+        Run all three analyses in one completion
+        Returns: dict keyed by agent name ('ae', 'appointment', 'emergency')
+                 plus a `usage` entry for the single request
+        """
+        messages = self.build_messages(current_text, conversation_history, summary)
+        request = self._request(messages)
+        estimate = estimate_tokens(messages, self.usage)
+
+        try:
+            started = time.perf_counter()
+            response = self._create(request, estimate, deadline)
+            return self._finish(
+                response.choices[0].message.content, response.usage, started, estimate,
+                messages, current_text, conversation_history, summary
+            )
+
+        except Exception as e:
+            return self._failed(e)
+
+    async def analyze_async(self, current_text, conversation_history, deadline=None, summary=None):
+        """Same as analyze(), awaiting the completion on the AsyncOpenAI client"""
+        messages = self.build_messages(current_text, conversation_history, summary)
+        request = self._request(messages)
+        estimate = estimate_tokens(messages, self.usage)
+
+        try:
+            started = time.perf_counter()
+            response = await self._create_async(request, estimate, deadline)
+            return self._finish(
+                response.choices[0].message.content, response.usage, started, estimate,
+                messages, current_text, conversation_history, summary
+            )
+
+        except Exception as e:
+            return self._failed(e)
+
+    def analyze_stream(self, current_text, conversation_history, on_early=None, deadline=None, summary=None):
+        """Streaming variant of analyze(); see BaseAgent.analyze_stream"""
+        messages = self.build_messages(current_text, conversation_history, summary)
+        request = self._request(messages)
+        estimate = estimate_tokens(messages, self.usage)
+
+        try:
+            started = time.perf_counter()
+            state = StreamState(self.early_result)
+            stream = self._create(request, estimate, deadline, **STREAM_OPTIONS)
+            for chunk in stream:
+                early = state.consume(chunk)
+                if early is not None and on_early:
+                    on_early(*early)
+            return self._finish(
+                state.parser.text, state.usage, started, estimate,
+                messages, current_text, conversation_history, summary
+            )
+
+        except Exception as e:
+            return self._failed(e)
+
+    async def analyze_stream_async(self, current_text, conversation_history, on_early=None, deadline=None,
+                                   summary=None):
+        """Async counterpart of analyze_stream(); on_early is awaited"""
+        messages = self.build_messages(current_text, conversation_history, summary)
+        request = self._request(messages)
+        estimate = estimate_tokens(messages, self.usage)
+
+        try:
+            started = time.perf_counter()
+            state = StreamState(self.early_result)
+            stream = await self._create_async(request, estimate, deadline, **STREAM_OPTIONS)
+            async for chunk in stream:
+                early = state.consume(chunk)
+                if early is not None and on_early:
+                    await on_early(*early)
+            return self._finish(
+                state.parser.text, state.usage, started, estimate,
+                messages, current_text, conversation_history, summary
+            )
+
+        except Exception as e:
+            return self._failed(e)
+
+
+class AnalysisModeStats:
+    """Per-chunk token and latency cost of the fused vs. three-call paths"""
+
+    def __init__(self):
+        self.modes = {'parallel': UsageStats(), 'fused': UsageStats()}
+        self.estimated_baseline = UsageStats()
+
+    def record(self, mode, results, latency):
+        if mode == 'fused':
+            usage = results.get('usage') or {}
+            prompt_tokens = usage.get('prompt_tokens', 0)
+            completion_tokens = usage.get('completion_tokens', 0)
+            cached_tokens = usage.get('cached_tokens', 0)
+            if 'baseline_prompt_tokens' in usage:
+                self.estimated_baseline.record(prompt_tokens=usage['baseline_prompt_tokens'])
+        else:
+            usages = [r.get('usage') or {} for r in results.values() if isinstance(r, dict)]
+            prompt_tokens = sum(u.get('prompt_tokens', 0) for u in usages)
+            completion_tokens = sum(u.get('completion_tokens', 0) for u in usages)
+            cached_tokens = sum(u.get('cached_tokens', 0) for u in usages)
+        self.modes[mode].record(prompt_tokens, completion_tokens, latency, cached_tokens)
+
+    def report(self):
+        parallel = self.modes['parallel'].snapshot()
+        fused = self.modes['fused'].snapshot()
+        report = {"parallel": parallel, "fused": fused, "savings": None}
+        if not fused['calls']:
+            return report
+
+        fused_total = fused['avg_prompt_tokens'] + fused['avg_completion_tokens']
+        if parallel['calls']:
+            baseline_prompt = parallel['avg_prompt_tokens']
+            savings = {
+                "baseline": "measured",
+                "total_tokens_per_chunk": parallel['avg_prompt_tokens'] + parallel['avg_completion_tokens'] - fused_total,
+                "latency_per_chunk": parallel['avg_latency'] - fused['avg_latency'],
+            }
+        else:
+            # Three-call path never ran in this process: prompt size is
+            # estimated per chunk, completion tokens and latency are unknown
+            baseline_prompt = self.estimated_baseline.snapshot()['avg_prompt_tokens']
+            savings = {
+                "baseline": "estimated",
+                "total_tokens_per_chunk": None,
+                "latency_per_chunk": None,
+            }
+
+        savings["prompt_tokens_per_chunk"] = baseline_prompt - fused['avg_prompt_tokens']
+        savings["prompt_token_reduction_pct"] = (
+            round(100 * savings["prompt_tokens_per_chunk"] / baseline_prompt, 1) if baseline_prompt else None
+        )
+        report["savings"] = savings
+        return report
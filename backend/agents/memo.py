@@ -0,0 +1,104 @@
+"""
+Agent Result Memo
+Per-agent LRU + TTL memo of analysis results, keyed on a canonical hash of
+the normalized prompt inputs, so replays, regression runs and duplicate
+chunks don't pay for the same completion twice
+"""
+
+import copy
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from config import AGENT_MEMO_MAX_ENTRIES, AGENT_MEMO_TTL
+
+_SPACE_RE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """Case- and whitespace-insensitive form of an utterance"""
+    return _SPACE_RE.sub(" ", text).strip().casefold()
+
+
+def prompt_version(*parts):
+    """Short fingerprint of the prompt template; changes whenever the template does"""
+    return hashlib.sha256("\x00".join(str(part) for part in parts).encode()).hexdigest()[:12]
+
+
+def memo_key(*parts):
+    return hashlib.sha256(json.dumps(parts, separators=(',', ':')).encode()).hexdigest()
+
+
+class ResultMemo:
+    """
+    Bounded LRU of results with a time-to-live
+
+    Only successful results are stored; get() hands out a deep copy marked
+    `memoized` (and without the original call's `usage`, since no tokens
+    were spent) so callers can decorate it freely. Keys carry the prompt
+    version, and invalidate() drops everything when the template changes.
+    """
+
+    def __init__(self, max_entries=AGENT_MEMO_MAX_ENTRIES, ttl=AGENT_MEMO_TTL):
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, result)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        result = copy.deepcopy(entry[1])
+        result.pop('usage', None)
+        result['memoized'] = True
+        return result
+
+    def put(self, key, result):
+        if not self.enabled or 'error' in result:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self):
+        with self._lock:
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "evictions": self.evictions,
+                "expired": self.expired,
+                "invalidations": self.invalidations
+            }
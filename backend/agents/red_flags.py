@@ -0,0 +1,123 @@
+"""
+Red-Flag Matcher - Instant local pre-alerts
+Scans a transcript for unambiguous danger phrases ("can't breathe",
+"coughing up blood") with a token-level Aho-Corasick automaton compiled once
+from the versioned lexicon in red_flags.json. Hits raise provisional alerts
+right after transcription; the LLM agents then confirm or retract them.
+"""
+
+import json
+import os
+import re
+from collections import deque
+
+LEXICON_PATH = os.path.join(os.path.dirname(__file__), 'red_flags.json')
+
+CLAUSE_BREAK = '|'
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[.,;:!?]")
+
+
+def tokenize(text):
+    """Lowercase word tokens with apostrophes folded (can't -> cant); punctuation becomes a clause break"""
+    text = text.lower().replace("’", "'").replace("'", "")
+    return [CLAUSE_BREAK if token in '.,;:!?' else token for token in _TOKEN_RE.findall(text)]
+
+
+class RedFlagMatcher:
+    """
+    Multi-phrase matcher over word tokens
+
+    Every phrase of the lexicon is one path in a trie; failure links turn it
+    into an automaton, so a transcript is scanned in a single pass no matter
+    how many phrases there are. A hit is dropped as negated when a negation
+    word ("no", "don't", "denies"...) appears within `negation_window` tokens
+    before it in the same clause ("no chest pain", "I don't have chest pain").
+    """
+
+    def __init__(self, lexicon):
+        self.version = lexicon['version']
+        self.negation_window = lexicon.get('negation_window', 4)
+        self.negations = set(lexicon.get('negations', []))
+        self.clause_breaks = set(lexicon.get('clause_breaks', [])) | {CLAUSE_BREAK}
+        self.flags = lexicon['flags']
+        self.phrase_count = 0
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # state -> [(flag index, phrase length)]
+        for index, flag in enumerate(self.flags):
+            for phrase in flag['phrases']:
+                self._add(tokenize(phrase), index)
+        self._link()
+
+    @classmethod
+    def load(cls, path=LEXICON_PATH, name="Red-flag lexicon"):
+        with open(path) as f:
+            matcher = cls(json.load(f))
+        print(f"🚩 {name} v{matcher.version}: {matcher.phrase_count} phrases compiled")
+        return matcher
+
+    def _add(self, tokens, flag_index):
+        state = 0
+        for token in tokens:
+            if token not in self._goto[state]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._goto[state][token] = len(self._goto) - 1
+            state = self._goto[state][token]
+        self._out[state].append((flag_index, len(tokens)))
+        self.phrase_count += 1
+
+    def _link(self):
+        """Breadth-first failure links, merging the outputs of each fallback state"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for token, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and token not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(token, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def _negated(self, tokens, start):
+        for token in reversed(tokens[max(0, start - self.negation_window):start]):
+            if token in self.clause_breaks:
+                return False
+            if token in self.negations:
+                return True
+        return False
+
+    def matches(self, text):
+        """
+        Every lexicon hit in transcript order, negated ones included
+        Yields: (flag index, matched phrase, negated)
+        """
+        tokens = tokenize(text)
+        state = 0
+        for position, token in enumerate(tokens):
+            while state and token not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(token, 0)
+            for flag_index, length in self._out[state]:
+                start = position - length + 1
+                yield flag_index, " ".join(tokens[start:position + 1]), self._negated(tokens, start)
+
+    def scan(self, text):
+        """
+        Red flags raised by a transcript, first hit per flag
+        Returns: list of {"agent", "label", "action", "phrase"} dicts
+        """
+        hits = {}
+        for flag_index, phrase, negated in self.matches(text):
+            if flag_index in hits or negated:
+                continue
+            flag = self.flags[flag_index]
+            hits[flag_index] = {
+                "agent": flag['agent'],
+                "label": flag['label'],
+                "action": flag.get('action'),
+                "phrase": phrase
+            }
+        return list(hits.values())
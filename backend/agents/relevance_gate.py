@@ -0,0 +1,241 @@
+"""
+Relevance Gate - Local per-utterance agent selection
+A small logistic-regression classifier per agent, over word n-grams plus
+red-flag lexicon features, predicts which agents are worth a paid call for
+an utterance ("okay thank you, bye" needs none). Weights live in a versioned
+model file trained from a labelled set:
+
+    python -m agents.relevance_gate train      # refit relevance_gate.json
+    python -m agents.relevance_gate evaluate   # recall / skip rate per agent
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import threading
+from agents.red_flags import RedFlagMatcher, tokenize
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), 'relevance_gate.json')
+LABELS_PATH = os.path.join(os.path.dirname(__file__), 'relevance_labels.jsonl')
+
+GATED_AGENTS = ('emergency', 'ae', 'appointment', 'sentiment')
+
+# Minimum recall on the labelled set when picking each agent's threshold
+RECALL_TARGETS = {'emergency': 1.0, 'ae': 0.95, 'appointment': 0.95, 'sentiment': 0.9}
+
+_NUMBER_WORDS = {'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten'}
+
+
+def features(text, matcher):
+    """Sparse binary features: unigrams, bigrams, red-flag hits and a few shape cues"""
+    tokens = [token for token in tokenize(text) if token != '|']
+    feats = {f"w:{token}" for token in tokens}
+    feats.update(f"b:{first}_{second}" for first, second in zip(tokens, tokens[1:]))
+    for hit in matcher.scan(text):
+        feats.add(f"flag:{hit['agent']}")
+    if any(token.isdigit() or token in _NUMBER_WORDS for token in tokens):
+        feats.add("shape:number")
+    feats.add("shape:short" if len(tokens) <= 6 else "shape:long")
+    return feats
+
+
+def _sigmoid(z):
+    if z < -30:
+        return 0.0
+    return 1.0 / (1.0 + math.exp(-z))
+
+
+class RelevanceGate:
+    """
+    Picks the agents to call for an utterance
+
+    An agent is called when its score reaches its threshold. Any red-flag hit
+    for an agent forces it, and the emergency threshold is capped at
+    `emergency_max_threshold` however the model was trained, so emergency
+    triage is only skipped for utterances the model is confident are benign.
+    """
+
+    def __init__(self, model, matcher, emergency_max_threshold=None):
+        self.version = model['version']
+        self.model = model
+        self.matcher = matcher
+        self.thresholds = {agent: model['agents'][agent]['threshold'] for agent in GATED_AGENTS}
+        if emergency_max_threshold is not None:
+            self.thresholds['emergency'] = min(self.thresholds['emergency'], emergency_max_threshold)
+
+    @classmethod
+    def load(cls, matcher, path=MODEL_PATH, emergency_max_threshold=None):
+        with open(path) as f:
+            gate = cls(json.load(f), matcher, emergency_max_threshold)
+        print(f"🚪 Relevance gate v{gate.version} loaded (thresholds: {gate.thresholds})")
+        return gate
+
+    def _scores(self, feats):
+        return {
+            agent: _score(self.model['agents'][agent]['bias'], self.model['agents'][agent]['weights'], feats)
+            for agent in GATED_AGENTS
+        }
+
+    def scores(self, text):
+        return self._scores(features(text, self.matcher))
+
+    def select(self, text):
+        """
+        Returns: {"called": [...], "skipped": [...], "forced": [...], "scores": {...}}
+        """
+        feats = features(text, self.matcher)
+        scores = self._scores(feats)
+        forced = [agent for agent in GATED_AGENTS if f"flag:{agent}" in feats]
+        called = [agent for agent in GATED_AGENTS if agent in forced or scores[agent] >= self.thresholds[agent]]
+        return {
+            "called": called,
+            "skipped": [agent for agent in GATED_AGENTS if agent not in called],
+            "forced": forced,
+            "scores": {agent: round(score, 3) for agent, score in scores.items()}
+        }
+
+    def evaluate(self, examples):
+        """Recall and skip rate per agent on labelled examples"""
+        report = {}
+        decisions = [(set(example['agents']), set(self.select(example['text'])['called'])) for example in examples]
+        for agent in GATED_AGENTS:
+            positives = [called for labels, called in decisions if agent in labels]
+            caught = sum(1 for called in positives if agent in called)
+            skipped = sum(1 for _, called in decisions if agent not in called)
+            report[agent] = {
+                "recall": caught / len(positives) if positives else None,
+                "positives": len(positives),
+                "skip_rate": skipped / len(decisions) if decisions else 0.0
+            }
+        return report
+
+
+class GateStats:
+    """Calls made and saved by the gate, per agent"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.utterances = 0
+        self.called = {agent: 0 for agent in GATED_AGENTS}
+        self.skipped = {agent: 0 for agent in GATED_AGENTS}
+
+    def record(self, decision, utterances=1):
+        with self._lock:
+            self.utterances += utterances
+            for agent in decision['called']:
+                self.called[agent] += 1
+            for agent in decision['skipped']:
+                self.skipped[agent] += 1
+
+    def snapshot(self):
+        with self._lock:
+            saved = sum(self.skipped.values())
+            total = saved + sum(self.called.values())
+            return {
+                "utterances": self.utterances,
+                "calls_made": dict(self.called),
+                "calls_saved": dict(self.skipped),
+                "calls_saved_total": saved,
+                "calls_saved_pct": round(100 * saved / total, 1) if total else 0.0
+            }
+
+
+def load_examples(path=LABELS_PATH):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _fit(samples, epochs=60, rate=0.1, l2=0.01, seed=0):
+    """Plain SGD logistic regression over sparse binary features"""
+    rng = random.Random(seed)
+    weights = {}
+    bias = 0.0
+    samples = list(samples)
+    for _ in range(epochs):
+        rng.shuffle(samples)
+        for feats, label in samples:
+            error = _sigmoid(bias + sum(weights.get(feat, 0.0) for feat in feats)) - label
+            bias -= rate * error
+            for feat in feats:
+                weight = weights.get(feat, 0.0)
+                weights[feat] = weight - rate * (error + l2 * weight)
+    return bias, {feat: round(weight, 3) for feat, weight in weights.items() if abs(weight) >= 0.01}
+
+
+def _score(bias, weights, feats):
+    return _sigmoid(bias + sum(weights.get(feat, 0.0) for feat in feats))
+
+
+def _out_of_fold_scores(samples, folds=5):
+    """Score each sample with a model that never saw it, so thresholds aren't fit to memorised data"""
+    scored = []
+    for fold in range(folds):
+        held_out = samples[fold::folds]
+        training = [sample for index, sample in enumerate(samples) if index % folds != fold]
+        bias, weights = _fit(training)
+        scored += [(_score(bias, weights, feats), label) for feats, label in held_out]
+    return scored
+
+
+def _pick_threshold(scores_and_labels, recall_target):
+    """Highest threshold that still reaches the recall target"""
+    positives = sorted(score for score, label in scores_and_labels if label)
+    if not positives:
+        return 0.5
+    allowed_misses = int(len(positives) * (1 - recall_target))
+    return max(0.0, positives[allowed_misses] - 1e-6)
+
+
+def train(examples, matcher, version):
+    """
+    Fit one classifier per agent on all examples; thresholds (and the
+    reported recall / skip rate) come from 5-fold out-of-fold scores
+    """
+    featurized = [(features(example['text'], matcher), set(example['agents'])) for example in examples]
+    model = {
+        "version": version,
+        "trained_on": os.path.basename(LABELS_PATH),
+        "examples": len(examples),
+        "cross_validated": {},
+        "agents": {}
+    }
+    for agent in GATED_AGENTS:
+        samples = [(feats, 1 if agent in labels else 0) for feats, labels in featurized]
+        scored = _out_of_fold_scores(samples)
+        threshold = _pick_threshold(scored, RECALL_TARGETS[agent])
+        positives = [score for score, label in scored if label]
+        model['cross_validated'][agent] = {
+            "recall": round(sum(1 for score in positives if score >= threshold) / len(positives), 3) if positives else None,
+            "skip_rate": round(sum(1 for score, _ in scored if score < threshold) / len(scored), 3)
+        }
+        bias, weights = _fit(samples)
+        model['agents'][agent] = {
+            "bias": round(bias, 4),
+            "threshold": round(threshold, 4),
+            "weights": dict(sorted(weights.items()))
+        }
+    return model
+
+
+def main(argv):
+    command = argv[1] if len(argv) > 1 else 'evaluate'
+    matcher = RedFlagMatcher.load()
+    examples = load_examples()
+    if command == 'train':
+        version = 1
+        if os.path.exists(MODEL_PATH):
+            with open(MODEL_PATH) as f:
+                version = json.load(f)['version'] + 1
+        model = train(examples, matcher, version)
+        with open(MODEL_PATH, 'w') as f:
+            json.dump(model, f, indent=1)
+            f.write("\n")
+        print(f"✅ Trained relevance gate v{version} on {len(examples)} examples -> {MODEL_PATH}")
+    gate = RelevanceGate.load(matcher)
+    print(json.dumps(gate.evaluate(examples), indent=2))
+
+
+if __name__ == '__main__':
+    main(sys.argv)
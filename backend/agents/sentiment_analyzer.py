@@ -4,30 +4,20 @@ Detects when patient's words don't match their emotional state
 Critical for identifying coercion, abuse, or hidden distress in post-surgery calls
 """
 
-from openai import OpenAI
-import json
+from agents.base import BaseAgent
+from audio.acoustics import analyze_audio, describe
 
 
-class SentimentMismatchAnalyzer:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
-        
-    def analyze(self, current_text, audio_data, conversation_history):
-        """
-        Analyze for sentiment-content mismatch indicating potential danger
-        
-        In production: would analyze audio features (pitch, tremor, hesitation)
-        For MVP: uses conversational analysis to detect distress signals
-        
-        Returns: dict with analysis results
-        """
-        
-        context = "\n".join([
-            f"{entry['speaker']}: {entry['text']}" 
-            for entry in conversation_history[-10:]
-        ])
-        
-        prompt = f"""You are an expert at detecting hidden distress and danger signals in post-surgery patient calls.
+class SentimentMismatchAnalyzer(BaseAgent):
+    name = 'sentiment'
+    error_label = 'Sentiment Analysis'
+    model = "gpt-4o-mini"
+    temperature = 0.4
+    context_window = 6
+    flag_key = 'mismatch_detected'
+    system_prompt = "You are an expert in detecting hidden distress, coercion, and danger signals in medical calls. Respond ONLY with valid JSON, no other text. Balance thoroughness with avoiding false alarms."
+
+    INSTRUCTIONS = """You are an expert at detecting hidden distress and danger signals in post-surgery patient calls.
 
 POST-SURGERY DANGER SCENARIOS:
 
@@ -67,86 +57,85 @@ CONVERSATIONAL RED FLAGS:
 - Abrupt topic changes when asked direct questions
 - Background voices coaching responses
 
-Conversation history:
-{context}
+VOICE MEASUREMENTS (when provided, measured from the patient's audio):
+- High pitch variability, rising jitter/shimmer or a raised voice suggest stress or fear
+- Long or frequent pauses and a slow speaking rate suggest hesitation, low mood or pain
+- A flat pitch and quiet, monotone delivery alongside "I'm fine" can signal depression
+- Treat the numbers as supporting evidence; words that contradict a stressed voice are the mismatch"""
 
-Current statement: {current_text}
+    CONTEXT_LABEL = "Conversation history:"
+    STATEMENT_LABEL = "Current statement:"
+    ACOUSTIC_LABEL = "Voice measurements of the current statement:"
 
-Analyze for hidden danger or distress. Respond in JSON format:
-{{
+    RESPONSE_SCHEMA = """{
     "mismatch_detected": true/false,
     "confidence": 0-100,
-    "analysis": {{
+    "analysis": {
         "stated_content": "what patient is saying",
         "detected_subtext": "what they might actually mean",
         "verbal_indicators": ["list of concerning phrases or patterns"],
         "behavioral_red_flags": ["hesitation, avoidance, coaching, etc."]
-    }},
+    },
     "risk_category": "coercion/hidden_complication/mental_health/medication_concern/access_barrier/normal",
     "risk_level": "low/medium/high/critical",
     "specific_concern": "detailed explanation of what seems wrong",
     "recovery_impact": "how this might affect post-surgery recovery",
     "recommended_action": "specific intervention needed (welfare check, mental health referral, social worker, private follow-up call, etc.)",
     "description": "concise summary of the mismatch"
-}}
+}"""
+
+    RESPONSE_FORMAT = f"""Analyze for hidden danger or distress. Respond in JSON format:
+{RESPONSE_SCHEMA}
 
 Be thorough but not alarmist. Genuine concern vs. normal recovery anxiety."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": "You are an expert in detecting hidden distress, coercion, and danger signals in medical calls. Respond ONLY with valid JSON, no other text. Balance thoroughness with avoiding false alarms."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.4
-            )
-            
-            content = response.choices[0].message.content.strip()
-            # Try to extract JSON if there's extra text
-            if not content.startswith('{'):
-                start = content.find('{')
-                if start != -1:
-                    content = content[start:]
-            if not content.endswith('}'):
-                end = content.rfind('}')
-                if end != -1:
-                    content = content[:end+1]
-            
-            result = json.loads(content)
-            
-            if result.get('mismatch_detected'):
-                risk = result.get('risk_level', 'medium')
-                emoji = "🚨" if risk in ['high', 'critical'] else "⚠️" if risk == 'medium' else "🔍"
-                category = result.get('risk_category', 'concern').replace('_', ' ').title()
-                result['message'] = f"{emoji} Potential {category}: {result.get('description', 'Sentiment-content mismatch detected')}"
-            
-            return result
-            
-        except Exception as e:
-            print(f"Sentiment Analysis Error: {e}")
-            return {"mismatch_detected": False, "error": str(e)}
-    
+    def analyze(self, current_text, audio_data, conversation_history, deadline=None, summary=None):
+        """
+        Analyze for sentiment-content mismatch indicating potential danger
+
+        audio_data is the utterance's acoustic features (from
+        audio.acoustics, usually extracted in the background while it was
+        transcribed) or its encoded audio; None analyzes the words alone.
+
+        Returns: dict with analysis results
+        """
+        acoustics = self.analyze_audio_features(audio_data)
+        return super().analyze(current_text, conversation_history, deadline, acoustics=acoustics, summary=summary)
+
+    async def analyze_async(self, current_text, audio_data, conversation_history, deadline=None, summary=None):
+        acoustics = self.analyze_audio_features(audio_data)
+        return await super().analyze_async(
+            current_text, conversation_history, deadline, acoustics=acoustics, summary=summary
+        )
+
+    def build_prompt(self, current_text, context, acoustics=None, summary=None):
+        prompt = super().build_prompt(current_text, context, summary)
+        if not acoustics:
+            return prompt
+        return f"{prompt}\n\n{self.ACOUSTIC_LABEL}\n{describe(acoustics)}"
+
+    def memo_inputs(self, current_text, conversation_history, acoustics=None, **inputs):
+        # Timing fields differ between runs on the same audio; they don't reach the prompt
+        if acoustics:
+            acoustics = {key: value for key, value in acoustics.items() if key != 'extract_ms'}
+        return super().memo_inputs(current_text, conversation_history, acoustics=acoustics, **inputs)
+
+    def decorate(self, result):
+        if result.get('mismatch_detected'):
+            risk = result.get('risk_level', 'medium')
+            emoji = "🚨" if risk in ['high', 'critical'] else "⚠️" if risk == 'medium' else "🔍"
+            category = result.get('risk_category', 'concern').replace('_', ' ').title()
+            result['message'] = f"{emoji} Potential {category}: {result.get('description', 'Sentiment-content mismatch detected')}"
+
+        return result
+
     def analyze_audio_features(self, audio_data):
         """
-        Placeholder for future audio feature extraction
-        In production, integrate libraries like librosa or pyAudioAnalysis to detect:
-        - Voice tremor (anxiety, fear)
-        - Pitch variations (stress indicators)
-        - Speaking rate changes (coached vs natural)
-        - Pauses and hesitations
-        - Background noise patterns
+        Voice measurements for the prompt: pitch variability (stress),
+        jitter/shimmer (tremor), speaking rate, pauses/hesitation and loudness
+        Accepts features already extracted, encoded audio (measured here, on
+        the caller's thread) or None.
         """
-        # Future implementation:
-        # - Extract MFCC features
-        # - Detect pitch contours
-        # - Measure speaking rate
-        # - Identify pauses/hesitations
-        # - Background voice detection
-        
-        return {
-            "tone": "neutral",  # Would be extracted from audio
-            "stress_level": 0,  # Would be computed from voice features
-            "speaking_rate": "normal",  # Would be measured
-            "background_voices": False  # Would be detected
-        }
\ No newline at end of file
+        if audio_data is None or isinstance(audio_data, dict):
+            return audio_data
+        return analyze_audio(audio_data)
@@ -0,0 +1,92 @@
+"""
+Incremental JSON Parser
+Extracts the top-level fields of a JSON object while it is still streaming in,
+so a decision can be acted on before the model finishes the whole answer
+"""
+
+import json
+
+
+class IncrementalJSONParser:
+    """
+    Feed response text as it arrives; `fields` holds every top-level key whose
+    value is complete so far. Text before the opening brace (e.g. a ```json
+    fence) is ignored, and nested objects/arrays are parsed once closed.
+    """
+
+    def __init__(self):
+        self.fields = {}
+        self._buffer = []
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._pos = 0
+
+    def feed(self, text):
+        """Consume more text; returns the keys completed by this chunk"""
+        completed = []
+        for char in text:
+            self._buffer.append(char)
+            index = self._pos
+            self._pos += 1
+
+            if not self._started:
+                if char == '{':
+                    self._started = True
+                    self._depth = 1
+                continue
+            if self._depth == 0:
+                continue
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1 and self._key is None and self._key_start is not None:
+                        self._key = json.loads(''.join(self._buffer[self._key_start:index + 1]))
+                        self._key_start = None
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None and self._value_start is None:
+                    self._key_start = index
+            elif char == ':' and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = index + 1
+            elif char in '{[':
+                self._depth += 1
+            elif char in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    completed += self._close_value(index)
+            elif char == ',' and self._depth == 1:
+                completed += self._close_value(index)
+        return completed
+
+    def _close_value(self, end):
+        if self._key is None or self._value_start is None:
+            return []
+        key = self._key
+        raw = ''.join(self._buffer[self._value_start:end]).strip()
+        self._key = None
+        self._value_start = None
+        try:
+            self.fields[key] = json.loads(raw)
+        except ValueError:
+            return []
+        return [key]
+
+    @property
+    def text(self):
+        return ''.join(self._buffer)
+
+    @property
+    def done(self):
+        return self._started and self._depth == 0
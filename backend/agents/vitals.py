@@ -0,0 +1,201 @@
+"""
+Vitals Extractor - Deterministic numbers from the transcript
+Rule-based extraction of pain scores, temperatures (°F/°C), symptom
+durations and post-op day counts, with spoken numbers ("one hundred and one
+point five") parsed and units normalized. Each session keeps the readings as
+a typed time series; threshold rules (fever, a sharp rise in pain) raise
+alerts instantly, without an LLM call.
+"""
+
+import re
+import threading
+from collections import deque
+from config import VITALS_FEVER_F, VITALS_PAIN_RISE, VITALS_MAX_READINGS
+
+KINDS = ('pain', 'temperature', 'duration', 'post_op_day')
+
+_UNITS = {
+    'zero': 0, 'oh': 0, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6, 'seven': 7, 'eight': 8,
+    'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12, 'thirteen': 13, 'fourteen': 14, 'fifteen': 15,
+    'sixteen': 16, 'seventeen': 17, 'eighteen': 18, 'nineteen': 19,
+}
+_TENS = {
+    'twenty': 20, 'thirty': 30, 'forty': 40, 'fifty': 50, 'sixty': 60, 'seventy': 70, 'eighty': 80, 'ninety': 90,
+}
+_WORD = r"(?:" + "|".join(sorted(set(_UNITS) - {'oh'} | set(_TENS) | {'hundred'}, key=len, reverse=True)) + r")"
+_DIGIT_WORD = r"(?:" + "|".join(sorted(_UNITS, key=len, reverse=True)) + r")"
+SPOKEN_NUMBER_RE = re.compile(
+    rf"\b(?:a\s+(?=hundred))?{_WORD}(?:(?:\s+|-)(?:and\s+)?{_WORD})*(?:\s+point(?:\s+{_DIGIT_WORD})+)?\b"
+)
+
+NUM = r"(\d+(?:\.\d+)?)"
+COUNT = r"(\d+(?:\.\d+)?|an?)"
+_NOT_A_SCORE = r"(?!\s*(?:\.\d|%|°|percent|degrees?|days?|weeks?|hours?|minutes?|months?|times?|pills?|mg|milligrams?)\b)"
+
+PAIN_RES = [
+    re.compile(rf"\b{NUM}\s*(?:out of|/|over)\s*10\b"),
+    re.compile(rf"\b(?:pain|hurts?|hurting)\b[^.?!\d]{{0,25}}?\b(?:is|was|at|of|about|around|like|level)\s+"
+               rf"(?:a |an )?{NUM}\b{_NOT_A_SCORE}"),
+    re.compile(rf"\b(?:it's|its|it is|i'm at|i am at)\s+(?:like\s+|about\s+|around\s+)?(?:a |an )?{NUM}\b"
+               rf"{_NOT_A_SCORE}(?=[^.?!]*\b(?:pain|hurts?|hurting)\b|\s*(?:now|today)?\s*[.?!,]|\s*$)"),
+]
+_PAIN_CONTEXT_RE = re.compile(r"\b(?:pain|hurts?|hurting|sore|ache|aching)\b")
+TEMPERATURE_RES = [
+    re.compile(rf"\b{NUM}\s*(?:°\s*|degrees?\s*)?(fahrenheit|celsius|centigrade|f|c)\b"),
+    re.compile(rf"{NUM}\s*(?:°|degrees?\b)"),
+    re.compile(rf"\b(?:temperature|temp|fever|thermometer)\b[^.?!]{{0,30}}?\b{NUM}(?:\s*(?:°|degrees?))?"),
+]
+DURATION_RE = re.compile(
+    rf"\b(?:for|since|past|last|over)\s+(?:the\s+)?(?:past\s+|last\s+)?(?:about\s+|almost\s+|like\s+)?"
+    rf"{COUNT}\s+(hours?|days?|weeks?|months?)\b"
+)
+POST_OP_RES = [
+    (re.compile(rf"\b(?:post[- ]?op|after (?:the |my )?(?:surgery|operation)) day\s+{NUM}\b"), 'day'),
+    (re.compile(rf"\bday\s+{NUM}\s+(?:post[- ]?op|after (?:the |my )?(?:surgery|operation))"), 'day'),
+    (re.compile(rf"\b(?:surgery|operation|procedure)\b[^.?!]{{0,25}}?\b{COUNT}\s+(days?|weeks?)\s+ago\b"), None),
+    (re.compile(rf"\b{COUNT}\s+(days?|weeks?)\s+(?:since|after|out from|post)[- ]?(?:op\b|(?:the |my )?"
+                rf"(?:surgery|operation|procedure))"), None),
+]
+SURGERY_DAY_RE = re.compile(r"\b(?:surgery|operation|procedure)\b[^.?!]{0,15}\b(yesterday|today)\b")
+
+DAYS_PER_UNIT = {'hour': 1 / 24, 'day': 1, 'week': 7, 'month': 30}
+
+
+def _spoken_value(phrase):
+    """Numeric value of a spoken number ("a hundred and one point five" -> 101.5)"""
+    whole, _, decimals = phrase.replace('-', ' ').partition(' point ')
+    total = current = 0
+    for word in whole.split():
+        if word in _UNITS:
+            current += _UNITS[word]
+        elif word in _TENS:
+            current += _TENS[word]
+        elif word == 'hundred':
+            current = (current or 1) * 100
+    total += current
+    digits = "".join(str(_UNITS[word]) for word in decimals.split() if word in _UNITS)
+    return float(f"{total}.{digits}") if digits else total
+
+
+def normalize_numbers(text):
+    """Lowercased text with spoken numbers written as digits"""
+    text = text.lower().replace("’", "'")
+    return SPOKEN_NUMBER_RE.sub(lambda match: f"{_spoken_value(match.group(0)):g}", text)
+
+
+def _count(value):
+    return 1 if value in ('a', 'an') else float(value)
+
+
+def _round(value):
+    return int(value) if float(value).is_integer() else round(value, 1)
+
+
+def _temperature(value, unit):
+    """(°F, °C) for a plausible body temperature, or None"""
+    unit = (unit or '')[:1]
+    if unit == 'c' or (not unit and 34 <= value <= 43.5):
+        return (round(value * 9 / 5 + 32, 1), round(value, 1)) if 34 <= value <= 43.5 else None
+    if 93 <= value <= 110:
+        return round(value, 1), round((value - 32) * 5 / 9, 1)
+    return None
+
+
+def extract_vitals(text):
+    """
+    Typed readings stated in one utterance
+    Returns: list of {"kind", "value", "unit", "phrase"} dicts (temperatures
+             also carry "celsius", durations their original "span")
+    """
+    normalized = normalize_numbers(text)
+    readings = []
+
+    if _PAIN_CONTEXT_RE.search(normalized) or '/10' in normalized or 'out of 10' in normalized:
+        for pattern in PAIN_RES:
+            match = pattern.search(normalized)
+            if match and float(match.group(1)) <= 10:
+                readings.append({"kind": "pain", "value": _round(float(match.group(1))), "unit": "/10",
+                                 "phrase": match.group(0)})
+                break
+
+    for pattern in TEMPERATURE_RES:
+        match = pattern.search(normalized)
+        if not match:
+            continue
+        unit = match.group(2) if pattern.groups > 1 else None
+        converted = _temperature(float(match.group(1)), unit)
+        if converted:
+            readings.append({"kind": "temperature", "value": converted[0], "unit": "°F", "celsius": converted[1],
+                             "phrase": match.group(0)})
+            break
+
+    for match in DURATION_RE.finditer(normalized):
+        amount, unit = _count(match.group(1)), match.group(2).rstrip('s')
+        readings.append({"kind": "duration", "value": round(amount * DAYS_PER_UNIT[unit], 2), "unit": "days",
+                         "span": f"{_round(amount)} {match.group(2)}", "phrase": match.group(0)})
+
+    day = SURGERY_DAY_RE.search(normalized)
+    if day:
+        readings.append({"kind": "post_op_day", "value": 1 if day.group(1) == 'yesterday' else 0, "unit": "days",
+                         "phrase": day.group(0)})
+    else:
+        for pattern, unit in POST_OP_RES:
+            match = pattern.search(normalized)
+            if match:
+                scale = 1 if unit == 'day' else DAYS_PER_UNIT[match.group(2).rstrip('s')]
+                readings.append({"kind": "post_op_day", "value": _round(_count(match.group(1)) * scale),
+                                 "unit": "days", "phrase": match.group(0)})
+                break
+    return readings
+
+
+class VitalsSeries:
+    """
+    Per-session time series of extracted readings, bounded per kind
+
+    add() stamps and stores an utterance's readings and checks the
+    threshold rules: a temperature above `fever_f`, or a pain score
+    `pain_rise` or more above the lowest one since the last pain alert.
+    Readings that trip a rule are marked with "threshold" (and "baseline").
+    """
+
+    def __init__(self, fever_f=VITALS_FEVER_F, pain_rise=VITALS_PAIN_RISE, max_readings=VITALS_MAX_READINGS):
+        self._lock = threading.Lock()
+        self.fever_f = fever_f
+        self.pain_rise = pain_rise
+        self.series = {kind: deque(maxlen=max_readings) for kind in KINDS}
+        self._pain_baseline = None
+
+    def add(self, readings, minute, timestamp):
+        """Record readings said at `minute`; returns the ones that crossed a threshold"""
+        crossed = []
+        with self._lock:
+            for reading in readings:
+                reading['minute'] = minute
+                reading['timestamp'] = timestamp
+                if reading['kind'] == 'temperature' and reading['value'] > self.fever_f:
+                    reading['threshold'] = 'fever'
+                elif reading['kind'] == 'pain':
+                    baseline = self._pain_baseline
+                    if baseline is not None and reading['value'] - baseline >= self.pain_rise:
+                        reading['threshold'] = 'pain_increase'
+                        reading['baseline'] = baseline
+                        self._pain_baseline = reading['value']
+                    else:
+                        self._pain_baseline = reading['value'] if baseline is None else min(baseline, reading['value'])
+                if 'threshold' in reading:
+                    crossed.append(reading)
+                self.series[reading['kind']].append(reading)
+        return crossed
+
+    def latest(self, kind):
+        with self._lock:
+            return self.series[kind][-1] if self.series[kind] else None
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "series": {kind: [dict(reading) for reading in readings] for kind, readings in self.series.items()},
+                "latest": {kind: readings[-1]['value'] for kind, readings in self.series.items() if readings},
+                "thresholds": {"fever_f": self.fever_f, "pain_rise": self.pain_rise}
+            }
@@ -1,263 +1,280 @@
 """
 MedCall Backend - Live Call Monitoring with Parallel AI Agents
 Hackathon Project for Healthcare Call Analysis
+
+Several workers (e.g. one per core, behind a load balancer) can share the
+calls with SESSION_STORE=redis: see core/store.py.
 """
 
-from flask import Flask, request, jsonify
+import time
+from flask import Flask, request
 from flask_cors import CORS
 from flask_socketio import SocketIO, emit
-import os
-from dotenv import load_dotenv
-import json
-from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from agents.ae_detector import AdverseEventDetector
-from agents.appointment_agent import AppointmentAgent
-from agents.emergency_detector import EmergencyDetector
-from agents.sentiment_analyzer import SentimentMismatchAnalyzer
+from config import (
+    OPENAI_API_KEY, ANALYSIS_MODE, EMERGENCY_STREAMING, PORT, MIN_ANALYSIS_CHARS, SOCKETIO_MESSAGE_QUEUE,
+    SESSION_OWNER_TTL, AFFINITY_POLL_SECONDS, SESSION_REAP_SECONDS
+)
+from core.analysis import (
+    AnalysisEngine, collect_alerts, complete_early_alerts, early_alert, provisional_alerts,
+    rate_limited_agents, timed_out_agents, vital_alerts
+)
+from core.routes import create_api_blueprint
+from core.fanout import ALL_SESSIONS, fanout, parse_room, room_session_id
+from core.pipeline import batch_history, batch_pre_alerts, batch_text, upload_progress
+from core.sessions import (
+    active_sessions, close_session, locate_session, reap_sessions, record_alerts, record_results, recover_sessions,
+    session_exists
+)
+from core.store import session_store
+from audio.frames import PCM_S16LE, FrameError, parse_frame
+from audio.segments import dedupe_overlap
 from audio.processor import AudioProcessor
 
-load_dotenv() 
-
 app = Flask(__name__)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
-
-# Configuration
-OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
-
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in .env file")
+# Real threads, not eventlet: this process never monkey-patches, and the agent executor, the event
+# log writer and the blocking Redis calls of the session store (and of the message queue, which
+# lets emits reach sockets connected to any worker) would otherwise stall every other client
+socketio = SocketIO(app, async_mode='threading', cors_allowed_origins="*", message_queue=SOCKETIO_MESSAGE_QUEUE)
 
 # Initialize agents
-ae_detector = AdverseEventDetector(OPENAI_API_KEY)
-appointment_agent = AppointmentAgent(OPENAI_API_KEY)
-emergency_detector = EmergencyDetector(OPENAI_API_KEY)
-sentiment_analyzer = SentimentMismatchAnalyzer(OPENAI_API_KEY)
+engine = AnalysisEngine(OPENAI_API_KEY, ANALYSIS_MODE, EMERGENCY_STREAMING)
 audio_processor = AudioProcessor(OPENAI_API_KEY)
 
-# Store active sessions
-active_sessions = {}
-
-class CallSession:
-    ALERT_COOLDOWN_SECONDS = 30
-
-    def __init__(self, session_id):
-        self.session_id = session_id
-        self.transcript = []
-        self.alerts = []
-        self.start_time = datetime.now()
-        self.is_active = True
-        self._last_alert_time = {}  # alert_type -> datetime
-        
-    def add_transcript(self, text, speaker="user"):
-        self.transcript.append({
-            "timestamp": datetime.now().isoformat(),
-            "speaker": speaker,
-            "text": text
-        })
-        
-    def can_emit_alert(self, alert_type):
-        last = self._last_alert_time.get(alert_type)
-        if last is None:
-            return True
-        return (datetime.now() - last).total_seconds() >= self.ALERT_COOLDOWN_SECONDS
-
-    def add_alert(self, alert_type, message, severity, action=None):
-        alert = {
-            "timestamp": datetime.now().isoformat(),
-            "type": alert_type,
-            "message": message,
-            "severity": severity,
-            "action": action
-        }
-        self.alerts.append(alert)
-        self._last_alert_time[alert_type] = datetime.now()
-        return alert
-
-
-def process_audio_chunk_parallel(session_id, audio_data, transcript_text):
-    """Process audio with all agents in parallel using gpt-4o-mini"""
+app.register_blueprint(create_api_blueprint(engine, audio_processor))
+
+# Fork the acoustic feature workers while this process has no other threads
+engine.acoustics.start()
+
+# Open pooled connections now so the first chunk doesn't pay the TLS handshake
+engine.clients.warm_up()
+
+# Bring back the calls a crash or restart interrupted
+recover_sessions()
+
+
+def transcription_worker(session_id):
+    """Transcribe a session's queued chunks one by one, in sequence order"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+    pipeline = session.pipeline
+
+    try:
+        while True:
+            item = pipeline.next_audio()
+            if item is None:
+                return
+            seq, audio_data = item
+            if pipeline.relieved():
+                socketio.emit('backpressure', {'session_id': session_id, 'active': False, 'queued': pipeline.queued},
+                              to=session_id)
+
+            try:
+                # Long uploads are transcribed in parallel segments, analysed as they land
+                plan = audio_processor.split(audio_data)
+                if plan:
+                    transcribe_upload(session_id, session, seq, plan)
+                    continue
+
+                # Voice features are measured in another process while Whisper runs
+                acoustics = engine.acoustics.submit(audio_processor.audio_bytes(audio_data)[0])
+                transcript_text = audio_processor.transcribe(audio_data, session.vad_stats)
+                print(f"📝 Transcription result #{seq}: '{transcript_text}'")
+            except Exception as e:
+                print(f"❌ TRANSCRIPTION ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+
+            commit_transcript(session_id, session, seq, transcript_text, acoustics)
+    except BaseException:
+        # Don't leave the session without a transcriber: the next chunk starts a new one
+        pipeline.worker_died()
+        raise
+
+
+def transcribe_upload(session_id, session, seq, plan):
+    """Stitch a segmented recording back together in order, committing each segment once ready"""
+    total = len(plan['ranges'])
+    print(f"✂️ Chunk #{seq}: {plan['duration']:.0f}s recording split into {total} segments")
+    previous = ''
+    for index, text in enumerate(audio_processor.transcribe_segments(plan['segments'], session.vad_stats)):
+        text = (text or '').strip()
+        print(f"📝 Transcription result #{seq} segment {index + 1}/{total}: '{text}'")
+        # Progress first, so clients know more segments follow this one's transcript
+        socketio.emit('upload_progress', upload_progress(session_id, seq, plan, index), to=session_id)
+        # Each segment is its own utterance: the first keeps the chunk's number, later ones get the next free ones
+        segment_seq = seq if index == 0 else session.pipeline.reserve_seq()
+        commit_transcript(session_id, session, segment_seq, dedupe_overlap(previous, text))
+        previous = text
+
+
+def commit_transcript(session_id, session, seq, transcript_text, acoustics=None):
+    """Add a transcribed utterance to the session and queue it for analysis"""
+    pipeline = session.pipeline
+    transcript_text = (transcript_text or '').strip()
+    if not transcript_text:
+        print(f"⚠️ Skipping chunk #{seq} - empty transcript")
+        engine.acoustics.discard(acoustics)
+        return
+
+    # Unambiguous danger phrases alert now; the agents confirm or retract later
+    hits = engine.red_flags.scan(transcript_text)
+    pre_alerts = provisional_alerts(session, hits)
+    for alert in pre_alerts.values():
+        print(f"🚩 Provisional {alert['type']} alert from red flag '{alert['matched']}'")
+
+    # Require at least 15 meaningful characters to avoid noise/silence/Whisper hallucinations,
+    # unless a red flag fired ("can't breathe" is short)
+    analyze = len(transcript_text) >= MIN_ANALYSIS_CHARS or bool(hits)
+    if not analyze:
+        print(f"⚠️ Skipping analysis - transcript too short: '{transcript_text}'")
+        engine.acoustics.discard(acoustics)
+        acoustics = None
+    entry = session.add_transcript(transcript_text)
+    alerts = vital_alerts(session, entry)
+    for alert in alerts:
+        print(f"🌡️ Vitals {alert['type']} alert from '{alert['matched']}'")
+    publish(session_id, alerts=list(pre_alerts.values()) + alerts)
+    # The transcript up to this entry: another thread may already have appended the next one
+    if pipeline.add_utterance(seq, entry, entry.seq, analyze, pre_alerts, acoustics):
+        socketio.start_background_task(analysis_worker, session_id)
+
+
+def analysis_worker(session_id):
+    """Analyse a session's transcribed utterances, coalescing any backlog"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+
+    while True:
+        batch = session.pipeline.next_batch()
+        if batch is None:
+            return
+        process_audio_chunk_parallel(session_id, batch)
+
+
+def process_audio_chunk_parallel(session_id, batch):
+    """Process a batch of utterances with all agents in parallel using gpt-4o-mini"""
     session = active_sessions.get(session_id)
     if not session:
         print(f"❌ Session {session_id} not found in processing!")
         return
 
-    session.add_transcript(transcript_text)
-    print(f"🚀 Running 3 agents in parallel for: {transcript_text[:80]}...")
+    transcript_text = batch_text(batch)
+    if not transcript_text:
+        publish(session_id, transcript=transcript_lines(batch))
+        return
+    if len(batch) > 1:
+        print(f"🧺 Coalescing {len(batch)} utterances (#{batch[0]['seq']}-#{batch[-1]['seq']}) into one analysis")
+    early_alerts = batch_pre_alerts(batch)
+
+    def on_early(key, partial):
+        # A streaming agent committed to an alert; don't wait for the others
+        if key in early_alerts:
+            return  # already raised from a red flag
+        alert = early_alert(session, key, partial)
+        if alert:
+            early_alerts[key] = alert
+            publish(session_id, alerts=[alert])
+            print(f"⚡ {alert['type']} alert emitted early from partial stream!")
 
     try:
-        agent_tasks = {
-            'ae':          lambda: ae_detector.analyze(transcript_text, session.transcript),
-            'appointment': lambda: appointment_agent.analyze(transcript_text, session.transcript),
-            'emergency':   lambda: emergency_detector.analyze(transcript_text, session.transcript),
-        }
-
-        results = {}
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {executor.submit(fn): key for key, fn in agent_tasks.items()}
-            for future in as_completed(futures):
-                key = futures[future]
-                try:
-                    results[key] = future.result()
-                    print(f"✅ {key} agent done")
-                except Exception as e:
-                    print(f"❌ {key} agent error: {e}")
-                    results[key] = {"detected": False, "issue_detected": False, "is_emergency": False, "error": str(e)}
+        results = engine.analyze(transcript_text, batch_history(session, batch), on_early,
+                                 gate_stats=session.gate_stats, summary=session.clinical.render())
 
         print("✅ All agents complete — emitting results")
-        handle_analysis_results(session_id, results)
+        handle_analysis_results(session_id, results, early_alerts, batch)
     except Exception as e:
         print(f"❌ CRITICAL ERROR in processing: {e}")
         import traceback
         traceback.print_exc()
 
+    # Sentiment runs later, over several utterances, once these results are out
+    if session.sentiment.add(batch):
+        socketio.start_background_task(sentiment_worker, session_id)
 
-def handle_analysis_results(session_id, results):
-    """Handle results from parallel agents and emit alerts"""
-    print(f"\n{'='*50}")
-    print(f"📊 HANDLING ANALYSIS RESULTS")
-    print(f"Session: {session_id}")
-    print(f"Results keys: {list(results.keys())}")
-    print(f"{'='*50}\n")
-    
+
+def sentiment_worker(session_id):
+    """Run the sentiment lane's windows as they fall due"""
     session = active_sessions.get(session_id)
     if not session:
-        print(f"❌ Session not found in handle_analysis_results!")
         return
-    
-    alerts_emitted = 0
-    
-    # Adverse Event Detection
-    ae_result = results.get('ae', {})
-    if ae_result and ae_result.get('detected') and session.can_emit_alert('adverse_event'):
-        try:
-            alert = session.add_alert(
-                'adverse_event',
-                ae_result.get('message', 'Adverse event detected'),
-                'high',
-                ae_result.get('recommended_action')
-            )
-            socketio.emit('alert', alert)
-            alerts_emitted += 1
-            print("✅ AE Alert emitted!")
-        except Exception as e:
-            print(f"❌ Error emitting AE alert: {e}")
-    elif ae_result and ae_result.get('detected'):
-        print("⏳ AE alert suppressed (cooldown)")
-
-    # Appointment Issues
-    appt_result = results.get('appointment', {})
-    if appt_result and appt_result.get('issue_detected') and session.can_emit_alert('appointment'):
-        try:
-            alert = session.add_alert(
-                'appointment',
-                appt_result.get('message', 'Appointment issue detected'),
-                'medium',
-                appt_result.get('suggested_action')
-            )
-            socketio.emit('alert', alert)
-            alerts_emitted += 1
-            print("✅ Appointment Alert emitted!")
-        except Exception as e:
-            print(f"❌ Error emitting appointment alert: {e}")
-    elif appt_result and appt_result.get('issue_detected'):
-        print("⏳ Appointment alert suppressed (cooldown)")
 
-    # Emergency Detection
-    emerg_result = results.get('emergency', {})
-    if emerg_result and emerg_result.get('is_emergency') and session.can_emit_alert('emergency'):
+    while True:
+        window = session.sentiment.next_window()
+        if window is None:
+            return
+        if 'wait' in window:
+            socketio.sleep(window['wait'])
+            continue
         try:
-            alert = session.add_alert(
-                'emergency',
-                emerg_result.get('message', 'Emergency detected'),
-                'critical',
-                emerg_result.get('action')
+            results = engine.analyze_sentiment(
+                window, session.transcript[:window['history_len']], session.gate_stats, session.clinical.render()
             )
-            socketio.emit('alert', alert)
-            alerts_emitted += 1
-            print("✅ Emergency Alert emitted!")
+            handle_analysis_results(session_id, results)
         except Exception as e:
-            print(f"❌ Error emitting emergency alert: {e}")
-    elif emerg_result and emerg_result.get('is_emergency'):
-        print("⏳ Emergency alert suppressed (cooldown)")
-    
+            print(f"❌ Sentiment lane error: {e}")
 
-    # Send transcript update
-    print("📝 Emitting transcript update...")
-    socketio.emit('transcript_update', {
-        'text': session.transcript[-1]['text'],
-        'timestamp': session.transcript[-1]['timestamp']
-    })
-    print("✅ Transcript update emitted!")
-    
-    print(f"\n{'='*50}")
-    print(f"✅ ANALYSIS COMPLETE - {alerts_emitted} alert(s) emitted")
-    print(f"{'='*50}\n")
 
-@app.route('/health', methods=['GET'])
-def health_check():
-    """Health check endpoint"""
-    return jsonify({"status": "healthy", "service": "MedCall Backend"})
+def publish(session_id, alerts=(), alert_updates=(), **details):
+    """Send one tick of a session's output to the rooms subscribed to it (see core/fanout.py)"""
+    alerts, alert_updates = record_alerts(session_id, alerts), record_alerts(session_id, alert_updates)
+    for room, payload in fanout.frames(session_id, alerts, alert_updates, **details):
+        socketio.emit('session_frame', payload, to=room)
 
 
-@app.route('/api/session/start', methods=['POST'])
-def start_session():
-    """Start a new call monitoring session"""
-    session_id = request.json.get('session_id', str(datetime.now().timestamp()))
-    
-    session = CallSession(session_id)
-    active_sessions[session_id] = session
-    
-    return jsonify({
-        "session_id": session_id,
-        "status": "active",
-        "start_time": session.start_time.isoformat()
-    })
+def transcript_lines(batch):
+    return [
+        {'seq': utterance['seq'], 'text': utterance['text'], 'timestamp': utterance['timestamp']}
+        for utterance in batch
+    ]
 
 
-@app.route('/api/session/<session_id>/stop', methods=['POST'])
-def stop_session(session_id):
-    """Stop a call monitoring session"""
-    session = active_sessions.get(session_id)
-    if not session:
-        return jsonify({"error": "Session not found"}), 404
-    
-    session.is_active = False
-    
-    summary = {
-        "session_id": session_id,
-        "duration": (datetime.now() - session.start_time).total_seconds(),
-        "total_alerts": len(session.alerts),
-        "alerts_by_type": {},
-        "transcript_length": len(session.transcript)
-    }
-    
-    for alert in session.alerts:
-        alert_type = alert['type']
-        summary['alerts_by_type'][alert_type] = summary['alerts_by_type'].get(alert_type, 0) + 1
+def handle_analysis_results(session_id, results, early_alerts=None, batch=()):
+    """Handle results from parallel agents and emit alerts"""
+    print(f"\n{'='*50}")
+    print(f"📊 HANDLING ANALYSIS RESULTS")
+    print(f"Session: {session_id}")
+    print(f"Results keys: {list(results.keys())}")
+    print(f"{'='*50}\n")
     
-    return jsonify(summary)
-
-
-@app.route('/api/session/<session_id>/alerts', methods=['GET'])
-def get_alerts(session_id):
-    """Get all alerts for a session"""
     session = active_sessions.get(session_id)
     if not session:
-        return jsonify({"error": "Session not found"}), 404
+        print(f"❌ Session not found in handle_analysis_results!")
+        return
     
-    return jsonify({"alerts": session.alerts})
-
+    record_results(session_id, results)
+    alerts = collect_alerts(session, results, early_alerts)
+    for alert in alerts:
+        print(f"✅ {alert['type']} alert emitted!")
+
+    # Alerts already raised from a partial stream get their remaining fields
+    updates = complete_early_alerts(session, results, early_alerts or {})
+    for alert in updates:
+        print(f"✅ {alert['type']} alert updated with full result")
+
+    # Results went out without the agents that missed the chunk deadline
+    timed_out = timed_out_agents(results)
+    if timed_out:
+        print(f"⏰ Partial results - timed out: {', '.join(timed_out)}")
+
+    # A missing verdict is not a negative one: say which agents were rate limited
+    rate_limited = rate_limited_agents(results)
+    if rate_limited:
+        print(f"🚦 Partial results - rate limited: {', '.join(rate_limited)}")
+
+    # Alerts, updates and transcript lines of this pass go out as one frame, in sequence order
+    publish(
+        session_id, alerts=alerts, alert_updates=updates, transcript=transcript_lines(batch),
+        timed_out={'agents': timed_out, 'deadline': engine.chunk_deadline} if timed_out else None,
+        rate_limited=rate_limited
+    )
 
-@app.route('/api/session/<session_id>/transcript', methods=['GET'])
-def get_transcript(session_id):
-    """Get full transcript for a session"""
-    session = active_sessions.get(session_id)
-    if not session:
-        return jsonify({"error": "Session not found"}), 404
-    
-    return jsonify({"transcript": session.transcript})
+    print(f"\n{'='*50}")
+    print(f"✅ ANALYSIS COMPLETE - {len(alerts)} alert(s) emitted")
+    print(f"{'='*50}\n")
 
 
 @socketio.on('connect')
@@ -268,34 +285,72 @@ def handle_connect():
 
 @socketio.on('disconnect')
 def handle_disconnect():
+    fanout.unsubscribe(request.sid)
     print('Client disconnected')
 
 
 @socketio.on('join_session')
 def handle_join_session(data):
+    """
+    Subscribe this socket to a call's updates
+    data: {"session_id" (or "*" for every call), "min_severity", "alerts_only",
+           "since_version": last frame version seen, to resume after a reconnect}
+    A resuming socket is sent just the frames it missed; if they are no longer
+    buffered, `joined` says `resync` and the client catches up over REST.
+    """
+    from flask_socketio import join_room, leave_room
     session_id = data.get('session_id')
     print(f"\n{'='*50}")
     print(f"🔗 JOIN SESSION REQUEST")
     print(f"Session ID: {session_id}")
     print(f"Socket ID: {request.sid}")
     print(f"{'='*50}\n")
-    
-    if session_id in active_sessions:
-        print(f"✅ Session found, joining room...")
-        # Join the room for this session - THIS IS CRITICAL!
-        from flask_socketio import join_room
-        join_room(session_id)
-        print(f"✅ Joined room: {session_id}")
-        emit('joined', {'session_id': session_id})
-        print(f"✅ Sent 'joined' confirmation")
-    else:
+
+    if session_id != ALL_SESSIONS and not session_exists(session_id):
         print(f"❌ Session {session_id} not found!")
         print(f"Available sessions: {list(active_sessions.keys())}")
+        return
+    try:
+        since_version = data.get('since_version')
+        since_version = None if since_version is None else int(since_version)
+        room, previous = fanout.subscribe(
+            request.sid, session_id, data.get('min_severity', 'low'),
+            data.get('alerts_only', session_id == ALL_SESSIONS)
+        )
+    except (TypeError, ValueError) as e:
+        emit('error', {'message': str(e)})
+        return
+
+    if previous:
+        leave_room(previous)
+        if room_session_id(previous) != session_id:
+            leave_room(room_session_id(previous))
+    # Frames arrive in the subscription's room; per-call signals (backpressure,
+    # upload progress, live partials) in the session's own room
+    join_room(room)
+    if session_id != ALL_SESSIONS:
+        join_room(session_id)
+    print(f"✅ Joined room: {room}")
+    joined = {'session_id': session_id, 'room': room}
+    if session_id != ALL_SESSIONS and since_version is not None:
+        joined.update(resume(session_id, room, since_version))
+    emit('joined', joined)
+
+
+def resume(session_id, room, since_version):
+    """Replay the frames a rejoining socket missed; returns the `joined` fields describing it"""
+    _, min_severity, alerts_only = parse_room(room)
+    frames, latest = fanout.replay(session_id, since_version, min_severity, alerts_only)
+    for frame in frames or ():
+        emit('session_frame', frame)
+    print(f"⏪ Resumed {session_id} from version {since_version}: "
+          f"{'resync required' if frames is None else f'{len(frames)} frame(s) replayed'}")
+    return {'version': latest, 'replayed': len(frames or ()), 'resync': frames is None}
 
 
 @socketio.on('audio_chunk')
 def handle_audio_chunk(data):
-    """Handle incoming audio chunks for real-time processing"""
+    """Handle incoming audio chunks for real-time processing (base64 JSON, kept for older clients)"""
     print("=" * 50)
     print("🎤 AUDIO CHUNK RECEIVED!")
     print("=" * 50)
@@ -306,50 +361,182 @@ def handle_audio_chunk(data):
     print(f"Session ID: {session_id}")
     print(f"Audio data type: {type(audio_data)}")
     print(f"Audio data size: {len(audio_data) if audio_data else 0} bytes")
-    
+
+    if not forward_audio(request.sid, 'audio_chunk', session_id, audio_data):
+        enqueue_audio(request.sid, session_id, audio_data)
+
+
+@socketio.on('audio_frame')
+def handle_audio_frame(data):
+    """Binary audio chunk: framed header + raw audio, no base64 (see audio/frames.py)"""
+    try:
+        frame = parse_frame(data)
+    except (FrameError, TypeError) as e:
+        print(f"❌ Malformed audio frame: {e}")
+        emit('error', {'message': f'Malformed audio frame: {e}'})
+        return
+
+    print(f"🎤 AUDIO FRAME #{frame.seq}: session {frame.session_id}, {frame.codec_name}"
+          f"{f' @ {frame.sample_rate} Hz' if frame.sample_rate else ''}, {len(frame.payload)} bytes")
+    if not forward_audio(request.sid, 'audio_frame', frame.session_id, data):
+        enqueue_audio(request.sid, frame.session_id, frame)
+
+
+@socketio.on('audio_stream')
+def handle_audio_stream(data):
+    """Timesliced PCM frame of a live call (empty payload ends the stream)"""
+    try:
+        frame = parse_frame(data)
+    except (FrameError, TypeError) as e:
+        print(f"❌ Malformed audio frame: {e}")
+        emit('error', {'message': f'Malformed audio frame: {e}'})
+        return
+
+    if not forward_audio(request.sid, 'audio_stream', frame.session_id, data):
+        stream_audio(request.sid, frame)
+
+
+def stream_audio(sid, frame):
+    """Feed a live-call frame to its session's rolling window"""
+    session = active_sessions.get(frame.session_id)
+    if not session:
+        socketio.emit('error', {'message': 'Invalid session'}, to=sid)
+        return
+    if frame.codec != PCM_S16LE:
+        socketio.emit('error', {'message': 'audio_stream frames must be pcm_s16le'}, to=sid)
+        return
+
+    if session.live.feed(frame.payload, frame.sample_rate):
+        socketio.start_background_task(stream_worker, frame.session_id)
+
+
+def stream_worker(session_id):
+    """Re-transcribe a live call's open window; emit partials, commit final segments"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+    live = session.live
+
+    try:
+        while True:
+            window = live.next_window()
+            if window is None:
+                return
+            acoustics = text = None
+            try:
+                acoustics = engine.acoustics.submit(window['audio']) if window['final'] else None
+                text = audio_processor.transcribe(window['audio'], prompt=window['prompt'], detect_speech=False)
+                text = live.complete(window, text)
+                socketio.emit('transcript_partial', {
+                    'session_id': session_id,
+                    'text': text,
+                    'final': window['final'],
+                    'duration': window['duration']
+                }, to=session_id)
+                if window['final']:
+                    print(f"🟢 Live segment final ({window['duration']}s): '{text}'")
+                    commit_transcript(session_id, session, session.pipeline.reserve_seq(), text, acoustics)
+            except Exception as e:
+                print(f"❌ LIVE TRANSCRIPTION ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+                engine.acoustics.discard(acoustics)
+                if text is None:
+                    # Close a window whose transcription failed, or the worker retries it forever once the stream ends
+                    live.complete(window, '')
+    except BaseException:
+        # Don't leave the call without a stream worker: the next frame starts a new one
+        live.worker_died()
+        raise
+
+
+def forward_audio(sid, event, session_id, data):
+    """
+    Session affinity: a call's audio must reach the worker running its pipeline
+    Returns: True if another worker owns the call and the message was handed to it
+    """
+    session, owner = locate_session(session_id)
+    if session or not owner:
+        return False
+    if session_store.forward(owner, event, session_id, data, sid):
+        print(f"↪️ {event} for session {session_id} forwarded to worker {owner}")
+    else:
+        print(f"⚠️ {event} for session {session_id} dropped - worker {owner} is not listening")
+    return True
+
+
+def reaper_worker():
+    """Archive stopped and idle calls out of memory (see reap_sessions)"""
+    while True:
+        socketio.sleep(SESSION_REAP_SECONDS)
+        try:
+            reap_sessions()
+        except Exception as e:
+            print(f"❌ Session reaper error: {e}")
+
+
+def affinity_worker():
+    """Multi-worker mode: run audio other workers forwarded here, and keep this worker's calls claimed"""
+    last_heartbeat = 0.0
+    while True:
+        try:
+            for message in session_store.poll():
+                handle_forwarded(message)
+            if time.monotonic() - last_heartbeat >= SESSION_OWNER_TTL / 3:
+                session_store.heartbeat(list(active_sessions))
+                last_heartbeat = time.monotonic()
+        except Exception as e:
+            print(f"❌ Session store error: {e}")
+        socketio.sleep(AFFINITY_POLL_SECONDS)
+
+
+def handle_forwarded(message):
+    session_id, sid, data = message['session_id'], message['sid'], message['data']
+    if message['event'] == 'audio_chunk':
+        enqueue_audio(sid, session_id, data)
+    elif message['event'] == 'audio_frame':
+        enqueue_audio(sid, session_id, parse_frame(data))
+    elif message['event'] == 'audio_stream':
+        stream_audio(sid, parse_frame(data))
+    elif message['event'] == 'stop' and session_id in active_sessions:
+        close_session(active_sessions[session_id])
+
+
+def enqueue_audio(sid, session_id, audio_data):
+    """Queue a chunk (base64 string or AudioFrame) on its session's pipeline"""
     if session_id not in active_sessions:
         print(f"❌ ERROR: Session {session_id} not found!")
         print(f"Available sessions: {list(active_sessions.keys())}")
-        emit('error', {'message': 'Invalid session'})
+        socketio.emit('error', {'message': 'Invalid session'}, to=sid)
         return
     
-    print("✅ Session found, starting transcription...")
-    
-    # Transcribe audio
-    try:
-        transcript_text = audio_processor.transcribe(audio_data)
-        print(f"📝 Transcription result: '{transcript_text}'")  # ADD THIS
-        print(f"📝 Transcription type: {type(transcript_text)}")  # ADD THIS
-        print(f"📝 Transcription length: {len(transcript_text) if transcript_text else 0}")  # ADD THIS
-    except Exception as e:
-        print(f"❌ TRANSCRIPTION ERROR: {e}")  # ADD THIS
-        import traceback
-        traceback.print_exc()  # ADD THIS
+    # Queue for the session's ordered transcription -> analysis pipeline
+    pipeline = active_sessions[session_id].pipeline
+    seq, start_worker = pipeline.submit(audio_data)
+    if seq is None:
+        print(f"🚦 Session {session_id} backlog full - chunk dropped")
+        socketio.emit('backpressure', {
+            'session_id': session_id,
+            'active': True,
+            'queued': pipeline.queued,
+            'limit': pipeline.max_pending
+        }, to=sid)
         return
-    
-    # Require at least 15 meaningful characters to avoid noise/silence/Whisper hallucinations
-    if transcript_text and len(transcript_text.strip()) >= 15:
-        print("✅ Starting parallel agent analysis...")
-        socketio.start_background_task(
-            process_audio_chunk_parallel,
-            session_id, audio_data, transcript_text
-        )
-    else:
-        print(f"⚠️ Skipping analysis - transcript too short or empty: '{transcript_text}'")
-        # Still append to transcript so the UI shows the text
-        if transcript_text and transcript_text.strip():
-            session = active_sessions.get(session_id)
-            if session:
-                session.add_transcript(transcript_text.strip())
-                socketio.emit('transcript_update', {
-                    'text': transcript_text.strip(),
-                    'timestamp': datetime.now().isoformat()
-                })
+
+    print(f"✅ Chunk #{seq} queued for transcription")
+    if start_worker:
+        socketio.start_background_task(transcription_worker, session_id)
+
+
+socketio.start_background_task(reaper_worker)
+
+# Multi-worker mode: pick up audio forwarded by other workers, renew this worker's sessions
+if session_store.shared:
+    socketio.start_background_task(affinity_worker)
 
 
 if __name__ == '__main__':
     print("🏥 MedCall Backend Starting...")
     print(f"📡 WebSocket server ready for real-time call monitoring")
-    port = int(os.getenv('PORT', 5001))
-    print(f"🚀 Running on port {port}")
-    socketio.run(app, debug=True, host='0.0.0.0', port=port, use_reloader=False)
+    print(f"🚀 Running on port {PORT}")
+    socketio.run(app, debug=True, host='0.0.0.0', port=PORT, use_reloader=False)
@@ -0,0 +1,525 @@
+"""
+MedCall Backend - asyncio/ASGI server mode
+Same socket events and REST routes as app.py, but served by a python-socketio
+AsyncServer: transcription and agent calls are awaited on AsyncOpenAI, so one
+worker holds many concurrent calls without a thread per in-flight request.
+
+Run with:  uvicorn asgi_app:app --host 0.0.0.0 --port 5001
+
+With SESSION_STORE=redis several workers share the calls (see core/store.py):
+    SESSION_STORE=redis uvicorn asgi_app:app --host 0.0.0.0 --port 5001 --workers 4
+"""
+
+import asyncio
+import time
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from flask import Flask
+from flask_cors import CORS
+from config import (
+    OPENAI_API_KEY, ANALYSIS_MODE, EMERGENCY_STREAMING, MIN_ANALYSIS_CHARS, SOCKETIO_MESSAGE_QUEUE,
+    SESSION_OWNER_TTL, AFFINITY_POLL_SECONDS, SESSION_REAP_SECONDS
+)
+from core.analysis import (
+    AnalysisEngine, collect_alerts, complete_early_alerts, early_alert, provisional_alerts,
+    rate_limited_agents, timed_out_agents, vital_alerts
+)
+from core.routes import create_api_blueprint
+from core.fanout import ALL_SESSIONS, fanout, parse_room, room_session_id
+from core.pipeline import batch_history, batch_pre_alerts, batch_text, upload_progress
+from core.sessions import (
+    active_sessions, close_session, locate_session, reap_sessions, record_alerts, record_results, recover_sessions,
+    session_exists
+)
+from core.store import session_store
+from audio.frames import PCM_S16LE, FrameError, parse_frame
+from audio.segments import dedupe_overlap
+from audio.processor import AudioProcessor
+
+# With a message queue, emits reach sockets connected to any worker
+sio = socketio.AsyncServer(
+    async_mode='asgi', cors_allowed_origins="*",
+    client_manager=socketio.AsyncRedisManager(SOCKETIO_MESSAGE_QUEUE) if SOCKETIO_MESSAGE_QUEUE else None
+)
+
+# Initialize agents
+engine = AnalysisEngine(OPENAI_API_KEY, ANALYSIS_MODE, EMERGENCY_STREAMING)
+audio_processor = AudioProcessor(OPENAI_API_KEY)
+
+# REST routes are the shared Flask blueprint, mounted behind the socket server
+rest_app = Flask(__name__)
+CORS(rest_app)
+rest_app.register_blueprint(create_api_blueprint(engine, audio_processor))
+
+# Fork the acoustic feature workers while this process has no other threads
+engine.acoustics.start()
+
+# Bring back the calls a crash or restart interrupted
+recover_sessions()
+
+
+async def warm_up():
+    # Open pooled connections now so the first chunk doesn't pay the TLS handshake
+    await engine.clients.warm_up_async()
+    sio.start_background_task(reaper_worker)
+    if session_store.shared:
+        sio.start_background_task(affinity_worker)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(rest_app), on_startup=warm_up)
+
+
+async def transcription_worker(session_id):
+    """Transcribe a session's queued chunks one by one, in sequence order"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+    pipeline = session.pipeline
+
+    try:
+        while True:
+            item = pipeline.next_audio()
+            if item is None:
+                return
+            seq, audio_data = item
+            if pipeline.relieved():
+                await sio.emit('backpressure', {'session_id': session_id, 'active': False, 'queued': pipeline.queued},
+                               to=session_id)
+
+            try:
+                # Long uploads are transcribed in parallel segments, analysed as they land
+                plan = await asyncio.to_thread(audio_processor.split, audio_data)
+                if plan:
+                    await transcribe_upload(session_id, session, seq, plan)
+                    continue
+
+                # Voice features are measured in another process while Whisper runs
+                acoustics = engine.acoustics.submit(audio_processor.audio_bytes(audio_data)[0])
+                transcript_text = await audio_processor.transcribe_async(audio_data, session.vad_stats)
+                print(f"📝 Transcription result #{seq}: '{transcript_text}'")
+            except Exception as e:
+                print(f"❌ TRANSCRIPTION ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+                continue
+
+            await commit_transcript(session_id, session, seq, transcript_text, acoustics)
+    except BaseException:
+        # Don't leave the session without a transcriber: the next chunk starts a new one
+        pipeline.worker_died()
+        raise
+
+
+async def transcribe_upload(session_id, session, seq, plan):
+    """Stitch a segmented recording back together in order, committing each segment once ready"""
+    total = len(plan['ranges'])
+    print(f"✂️ Chunk #{seq}: {plan['duration']:.0f}s recording split into {total} segments")
+    previous = ''
+    index = 0
+    async for text in audio_processor.transcribe_segments_async(plan['segments'], session.vad_stats):
+        text = (text or '').strip()
+        print(f"📝 Transcription result #{seq} segment {index + 1}/{total}: '{text}'")
+        # Progress first, so clients know more segments follow this one's transcript
+        await sio.emit('upload_progress', upload_progress(session_id, seq, plan, index), to=session_id)
+        # Each segment is its own utterance: the first keeps the chunk's number, later ones get the next free ones
+        segment_seq = seq if index == 0 else session.pipeline.reserve_seq()
+        await commit_transcript(session_id, session, segment_seq, dedupe_overlap(previous, text))
+        previous = text
+        index += 1
+
+
+async def commit_transcript(session_id, session, seq, transcript_text, acoustics=None):
+    """Add a transcribed utterance to the session and queue it for analysis"""
+    pipeline = session.pipeline
+    transcript_text = (transcript_text or '').strip()
+    if not transcript_text:
+        print(f"⚠️ Skipping chunk #{seq} - empty transcript")
+        engine.acoustics.discard(acoustics)
+        return
+
+    # Unambiguous danger phrases alert now; the agents confirm or retract later
+    hits = engine.red_flags.scan(transcript_text)
+    pre_alerts = provisional_alerts(session, hits)
+    for alert in pre_alerts.values():
+        print(f"🚩 Provisional {alert['type']} alert from red flag '{alert['matched']}'")
+
+    analyze = len(transcript_text) >= MIN_ANALYSIS_CHARS or bool(hits)
+    if not analyze:
+        print(f"⚠️ Skipping analysis - transcript too short: '{transcript_text}'")
+        engine.acoustics.discard(acoustics)
+        acoustics = None
+    entry = session.add_transcript(transcript_text)
+    alerts = vital_alerts(session, entry)
+    for alert in alerts:
+        print(f"🌡️ Vitals {alert['type']} alert from '{alert['matched']}'")
+    await publish(session_id, alerts=list(pre_alerts.values()) + alerts)
+    # The transcript up to this entry: another thread may already have appended the next one
+    if pipeline.add_utterance(seq, entry, entry.seq, analyze, pre_alerts, acoustics):
+        sio.start_background_task(analysis_worker, session_id)
+
+
+async def analysis_worker(session_id):
+    """Analyse a session's transcribed utterances, coalescing any backlog"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+
+    while True:
+        batch = session.pipeline.next_batch()
+        if batch is None:
+            return
+        await process_audio_chunk(session_id, batch)
+
+
+async def process_audio_chunk(session_id, batch):
+    """Await all agents concurrently on a batch of utterances and emit their alerts"""
+    session = active_sessions.get(session_id)
+    if not session:
+        print(f"❌ Session {session_id} not found in processing!")
+        return
+
+    transcript_text = batch_text(batch)
+    if not transcript_text:
+        await publish(session_id, transcript=transcript_lines(batch))
+        return
+    if len(batch) > 1:
+        print(f"🧺 Coalescing {len(batch)} utterances (#{batch[0]['seq']}-#{batch[-1]['seq']}) into one analysis")
+    early_alerts = batch_pre_alerts(batch)
+
+    async def on_early(key, partial):
+        # A streaming agent committed to an alert; don't wait for the others
+        if key in early_alerts:
+            return  # already raised from a red flag
+        alert = early_alert(session, key, partial)
+        if alert:
+            early_alerts[key] = alert
+            await publish(session_id, alerts=[alert])
+            print(f"⚡ {alert['type']} alert emitted early from partial stream!")
+
+    try:
+        results = await engine.analyze_async(transcript_text, batch_history(session, batch), on_early,
+                                             gate_stats=session.gate_stats, summary=session.clinical.render())
+
+        print("✅ All agents complete — emitting results")
+        await handle_analysis_results(session_id, results, early_alerts, batch)
+    except Exception as e:
+        print(f"❌ CRITICAL ERROR in processing: {e}")
+        import traceback
+        traceback.print_exc()
+
+    # Sentiment runs later, over several utterances, once these results are out
+    if session.sentiment.add(batch):
+        sio.start_background_task(sentiment_worker, session_id)
+
+
+async def sentiment_worker(session_id):
+    """Run the sentiment lane's windows as they fall due"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+
+    while True:
+        window = session.sentiment.next_window()
+        if window is None:
+            return
+        if 'wait' in window:
+            await sio.sleep(window['wait'])
+            continue
+        try:
+            results = await engine.analyze_sentiment_async(
+                window, session.transcript[:window['history_len']], session.gate_stats, session.clinical.render()
+            )
+            await handle_analysis_results(session_id, results)
+        except Exception as e:
+            print(f"❌ Sentiment lane error: {e}")
+
+
+async def publish(session_id, alerts=(), alert_updates=(), **details):
+    """Send one tick of a session's output to the rooms subscribed to it (see core/fanout.py)"""
+    alerts, alert_updates = record_alerts(session_id, alerts), record_alerts(session_id, alert_updates)
+    for room, payload in fanout.frames(session_id, alerts, alert_updates, **details):
+        await sio.emit('session_frame', payload, to=room)
+
+
+def transcript_lines(batch):
+    return [
+        {'seq': utterance['seq'], 'text': utterance['text'], 'timestamp': utterance['timestamp']}
+        for utterance in batch
+    ]
+
+
+async def handle_analysis_results(session_id, results, early_alerts=None, batch=()):
+    """Emit alerts and the transcript update for one analysis pass"""
+    session = active_sessions.get(session_id)
+    if not session:
+        print(f"❌ Session not found in handle_analysis_results!")
+        return
+
+    record_results(session_id, results)
+    alerts = collect_alerts(session, results, early_alerts)
+    for alert in alerts:
+        print(f"✅ {alert['type']} alert emitted!")
+
+    # Alerts already raised from a partial stream get their remaining fields
+    updates = complete_early_alerts(session, results, early_alerts or {})
+    for alert in updates:
+        print(f"✅ {alert['type']} alert updated with full result")
+
+    # Results went out without the agents that missed the chunk deadline
+    timed_out = timed_out_agents(results)
+    if timed_out:
+        print(f"⏰ Partial results - timed out: {', '.join(timed_out)}")
+
+    # A missing verdict is not a negative one: say which agents were rate limited
+    rate_limited = rate_limited_agents(results)
+    if rate_limited:
+        print(f"🚦 Partial results - rate limited: {', '.join(rate_limited)}")
+
+    # Alerts, updates and transcript lines of this pass go out as one frame, in sequence order
+    await publish(
+        session_id, alerts=alerts, alert_updates=updates, transcript=transcript_lines(batch),
+        timed_out={'agents': timed_out, 'deadline': engine.chunk_deadline} if timed_out else None,
+        rate_limited=rate_limited
+    )
+
+    print(f"✅ ANALYSIS COMPLETE - {len(alerts)} alert(s) emitted")
+
+
+@sio.event
+async def connect(sid, environ):
+    print('Client connected')
+    await sio.emit('connection_response', {'status': 'connected'}, to=sid)
+
+
+@sio.event
+async def disconnect(sid):
+    fanout.unsubscribe(sid)
+    print('Client disconnected')
+
+
+@sio.on('join_session')
+async def handle_join_session(sid, data):
+    """
+    Subscribe this socket to a call's updates
+    data: {"session_id" (or "*" for every call), "min_severity", "alerts_only",
+           "since_version": last frame version seen, to resume after a reconnect}
+    A resuming socket is sent just the frames it missed; if they are no longer
+    buffered, `joined` says `resync` and the client catches up over REST.
+    """
+    session_id = data.get('session_id')
+    print(f"🔗 JOIN SESSION REQUEST: {session_id} (socket {sid})")
+
+    if session_id != ALL_SESSIONS and not session_exists(session_id):
+        print(f"❌ Session {session_id} not found!")
+        print(f"Available sessions: {list(active_sessions.keys())}")
+        return
+    try:
+        since_version = data.get('since_version')
+        since_version = None if since_version is None else int(since_version)
+        room, previous = fanout.subscribe(
+            sid, session_id, data.get('min_severity', 'low'), data.get('alerts_only', session_id == ALL_SESSIONS)
+        )
+    except (TypeError, ValueError) as e:
+        await sio.emit('error', {'message': str(e)}, to=sid)
+        return
+
+    if previous:
+        await sio.leave_room(sid, previous)
+        if room_session_id(previous) != session_id:
+            await sio.leave_room(sid, room_session_id(previous))
+    # Frames arrive in the subscription's room; per-call signals in the session's own room
+    await sio.enter_room(sid, room)
+    if session_id != ALL_SESSIONS:
+        await sio.enter_room(sid, session_id)
+    joined = {'session_id': session_id, 'room': room}
+    if session_id != ALL_SESSIONS and since_version is not None:
+        joined.update(await resume(sid, session_id, room, since_version))
+    await sio.emit('joined', joined, to=sid)
+    print(f"✅ Joined room: {room}")
+
+
+async def resume(sid, session_id, room, since_version):
+    """Replay the frames a rejoining socket missed; returns the `joined` fields describing it"""
+    _, min_severity, alerts_only = parse_room(room)
+    frames, latest = await asyncio.to_thread(
+        fanout.replay, session_id, since_version, min_severity, alerts_only
+    )
+    for frame in frames or ():
+        await sio.emit('session_frame', frame, to=sid)
+    print(f"⏪ Resumed {session_id} from version {since_version}: "
+          f"{'resync required' if frames is None else f'{len(frames)} frame(s) replayed'}")
+    return {'version': latest, 'replayed': len(frames or ()), 'resync': frames is None}
+
+
+@sio.on('audio_chunk')
+async def handle_audio_chunk(sid, data):
+    """Base64 JSON chunk (kept for older clients); queued like a binary frame"""
+    session_id = data.get('session_id')
+    audio_data = data.get('audio')
+
+    print(f"🎤 AUDIO CHUNK RECEIVED: session {session_id}, {len(audio_data) if audio_data else 0} bytes")
+    if not forward_audio(sid, 'audio_chunk', session_id, audio_data):
+        await enqueue_audio(sid, session_id, audio_data)
+
+
+@sio.on('audio_frame')
+async def handle_audio_frame(sid, data):
+    """Binary audio chunk: framed header + raw audio, no base64 (see audio/frames.py)"""
+    try:
+        frame = parse_frame(data)
+    except (FrameError, TypeError) as e:
+        print(f"❌ Malformed audio frame: {e}")
+        await sio.emit('error', {'message': f'Malformed audio frame: {e}'}, to=sid)
+        return
+
+    print(f"🎤 AUDIO FRAME #{frame.seq}: session {frame.session_id}, {frame.codec_name}"
+          f"{f' @ {frame.sample_rate} Hz' if frame.sample_rate else ''}, {len(frame.payload)} bytes")
+    if not forward_audio(sid, 'audio_frame', frame.session_id, data):
+        await enqueue_audio(sid, frame.session_id, frame)
+
+
+@sio.on('audio_stream')
+async def handle_audio_stream(sid, data):
+    """Timesliced PCM frame of a live call (empty payload ends the stream)"""
+    try:
+        frame = parse_frame(data)
+    except (FrameError, TypeError) as e:
+        print(f"❌ Malformed audio frame: {e}")
+        await sio.emit('error', {'message': f'Malformed audio frame: {e}'}, to=sid)
+        return
+
+    if not forward_audio(sid, 'audio_stream', frame.session_id, data):
+        await stream_audio(sid, frame)
+
+
+async def stream_audio(sid, frame):
+    """Feed a live-call frame to its session's rolling window"""
+    session = active_sessions.get(frame.session_id)
+    if not session:
+        await sio.emit('error', {'message': 'Invalid session'}, to=sid)
+        return
+    if frame.codec != PCM_S16LE:
+        await sio.emit('error', {'message': 'audio_stream frames must be pcm_s16le'}, to=sid)
+        return
+
+    if session.live.feed(frame.payload, frame.sample_rate):
+        sio.start_background_task(stream_worker, frame.session_id)
+
+
+async def stream_worker(session_id):
+    """Re-transcribe a live call's open window; emit partials, commit final segments"""
+    session = active_sessions.get(session_id)
+    if not session:
+        return
+    live = session.live
+
+    try:
+        while True:
+            # VAD and WAV encoding of the window are CPU work; keep them off the loop
+            window = await asyncio.to_thread(live.next_window)
+            if window is None:
+                return
+            acoustics = text = None
+            try:
+                acoustics = engine.acoustics.submit(window['audio']) if window['final'] else None
+                text = await audio_processor.transcribe_async(window['audio'], prompt=window['prompt'],
+                                                              detect_speech=False)
+                text = live.complete(window, text)
+                await sio.emit('transcript_partial', {
+                    'session_id': session_id,
+                    'text': text,
+                    'final': window['final'],
+                    'duration': window['duration']
+                }, to=session_id)
+                if window['final']:
+                    print(f"🟢 Live segment final ({window['duration']}s): '{text}'")
+                    await commit_transcript(session_id, session, session.pipeline.reserve_seq(), text, acoustics)
+            except Exception as e:
+                print(f"❌ LIVE TRANSCRIPTION ERROR: {e}")
+                import traceback
+                traceback.print_exc()
+                engine.acoustics.discard(acoustics)
+                if text is None:
+                    # Close a window whose transcription failed, or the worker retries it forever once the stream ends
+                    live.complete(window, '')
+    except BaseException:
+        # Don't leave the call without a stream worker: the next frame starts a new one
+        live.worker_died()
+        raise
+
+
+def forward_audio(sid, event, session_id, data):
+    """
+    Session affinity: a call's audio must reach the worker running its pipeline
+    Returns: True if another worker owns the call and the message was handed to it
+    """
+    session, owner = locate_session(session_id)
+    if session or not owner:
+        return False
+    if session_store.forward(owner, event, session_id, data, sid):
+        print(f"↪️ {event} for session {session_id} forwarded to worker {owner}")
+    else:
+        print(f"⚠️ {event} for session {session_id} dropped - worker {owner} is not listening")
+    return True
+
+
+async def reaper_worker():
+    """Archive stopped and idle calls out of memory (see reap_sessions)"""
+    while True:
+        await sio.sleep(SESSION_REAP_SECONDS)
+        try:
+            await asyncio.to_thread(reap_sessions)
+        except Exception as e:
+            print(f"❌ Session reaper error: {e}")
+
+
+async def affinity_worker():
+    """Multi-worker mode: run audio other workers forwarded here, and keep this worker's calls claimed"""
+    last_heartbeat = 0.0
+    while True:
+        try:
+            for message in await asyncio.to_thread(session_store.poll):
+                await handle_forwarded(message)
+            if time.monotonic() - last_heartbeat >= SESSION_OWNER_TTL / 3:
+                await asyncio.to_thread(session_store.heartbeat, list(active_sessions))
+                last_heartbeat = time.monotonic()
+        except Exception as e:
+            print(f"❌ Session store error: {e}")
+        await sio.sleep(AFFINITY_POLL_SECONDS)
+
+
+async def handle_forwarded(message):
+    session_id, sid, data = message['session_id'], message['sid'], message['data']
+    if message['event'] == 'audio_chunk':
+        await enqueue_audio(sid, session_id, data)
+    elif message['event'] == 'audio_frame':
+        await enqueue_audio(sid, session_id, parse_frame(data))
+    elif message['event'] == 'audio_stream':
+        await stream_audio(sid, parse_frame(data))
+    elif message['event'] == 'stop' and session_id in active_sessions:
+        close_session(active_sessions[session_id])
+
+
+async def enqueue_audio(sid, session_id, audio_data):
+    """Queue the chunk on its session pipeline; workers transcribe and analyze in order"""
+    if session_id not in active_sessions:
+        print(f"❌ ERROR: Session {session_id} not found!")
+        await sio.emit('error', {'message': 'Invalid session'}, to=sid)
+        return
+
+    # Queue for the session's ordered transcription -> analysis pipeline
+    pipeline = active_sessions[session_id].pipeline
+    seq, start_worker = pipeline.submit(audio_data)
+    if seq is None:
+        print(f"🚦 Session {session_id} backlog full - chunk dropped")
+        await sio.emit('backpressure', {
+            'session_id': session_id,
+            'active': True,
+            'queued': pipeline.queued,
+            'limit': pipeline.max_pending
+        }, to=sid)
+        return
+
+    print(f"✅ Chunk #{seq} queued for transcription")
+    if start_worker:
+        sio.start_background_task(transcription_worker, session_id)
@@ -0,0 +1,259 @@
+"""
+Acoustic Features
+CPU-only voice measurements for the sentiment mismatch analyzer: pitch
+contour and variability, frame-level jitter/shimmer, speaking rate, pauses
+and energy dynamics, vectorized over overlapping frames in NumPy. Extraction
+runs in a process pool next to transcription, off the critical path.
+"""
+
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from audio.vad import SAMPLE_RATE, decode_pcm
+from config import ACOUSTIC_WORKERS
+
+FRAME_MS = 40
+HOP_MS = 10
+F0_MIN = 75
+F0_MAX = 400
+VOICING_THRESHOLD = 0.45  # normalized autocorrelation peak of a voiced frame
+MIN_PAUSE_MS = 200
+MIN_SYLLABLE_GAP_MS = 100
+
+
+def _runs(mask):
+    """(start, length) of each run of True values"""
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+def extract_features(samples, sample_rate=SAMPLE_RATE):
+    """
+    Voice measurements of one utterance, or None if it is too short
+    Returns: dict of pitch, jitter/shimmer, rate, pause and energy statistics
+    """
+    frame_len = int(sample_rate * FRAME_MS / 1000)
+    hop = int(sample_rate * HOP_MS / 1000)
+    if len(samples) < frame_len * 10:
+        return None
+    frames = sliding_window_view(samples, frame_len)[::hop]
+    hop_seconds = hop / sample_rate
+
+    # Energy per frame and the frames that carry voice at all
+    rms = np.sqrt(np.mean(frames ** 2, axis=1)) + 1e-10
+    energy_db = 20 * np.log10(rms)
+    threshold = max(min(np.percentile(energy_db, 10) + 10, -30.0), -55.0)
+    active = energy_db > threshold
+    if active.sum() < 10:
+        return None
+
+    # F0 from the autocorrelation peak (via FFT) within the pitch range
+    indices = np.flatnonzero(active)
+    windowed = frames[indices] * np.hanning(frame_len)
+    spectrum = np.fft.rfft(windowed, n=2 * frame_len, axis=1)
+    autocorr = np.fft.irfft(np.abs(spectrum) ** 2, axis=1)[:, :frame_len]
+    lag_min, lag_max = sample_rate // F0_MAX, sample_rate // F0_MIN
+    lags = np.argmax(autocorr[:, lag_min:lag_max], axis=1) + lag_min
+    strength = autocorr[np.arange(len(lags)), lags] / (autocorr[:, 0] + 1e-10)
+    voiced = strength > VOICING_THRESHOLD
+    voiced_frames = indices[voiced]
+    periods = lags[voiced] / sample_rate
+    f0 = 1.0 / periods if len(periods) else np.zeros(0)
+
+    features = {
+        "duration": round(len(samples) / sample_rate, 2),
+        "voiced_ratio": round(len(voiced_frames) / len(indices), 3),
+    }
+
+    if len(f0) >= 5:
+        semitones = 12 * np.log2(f0 / np.median(f0))
+        # Jitter / shimmer over adjacent voiced frames (frame-level approximations)
+        adjacent = np.diff(voiced_frames) == 1
+        period_steps = np.abs(np.diff(periods))[adjacent]
+        amplitudes = rms[voiced_frames]
+        amplitude_steps = np.abs(np.diff(amplitudes))[adjacent]
+        features.update({
+            "pitch_mean_hz": round(float(np.mean(f0)), 1),
+            "pitch_variability_st": round(float(np.std(semitones)), 2),
+            "pitch_range_st": round(float(np.percentile(semitones, 95) - np.percentile(semitones, 5)), 2),
+            "jitter_pct": round(float(100 * period_steps.mean() / periods.mean()), 2) if len(period_steps) else None,
+            "shimmer_pct": round(float(100 * amplitude_steps.mean() / amplitudes.mean()), 2) if len(amplitude_steps) else None,
+        })
+
+    # Pauses: silent runs between the first and last active frame
+    span = active[indices[0]:indices[-1] + 1]
+    starts, lengths = _runs(~span)
+    pauses = lengths[lengths * HOP_MS >= MIN_PAUSE_MS] * hop_seconds
+    speech_seconds = float(span.sum()) * hop_seconds
+    features.update({
+        "speech_seconds": round(speech_seconds, 2),
+        "pause_count": int(len(pauses)),
+        "pause_mean_s": round(float(pauses.mean()), 2) if len(pauses) else 0.0,
+        "pause_max_s": round(float(pauses.max()), 2) if len(pauses) else 0.0,
+        "pause_ratio": round(float(pauses.sum()) / (len(span) * hop_seconds), 3),
+    })
+
+    # Speaking rate: syllable nuclei as peaks of the smoothed energy envelope
+    envelope = np.convolve(energy_db, np.ones(5) / 5, mode='same')
+    peaks = np.flatnonzero(
+        (envelope[1:-1] > envelope[:-2]) & (envelope[1:-1] >= envelope[2:]) & active[1:-1]
+        & (envelope[1:-1] > threshold + 6)
+    ) + 1
+    min_gap = MIN_SYLLABLE_GAP_MS // HOP_MS
+    syllables = 0
+    last = -min_gap
+    for peak in peaks:
+        if peak - last >= min_gap:
+            syllables += 1
+            last = peak
+    features["syllables_per_second"] = round(syllables / speech_seconds, 2) if speech_seconds else 0.0
+
+    # Energy dynamics while speaking
+    spoken = energy_db[active]
+    features.update({
+        "energy_mean_db": round(float(spoken.mean()), 1),
+        "energy_variability_db": round(float(spoken.std()), 2),
+        "energy_range_db": round(float(np.percentile(spoken, 95) - np.percentile(spoken, 5)), 2),
+    })
+    return features
+
+
+def analyze_audio(audio_bytes):
+    """Process-pool entry point: decode an encoded chunk and measure it"""
+    started = time.perf_counter()
+    decoded = decode_pcm(audio_bytes)
+    if decoded is None:
+        return None
+    features = extract_features(*decoded)
+    if features is not None:
+        features['extract_ms'] = round(1000 * (time.perf_counter() - started), 1)
+    return features
+
+
+def describe(features):
+    """Prompt lines for the sentiment analyzer"""
+    lines = [f"- Duration {features['duration']}s, speech {features['speech_seconds']}s, "
+             f"voiced {features['voiced_ratio']:.0%}"]
+    if 'pitch_mean_hz' in features:
+        lines.append(f"- Pitch: mean {features['pitch_mean_hz']} Hz, variability {features['pitch_variability_st']} "
+                     f"semitones (range {features['pitch_range_st']})")
+        lines.append(f"- Voice steadiness: jitter {features['jitter_pct']}%, shimmer {features['shimmer_pct']}%")
+    lines.append(f"- Speaking rate: {features['syllables_per_second']} syllables/s")
+    lines.append(f"- Pauses: {features['pause_count']} (mean {features['pause_mean_s']}s, longest "
+                 f"{features['pause_max_s']}s, {features['pause_ratio']:.0%} of the utterance)")
+    lines.append(f"- Loudness: mean {features['energy_mean_db']} dBFS, variability {features['energy_variability_db']} dB")
+    return "\n".join(lines)
+
+
+def _pool_context():
+    """
+    fork where the platform has it: workers started by start() at import time
+    copy a process that has no threads or event loop running yet, and unlike
+    spawn/forkserver they don't re-run the server's __main__ module
+    """
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+class AcousticAnalyzer:
+    """
+    Process pool for feature extraction
+
+    submit() returns a Future (or None when disabled); callers collect it
+    with result() and a short timeout so slow extraction never holds up
+    analysis. The servers call start() before serving, so the workers are
+    forked up front rather than on the first utterance. A pool broken by a
+    dying worker (OOM, a crash in native code) is replaced; the utterance
+    that found it broken just goes without features.
+    """
+
+    def __init__(self, workers=ACOUSTIC_WORKERS):
+        self.workers = workers
+        self._pool = None
+        self._lock = threading.Lock()
+        self.jobs = 0
+        self.failures = 0
+        self.restarts = 0
+        self.extract_ms_total = 0.0
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=_pool_context())
+            return self._pool
+
+    def start(self):
+        """Create the pool and its worker processes now"""
+        if self.workers:
+            self._executor().submit(int).result()
+
+    def _record(self, future):
+        with self._lock:
+            if future.cancelled():
+                return
+            features = None if future.exception() else future.result()
+            if features is None:
+                self.failures += 1
+            else:
+                self.jobs += 1
+                self.extract_ms_total += features['extract_ms']
+
+    def submit(self, audio_bytes):
+        if not self.workers:
+            return None
+        pool = self._executor()
+        try:
+            future = pool.submit(analyze_audio, bytes(audio_bytes))
+        except RuntimeError as e:  # BrokenProcessPool, or a pool already shut down
+            print(f"⚠️ Acoustic pool unusable ({e}) - starting a new one")
+            with self._lock:
+                self.failures += 1
+                if self._pool is pool:
+                    self._pool = None
+                    self.restarts += 1
+            pool.shutdown(wait=False, cancel_futures=True)
+            return None
+        future.add_done_callback(self._record)
+        return future
+
+    @staticmethod
+    def discard(future):
+        """Drop a job whose utterance turned out empty (a no-op once it is running)"""
+        if future is not None:
+            future.cancel()
+
+    @staticmethod
+    def result(future, timeout):
+        """Features from a submitted job, or None if it failed or isn't done in time"""
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception:
+            return None
+
+    @staticmethod
+    async def result_async(future, timeout):
+        """result() for the event loop: awaits the job without blocking it"""
+        if future is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except Exception:
+            return None
+
+    def metrics(self):
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "extracted": self.jobs,
+                "failed": self.failures,
+                "pool_restarts": self.restarts,
+                "avg_extract_ms": round(self.extract_ms_total / self.jobs, 1) if self.jobs else None
+            }
@@ -0,0 +1,132 @@
+"""
+Transcription Cache
+Content-addressed Whisper results: the key is a hash of the decoded audio
+bytes plus the model and request parameters, so re-uploads, client retries
+and QA replays of the same recording skip the transcription call.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import TRANSCRIPTION_CACHE_MAX_BYTES, TRANSCRIPTION_CACHE_PATH, TRANSCRIPTION_CACHE_TTL
+
+
+def cache_key(audio_bytes, model, params=None):
+    """SHA-256 over model, canonical params and the raw audio bytes"""
+    digest = hashlib.sha256()
+    digest.update(model.encode())
+    digest.update(json.dumps(params or {}, sort_keys=True).encode())
+    digest.update(audio_bytes)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """
+    Two-tier transcript cache
+
+    The memory tier is an LRU bounded by `max_bytes` of cached text. The
+    optional disk tier is a SQLite file shared across restarts (and by
+    processes on the same host); its entries expire after `ttl` seconds and
+    a disk hit is promoted back into memory.
+    """
+
+    def __init__(self, max_bytes=TRANSCRIPTION_CACHE_MAX_BYTES, path=TRANSCRIPTION_CACHE_PATH,
+                 ttl=TRANSCRIPTION_CACHE_TTL):
+        self._lock = threading.Lock()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> transcript, least recently used first
+        self._bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS transcripts (key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            self._db.commit()
+            self._purge_expired()
+            print(f"💾 Transcription cache on disk: {path}")
+
+    @staticmethod
+    def _size(key, text):
+        return len(key) + len(text.encode())
+
+    def _remember(self, key, text):
+        size = self._size(key, text)
+        if size > self.max_bytes:
+            return
+        if key in self._memory:
+            self._bytes -= self._size(key, self._memory.pop(key))
+        self._memory[key] = text
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            old_key, old_text = self._memory.popitem(last=False)
+            self._bytes -= self._size(old_key, old_text)
+            self.evictions += 1
+
+    def _purge_expired(self):
+        cursor = self._db.execute("DELETE FROM transcripts WHERE created < ?", (time.time() - self.ttl,))
+        self._db.commit()
+        self.expired += cursor.rowcount
+
+    def get(self, key):
+        """Cached transcript for a key, or None"""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return text
+            if self._db is not None:
+                row = self._db.execute("SELECT text, created FROM transcripts WHERE key = ?", (key,)).fetchone()
+                if row and row[1] >= time.time() - self.ttl:
+                    self._remember(key, row[0])
+                    self.disk_hits += 1
+                    return row[0]
+                if row:
+                    self._db.execute("DELETE FROM transcripts WHERE key = ?", (key,))
+                    self._db.commit()
+                    self.expired += 1
+            self.misses += 1
+            return None
+
+    def put(self, key, text):
+        with self._lock:
+            self._remember(key, text)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO transcripts (key, text, created) VALUES (?, ?, ?)",
+                    (key, text, time.time())
+                )
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            stats = {
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "disk": self._db is not None
+            }
+            if self._db is not None:
+                stats['disk_entries'] = self._db.execute("SELECT COUNT(*) FROM transcripts").fetchone()[0]
+                stats['expired'] = self.expired
+                stats['ttl'] = self.ttl
+            return stats
@@ -0,0 +1,92 @@
+"""
+Binary Audio Frames
+Wire format of the `audio_frame` socket event: a fixed header followed by
+the raw encoded audio, sent as a binary attachment instead of base64 JSON.
+
+    offset  size  field
+    0       4     magic b"MCAF"
+    4       1     version (1)
+    5       1     codec id (see CODECS)
+    6       4     sample rate, Hz (0 if unknown), big-endian
+    10      4     client sequence number, big-endian
+    14      2     session id length N, big-endian
+    16      N     session id, UTF-8
+    16+N    ...   audio payload
+
+The payload is handed on as a memoryview over the received buffer, so it
+reaches the transcription stage without being copied or re-encoded.
+
+Live streaming (`audio_stream` event) uses the same frames with codec
+PCM_S16LE: raw little-endian 16-bit mono samples at the header's sample
+rate. An empty payload ends the stream.
+"""
+
+import struct
+
+MAGIC = b"MCAF"
+VERSION = 1
+HEADER = struct.Struct(">4sBBIIH")
+
+# codec id -> (name, file extension Whisper recognises)
+CODECS = {
+    0: ('unknown', 'webm'),
+    1: ('webm', 'webm'),
+    2: ('wav', 'wav'),
+    3: ('mp3', 'mp3'),
+    4: ('ogg', 'ogg'),
+    5: ('m4a', 'm4a'),
+    6: ('pcm_s16le', 'wav'),
+}
+PCM_S16LE = 6
+
+
+class FrameError(ValueError):
+    """A binary audio frame that doesn't follow the wire format"""
+
+
+class AudioFrame:
+    """One decoded frame: header fields plus a zero-copy view of the audio"""
+
+    def __init__(self, session_id, seq, codec, sample_rate, payload):
+        self.session_id = session_id
+        self.seq = seq
+        self.codec = codec
+        self.sample_rate = sample_rate
+        self.payload = payload
+
+    @property
+    def filename(self):
+        return f"audio.{CODECS.get(self.codec, CODECS[0])[1]}"
+
+    @property
+    def codec_name(self):
+        return CODECS.get(self.codec, CODECS[0])[0]
+
+
+def parse_frame(data):
+    """
+    Decode an `audio_frame` buffer (bytes, bytearray or memoryview)
+    Raises FrameError if it is truncated or not a version 1 frame.
+    """
+    view = memoryview(data)
+    if len(view) < HEADER.size:
+        raise FrameError(f"frame too short ({len(view)} bytes)")
+    magic, version, codec, sample_rate, seq, session_len = HEADER.unpack_from(view)
+    if magic != MAGIC:
+        raise FrameError("bad magic")
+    if version != VERSION:
+        raise FrameError(f"unsupported frame version {version}")
+    payload_start = HEADER.size + session_len
+    if len(view) < payload_start:
+        raise FrameError("truncated session id")
+    try:
+        session_id = str(view[HEADER.size:payload_start], 'utf-8')
+    except UnicodeDecodeError:
+        raise FrameError("session id is not UTF-8")
+    return AudioFrame(session_id, seq, codec, sample_rate, view[payload_start:])
+
+
+def build_frame(session_id, seq, codec, sample_rate, payload):
+    """Encode a frame (the browser does the same in src/audioFrame.js)"""
+    session = session_id.encode()
+    return HEADER.pack(MAGIC, VERSION, codec, sample_rate, seq, len(session)) + session + bytes(payload)
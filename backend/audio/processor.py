@@ -3,61 +3,261 @@ Audio Processor
 Handles audio transcription using OpenAI Whisper
 """
 
-from openai import OpenAI
+import asyncio
 import base64
 import io
 import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from audio.cache import TranscriptionCache, cache_key
+from audio.frames import PCM_S16LE, AudioFrame
+from audio.segments import encoded_segments, split_at_silence
+from audio.vad import SAMPLE_RATE, VADStats, VoiceActivityDetector, decode_pcm, encode_wav, pcm_samples
+from config import (
+    VAD_ENABLED, UPLOAD_SEGMENT_SECONDS, UPLOAD_SEGMENT_OVERLAP, UPLOAD_SEGMENT_MIN_BYTES, UPLOAD_WORKERS
+)
+from core.openai_pool import get_factory
+from core.scheduler import scheduled, scheduled_async
 
 
 class AudioProcessor:
-    def __init__(self, api_key):
-        self.client = OpenAI(api_key=api_key)
-        
-    def transcribe(self, audio_data):
+    model = "whisper-1"
+    timeout = 60.0  # Whisper on a long upload is slower than a chat completion
+    params = {"response_format": "text"}
+
+    def __init__(self, api_key, cache=None):
+        self.clients = get_factory(api_key)
+        self.client = self.clients.client()
+        self.cache = cache or TranscriptionCache()
+        self.vad = VoiceActivityDetector() if VAD_ENABLED else None
+        self.vad_stats = VADStats()
+        # Bounded pool for the segments of long uploads
+        self.segment_workers = UPLOAD_WORKERS
+        self.executor = ThreadPoolExecutor(max_workers=UPLOAD_WORKERS, thread_name_prefix='segment')
+
+    @property
+    def async_client(self):
+        return self.clients.async_client()
+
+    @staticmethod
+    def audio_bytes(audio_data):
+        """The encoded audio and a filename for it, from any accepted chunk form"""
+        # Handle base64 encoded audio (legacy `audio_chunk` event)
+        if isinstance(audio_data, str):
+            audio_data = base64.b64decode(audio_data)
+        # Binary `audio_frame`: the payload is a memoryview, used without copying
+        if isinstance(audio_data, AudioFrame):
+            if audio_data.codec == PCM_S16LE:
+                return encode_wav(pcm_samples(audio_data.payload, audio_data.sample_rate), SAMPLE_RATE), "audio.wav"
+            return audio_data.payload, audio_data.filename
+        # Live windows and upload segments are WAV we encoded; browser recordings are WebM
+        return audio_data, "audio.wav" if audio_data[:4] == b'RIFF' else "audio.webm"
+
+    def _audio_file(self, audio_bytes, name="audio.webm"):
+        # Create a file-like object
+        audio_file = io.BytesIO(audio_bytes)
+        audio_file.name = name  # Whisper needs a filename
+        return audio_file
+
+    def _speech_file(self, audio_bytes, name, vad_stats=None):
+        """
+        The chunk as sent to Whisper: with leading/trailing silence trimmed
+        by the VAD, or None when it holds no speech at all
+        """
+        if self.vad is None:
+            return self._audio_file(audio_bytes, name)
+        report = self.vad.analyze(audio_bytes)
+        for stats in (self.vad_stats, vad_stats):
+            if stats is not None:
+                stats.record(report)
+        if report is None:
+            return self._audio_file(audio_bytes, name)
+        trimmed = f", trimmed {report['trimmed']}s" if report['trimmed'] else ""
+        print(f"🎙️ VAD: {report['speech_ratio']:.0%} speech in {report['duration']}s{trimmed}")
+        if not report['speech']:
+            return None
+        return self._audio_file(report['audio'], "audio.wav" if report['trimmed'] else name)
+
+    def request_params(self, prompt=None):
+        # Whisper continues the style and vocabulary of `prompt` (the preceding text)
+        return dict(self.params, prompt=prompt) if prompt else self.params
+
+    def cache_key(self, audio_bytes, params=None):
+        return cache_key(audio_bytes, self.model, params or self.params)
+
+    def _create(self, audio_file, params=None):
+        """One Whisper request, queued behind the shared rate-limit scheduler"""
+        attempt = scheduled('transcription', 0, self.model, None, lambda timeout: self.client.audio.transcriptions.create(
+            model=self.model,
+            file=audio_file,
+            timeout=timeout,
+            **(params or self.params)
+        ))
+        return attempt(self.timeout)
+
+    async def _create_async(self, audio_file, params=None):
+        attempt = scheduled_async('transcription', 0, self.model, None, lambda timeout: self.async_client.audio.transcriptions.create(
+            model=self.model,
+            file=audio_file,
+            timeout=timeout,
+            **(params or self.params)
+        ))
+        return await attempt(self.timeout)
+
+    def transcribe(self, audio_data, vad_stats=None, prompt=None, detect_speech=True):
         """
         Transcribe audio using OpenAI Whisper API
+        Audio transcribed before (same bytes, model and params) comes from the
+        cache; chunks the VAD finds silent are never sent and transcribe to "".
         
         Args:
-            audio_data: Base64 encoded audio or raw bytes
+            audio_data: Base64 encoded audio, raw bytes or an AudioFrame
+            vad_stats: optional VADStats (e.g. the session's) to record the chunk in
+            prompt: preceding transcript, passed to Whisper for continuity
+            detect_speech: False when the caller already ran the VAD (live windows)
             
         Returns:
             Transcribed text
         """
         try:
-            # Handle base64 encoded audio
-            if isinstance(audio_data, str):
-                audio_bytes = base64.b64decode(audio_data)
+            audio_bytes, name = self.audio_bytes(audio_data)
+            params = self.request_params(prompt)
+            key = self.cache_key(audio_bytes, params)
+            transcript = self.cache.get(key)
+            if transcript is not None:
+                return transcript
+
+            if detect_speech:
+                audio_file = self._speech_file(audio_bytes, name, vad_stats)
             else:
-                audio_bytes = audio_data
-            
-            # Create a file-like object
-            audio_file = io.BytesIO(audio_bytes)
-            audio_file.name = "audio.webm"  # Whisper needs a filename
-            
-            # Transcribe using Whisper
-            transcript = self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file,
-                response_format="text"
-            )
+                audio_file = self._audio_file(audio_bytes, name)
+            if audio_file is None:
+                print("🔇 No speech in chunk - Whisper skipped")
+                transcript = ""
+            else:
+                # Transcribe using Whisper
+                transcript = self._create(audio_file, params)
+            self.cache.put(key, transcript)
             
             return transcript
             
         except Exception as e:
             print(f"Transcription Error: {e}")
             return None
+
+    async def transcribe_async(self, audio_data, vad_stats=None, prompt=None, detect_speech=True):
+        """
+        Same as transcribe(), awaiting Whisper on the AsyncOpenAI client
+        """
+        try:
+            audio_bytes, name = self.audio_bytes(audio_data)
+            params = self.request_params(prompt)
+            key = self.cache_key(audio_bytes, params)
+            transcript = self.cache.get(key)
+            if transcript is not None:
+                return transcript
+
+            if detect_speech:
+                # Decoding and VAD block, so keep them off the event loop
+                audio_file = await asyncio.to_thread(self._speech_file, audio_bytes, name, vad_stats)
+            else:
+                audio_file = self._audio_file(audio_bytes, name)
+            if audio_file is None:
+                print("🔇 No speech in chunk - Whisper skipped")
+                transcript = ""
+            else:
+                transcript = await self._create_async(audio_file, params)
+            self.cache.put(key, transcript)
+
+            return transcript
+
+        except Exception as e:
+            print(f"Transcription Error: {e}")
+            return None
     
+    def split(self, audio_data):
+        """
+        Plan for a long recording: {"duration", "ranges", "segments"}, where
+        segments lazily yields each range as WAV bytes. None when the audio is
+        small or short enough for a single Whisper request (or can't be decoded).
+        """
+        audio_bytes, _ = self.audio_bytes(audio_data)
+        if len(audio_bytes) < UPLOAD_SEGMENT_MIN_BYTES:
+            return None
+        decoded = decode_pcm(audio_bytes)
+        if decoded is None:
+            return None
+        samples, sample_rate = decoded
+        duration = len(samples) / sample_rate
+        if duration < UPLOAD_SEGMENT_SECONDS * 1.5:
+            return None
+        ranges = split_at_silence(
+            self.vad or VoiceActivityDetector(), samples, sample_rate, UPLOAD_SEGMENT_SECONDS, UPLOAD_SEGMENT_OVERLAP
+        )
+        return {
+            "duration": duration,
+            "ranges": [(start / sample_rate, end / sample_rate) for start, end in ranges],
+            "segments": encoded_segments(samples, sample_rate, ranges)
+        }
+
+    def transcribe_segments(self, segments, vad_stats=None):
+        """
+        Transcribe segments on the bounded pool, yielding their texts in order,
+        each as soon as it and every earlier segment are done. At most twice
+        the pool size is encoded or in flight at a time.
+        """
+        segments = iter(segments)
+        pending = deque()
+        for segment in segments:
+            pending.append(self.executor.submit(self.transcribe, segment, vad_stats))
+            if len(pending) >= 2 * self.segment_workers:
+                break
+        while pending:
+            transcript = pending.popleft().result()
+            segment = next(segments, None)
+            if segment is not None:
+                pending.append(self.executor.submit(self.transcribe, segment, vad_stats))
+            yield transcript
+
+    async def transcribe_segments_async(self, segments, vad_stats=None):
+        """Async counterpart of transcribe_segments(), with the same concurrency bound"""
+        limit = asyncio.Semaphore(self.segment_workers)
+
+        async def transcribe(segment):
+            async with limit:
+                return await self.transcribe_async(segment, vad_stats)
+
+        segments = iter(segments)
+        pending = deque()
+        for segment in segments:
+            pending.append(asyncio.ensure_future(transcribe(segment)))
+            if len(pending) >= 2 * self.segment_workers:
+                break
+        try:
+            while pending:
+                transcript = await pending.popleft()
+                segment = next(segments, None)
+                if segment is not None:
+                    pending.append(asyncio.ensure_future(transcribe(segment)))
+                yield transcript
+        finally:
+            for task in pending:
+                task.cancel()
+
     def transcribe_file(self, file_path):
         """
         Transcribe audio from a file
         """
         try:
             with open(file_path, 'rb') as audio_file:
-                transcript = self.client.audio.transcriptions.create(
-                    model="whisper-1",
-                    file=audio_file,
-                    response_format="text"
-                )
+                audio_bytes = audio_file.read()
+            key = self.cache_key(audio_bytes)
+            transcript = self.cache.get(key)
+            if transcript is None:
+                audio_file = io.BytesIO(audio_bytes)
+                audio_file.name = os.path.basename(file_path)
+                transcript = self._create(audio_file)
+                self.cache.put(key, transcript)
             
             return transcript
             
@@ -0,0 +1,70 @@
+"""
+Long Recording Segmentation
+Splits an uploaded recording at quiet points into overlapping segments
+that fit comfortably in one Whisper request, and stitches their
+transcripts back together without the words heard twice in the overlap.
+"""
+
+import re
+import numpy as np
+from audio.vad import encode_wav
+
+_WORD_RE = re.compile(r"[\w']+")
+
+
+def split_at_silence(detector, samples, sample_rate, target_seconds, overlap_seconds, search_seconds=5.0):
+    """
+    (start, end) sample ranges covering the recording
+
+    Each cut lands on the quietest frame within `search_seconds` (at most
+    half the target) of the target length, so words are rarely split;
+    neighbouring segments then share `overlap_seconds` of audio on either
+    side of the cut.
+    """
+    frames, frame_len = detector.frames(samples, sample_rate)
+    energy = detector.energy_db(frames) if len(frames) else np.zeros(0)
+    frames_per_second = sample_rate / frame_len
+    target = max(1, int(target_seconds * frames_per_second))
+    # Keep the search window past the previous cut, so every segment moves forward
+    search = min(int(search_seconds * frames_per_second), target // 2)
+    overlap = int(overlap_seconds * sample_rate)
+
+    cuts = []
+    start = 0
+    while len(energy) - start > target + search:
+        window = energy[start + target - search:start + target + search + 1]
+        cut = start + target - search + int(np.argmin(window))
+        cuts.append(cut * frame_len)
+        start = cut
+
+    bounds = [0] + cuts + [len(samples)]
+    return [
+        (max(0, begin - overlap), min(len(samples), end + overlap))
+        for begin, end in zip(bounds, bounds[1:])
+    ]
+
+
+def encoded_segments(samples, sample_rate, ranges):
+    """WAV bytes per range, encoded only when the consumer asks for the next one"""
+    for start, end in ranges:
+        yield encode_wav(samples[start:end], sample_rate)
+
+
+def _normalize(word):
+    return word.lower().strip("'")
+
+
+def dedupe_overlap(previous, text, max_words=8):
+    """
+    `text` without the leading words that repeat the end of `previous`
+    (the audio overlap between two segments is transcribed twice)
+    """
+    if not previous or not text:
+        return text
+    tail = [_normalize(word) for word in _WORD_RE.findall(previous)[-max_words:]]
+    words = text.split()
+    head = [_normalize(" ".join(_WORD_RE.findall(word))) for word in words[:max_words]]
+    for size in range(min(len(tail), len(head)), 0, -1):
+        if tail[-size:] == head[:size]:
+            return " ".join(words[size:])
+    return text
@@ -0,0 +1,121 @@
+"""
+Live Streaming Transcription
+Rolling per-session audio buffer for timesliced PCM frames. The open
+window (audio since the last finalized segment) is re-transcribed every
+`step` seconds of new audio for `transcript_partial` updates, and becomes
+final - handed to the agents - once the speaker pauses, the window reaches
+its maximum length, or the stream ends.
+"""
+
+import threading
+import numpy as np
+from audio.vad import SAMPLE_RATE, VoiceActivityDetector, encode_wav, pcm_samples
+from config import (
+    STREAM_STEP_SECONDS, STREAM_MAX_WINDOW_SECONDS, STREAM_FINAL_SILENCE_MS, STREAM_PROMPT_CHARS
+)
+
+# Silence kept ahead of the first word, so its onset isn't clipped
+LEAD_IN_SECONDS = 0.5
+
+
+class LiveTranscriber:
+    """
+    Sliding-window transcription state of one live call
+
+    feed() and next_window() follow the pipeline's worker contract: feed()
+    returns True when the caller must start the session's stream worker,
+    next_window() returns None when that worker should exit. The worker
+    transcribes each window (with the finalized text so far as Whisper's
+    prompt) and reports the text back through complete().
+    """
+
+    def __init__(self, detector=None, step=STREAM_STEP_SECONDS, max_window=STREAM_MAX_WINDOW_SECONDS,
+                 final_silence_ms=STREAM_FINAL_SILENCE_MS, prompt_chars=STREAM_PROMPT_CHARS):
+        self._lock = threading.Lock()
+        self.detector = detector or VoiceActivityDetector()
+        self.step = int(step * SAMPLE_RATE)
+        self.max_window = int(max_window * SAMPLE_RATE)
+        self.final_silence_ms = final_silence_ms
+        self.prompt_chars = prompt_chars
+        self._audio = np.zeros(0, dtype=np.float32)  # open window, at SAMPLE_RATE
+        self._passed = 0  # samples of the window covered by the last pass
+        self._ended = False
+        self._working = False
+        self.text = ""  # finalized text, tail kept for the prompt
+        self.passes = 0
+        self.finals = 0
+
+    def _ready(self):
+        if self._ended:
+            return len(self._audio) > 0
+        return len(self._audio) - self._passed >= self.step
+
+    def feed(self, pcm, sample_rate):
+        """Append a PCM frame (empty = end of stream); True if the caller must start the worker"""
+        with self._lock:
+            if len(pcm):
+                self._audio = np.concatenate([self._audio, pcm_samples(pcm, sample_rate)])
+                self._ended = False
+            else:
+                self._ended = True
+            if self._working or not self._ready():
+                return False
+            self._working = True
+            return True
+
+    def next_window(self):
+        """
+        Next window to transcribe, or None once there is nothing new
+        Returns: {"audio": WAV bytes, "prompt", "final", "end", "duration"}
+        """
+        with self._lock:
+            if not self._ready():
+                self._working = False
+                return None
+            speech, frame_len = self.detector.speech_frames(self._audio, SAMPLE_RATE)
+            spoken_ms = int(speech.sum()) * self.detector.frame_ms
+            if spoken_ms < self.detector.min_speech_ms:
+                # Nothing said yet: drop the silence instead of re-transcribing it
+                keep = 0 if self._ended else int(LEAD_IN_SECONDS * SAMPLE_RATE)
+                self._audio = self._audio[max(0, len(self._audio) - keep):]
+                self._passed = len(self._audio)
+                self._working = False
+                return None
+
+            silent_tail_ms = (len(speech) - 1 - int(np.flatnonzero(speech)[-1])) * self.detector.frame_ms
+            end = len(self._audio)
+            final = self._ended or end >= self.max_window or silent_tail_ms >= self.final_silence_ms
+            self._passed = end
+            return {
+                "audio": encode_wav(self._audio[:end], SAMPLE_RATE),
+                "prompt": self.text[-self.prompt_chars:],
+                "final": final,
+                "end": end,
+                "duration": round(end / SAMPLE_RATE, 2)
+            }
+
+    def complete(self, window, text):
+        """Record a window's transcript; a final one closes the window and extends the prompt"""
+        text = (text or '').strip()
+        with self._lock:
+            self.passes += 1
+            if window['final']:
+                self._audio = self._audio[window['end']:]
+                self._passed = max(0, self._passed - window['end'])
+                self.finals += 1
+                if text:
+                    self.text = f"{self.text} {text}".strip()[-4 * self.prompt_chars:]
+        return text
+
+    def worker_died(self):
+        """The stream worker exited without draining the window: let the next feed() start one"""
+        with self._lock:
+            self._working = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "passes": self.passes,
+                "finals": self.finals,
+                "buffered_seconds": round(len(self._audio) / SAMPLE_RATE, 2)
+            }
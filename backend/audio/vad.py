@@ -0,0 +1,190 @@
+"""
+Voice Activity Detection
+Decodes a chunk to 16 kHz mono PCM and classifies fixed-size frames as
+speech from their energy and zero-crossing rate, all vectorized in NumPy.
+Chunks without speech never reach Whisper (which hallucinates text on
+silence) and leading/trailing silence is trimmed off the rest.
+"""
+
+import io
+import shutil
+import subprocess
+import threading
+import wave
+from collections import deque
+import numpy as np
+from config import VAD_MIN_SPEECH_MS, VAD_ENERGY_MARGIN_DB, VAD_MIN_TRIM_SECONDS
+
+SAMPLE_RATE = 16000
+
+
+def decode_pcm(audio_bytes):
+    """
+    Audio as float32 mono samples in [-1, 1]
+    Returns: (samples, sample_rate), or None if the audio can't be decoded
+    16-bit WAV is read directly; anything else (webm/opus, mp3...) needs ffmpeg.
+    """
+    if audio_bytes[:4] == b'RIFF' and audio_bytes[8:12] == b'WAVE':
+        try:
+            with wave.open(io.BytesIO(audio_bytes)) as wav:
+                if wav.getsampwidth() == 2:
+                    samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2')
+                    samples = samples.reshape(-1, wav.getnchannels()).mean(axis=1)
+                    return (samples / 32768.0).astype(np.float32), wav.getframerate()
+        except (wave.Error, EOFError, ValueError):
+            pass
+
+    ffmpeg = shutil.which('ffmpeg')
+    if not ffmpeg:
+        return None
+    try:
+        decoded = subprocess.run(
+            [ffmpeg, '-nostdin', '-loglevel', 'error', '-i', 'pipe:0',
+             '-f', 's16le', '-ac', '1', '-ar', str(SAMPLE_RATE), 'pipe:1'],
+            input=audio_bytes, capture_output=True, timeout=10, check=True
+        )
+    except (subprocess.SubprocessError, OSError):
+        return None
+    samples = np.frombuffer(decoded.stdout, dtype='<i2')
+    return (samples / 32768.0).astype(np.float32), SAMPLE_RATE
+
+
+def pcm_samples(pcm, sample_rate):
+    """Raw 16-bit little-endian mono PCM as float32 samples at SAMPLE_RATE"""
+    pcm = memoryview(pcm).cast('B')
+    samples = np.frombuffer(pcm[:len(pcm) // 2 * 2], dtype='<i2').astype(np.float32) / 32768.0
+    if sample_rate and sample_rate != SAMPLE_RATE and len(samples):
+        positions = np.arange(0, len(samples), sample_rate / SAMPLE_RATE)
+        samples = np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+    return samples
+
+
+def encode_wav(samples, sample_rate):
+    """16-bit mono WAV bytes for a float32 signal"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype('<i2')
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return buffer.getvalue()
+
+
+class VoiceActivityDetector:
+    """
+    Energy / zero-crossing frame classifier
+
+    A frame is speech when its energy clears an adaptive threshold (the
+    chunk's noise floor plus `margin_db`, capped at `speech_db` so a chunk
+    that is all speech still passes) and it is not hiss: high zero-crossing
+    frames only count when well above the threshold. Speech frames are
+    padded by a hangover so word edges and short pauses survive trimming.
+    """
+
+    frame_ms = 30
+    hangover_ms = 200
+    speech_db = -30.0  # frames this loud (dBFS) are always loud enough
+    floor_db = -55.0  # ...and frames this quiet never are
+    max_zcr = 0.35
+
+    def __init__(self, min_speech_ms=VAD_MIN_SPEECH_MS, margin_db=VAD_ENERGY_MARGIN_DB,
+                 min_trim_seconds=VAD_MIN_TRIM_SECONDS):
+        self.min_speech_ms = min_speech_ms
+        self.margin_db = margin_db
+        self.min_trim_seconds = min_trim_seconds
+        self._warned = False
+
+    def frames(self, samples, sample_rate):
+        """Non-overlapping frames (a view, no copy) and the frame length in samples"""
+        frame_len = int(sample_rate * self.frame_ms / 1000)
+        return samples[:len(samples) // frame_len * frame_len].reshape(-1, frame_len), frame_len
+
+    @staticmethod
+    def energy_db(frames):
+        return 10 * np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+
+    def speech_frames(self, samples, sample_rate):
+        """Boolean speech mask per frame, and the frame length in samples"""
+        frames, frame_len = self.frames(samples, sample_rate)
+        if not len(frames):
+            return np.zeros(0, dtype=bool), frame_len
+        energy_db = self.energy_db(frames)
+        zcr = np.mean(np.signbit(frames[:, 1:]) != np.signbit(frames[:, :-1]), axis=1)
+        threshold = max(min(np.percentile(energy_db, 10) + self.margin_db, self.speech_db), self.floor_db)
+        speech = (energy_db > threshold) & ((zcr < self.max_zcr) | (energy_db > threshold + self.margin_db))
+        return speech, frame_len
+
+    def analyze(self, audio_bytes):
+        """
+        Returns: {"speech", "speech_ratio", "duration", "audio", "trimmed"}, or
+        None when the chunk can't be decoded (it is then transcribed untouched).
+        `audio` is the bytes to send: the original, or a trimmed WAV.
+        """
+        decoded = decode_pcm(audio_bytes)
+        if decoded is None:
+            if not self._warned:
+                print("⚠️ VAD skipped: install ffmpeg to decode compressed audio")
+                self._warned = True
+            return None
+        samples, sample_rate = decoded
+        speech, frame_len = self.speech_frames(samples, sample_rate)
+        duration = len(samples) / sample_rate
+        speech_ms = int(speech.sum()) * self.frame_ms
+        report = {
+            "speech": speech_ms >= self.min_speech_ms,
+            "speech_ratio": round(float(speech.mean()), 3) if len(speech) else 0.0,
+            "duration": round(duration, 2),
+            "audio": audio_bytes,
+            "trimmed": 0.0
+        }
+        if not report['speech']:
+            return report
+
+        pad = self.hangover_ms // self.frame_ms
+        padded = np.convolve(speech, np.ones(2 * pad + 1), mode='same') > 0
+        voiced = np.flatnonzero(padded)
+        start = voiced[0] * frame_len
+        end = min((voiced[-1] + 1) * frame_len, len(samples))
+        trimmed = duration - float(end - start) / sample_rate
+        if trimmed >= self.min_trim_seconds:
+            report['audio'] = encode_wav(samples[start:end], sample_rate)
+            report['trimmed'] = round(trimmed, 2)
+        return report
+
+
+class VADStats:
+    """Chunks dropped as silent, seconds trimmed and recent per-chunk speech ratios"""
+
+    def __init__(self, recent=50):
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.dropped = 0
+        self.undecoded = 0
+        self.trimmed_seconds = 0.0
+        self.speech_ratio_total = 0.0
+        self.recent = deque(maxlen=recent)
+
+    def record(self, report):
+        with self._lock:
+            self.chunks += 1
+            if report is None:
+                self.undecoded += 1
+                return
+            if not report['speech']:
+                self.dropped += 1
+            self.trimmed_seconds += report['trimmed']
+            self.speech_ratio_total += report['speech_ratio']
+            self.recent.append(report['speech_ratio'])
+
+    def snapshot(self):
+        with self._lock:
+            analysed = self.chunks - self.undecoded
+            return {
+                "chunks": self.chunks,
+                "dropped_silent": self.dropped,
+                "undecoded": self.undecoded,
+                "trimmed_seconds": round(self.trimmed_seconds, 2),
+                "avg_speech_ratio": round(self.speech_ratio_total / analysed, 3) if analysed else None,
+                "recent_speech_ratios": list(self.recent)
+            }
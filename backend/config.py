@@ -0,0 +1,161 @@
+"""
+Backend configuration
+Environment-driven settings shared by the Flask and ASGI servers
+"""
+
+import os
+import socket
+from dotenv import load_dotenv
+
+load_dotenv()
+
+OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+
+if not OPENAI_API_KEY:
+    raise ValueError("OPENAI_API_KEY not found in environment variables. Please set it in .env file")
+
+# 'parallel' runs the three agents as separate calls, 'fused' sends one combined request
+ANALYSIS_MODE = os.getenv('ANALYSIS_MODE', 'parallel').lower()
+
+if ANALYSIS_MODE not in ('parallel', 'fused'):
+    raise ValueError(f"ANALYSIS_MODE must be 'parallel' or 'fused', got '{ANALYSIS_MODE}'")
+
+# Stream the emergency agent and raise its alert as soon as the decision is parsed
+EMERGENCY_STREAMING = os.getenv('EMERGENCY_STREAMING', 'false').lower() == 'true'
+
+PORT = int(os.getenv('PORT', 5001))
+
+# Multi-worker mode: 'memory' keeps sessions in this process, 'redis' shares them through a
+# Redis-protocol server at REDIS_URL (see core/store.py). Socket events then go through the
+# message queue so rooms span workers; workers renew their calls' ownership every few seconds
+# and a call whose owner stopped for SESSION_OWNER_TTL seconds is taken over by another worker
+SESSION_STORE = os.getenv('SESSION_STORE', 'memory').lower()
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+SOCKETIO_MESSAGE_QUEUE = os.getenv('SOCKETIO_MESSAGE_QUEUE') or (REDIS_URL if SESSION_STORE == 'redis' else None)
+WORKER_ID = os.getenv('WORKER_ID') or f"{socket.gethostname()}:{os.getpid()}"
+SESSION_OWNER_TTL = int(os.getenv('SESSION_OWNER_TTL', 15))
+AFFINITY_POLL_SECONDS = float(os.getenv('AFFINITY_POLL_SECONDS', 0.05))
+
+# Durable session event log (see core/eventlog.py): one append-only file per call in EVENT_LOG_DIR,
+# committed to disk every EVENT_LOG_FLUSH_MS with one fsync per file, and replayed at startup.
+# Set EVENT_LOG_DIR empty to keep sessions in memory only
+EVENT_LOG_DIR = os.getenv('EVENT_LOG_DIR', 'session_logs')
+EVENT_LOG_FLUSH_MS = int(os.getenv('EVENT_LOG_FLUSH_MS', 50))
+
+# Session lifecycle: a stopped call stays in memory SESSION_STOPPED_TTL seconds, an active one that
+# has had no utterance for SESSION_IDLE_TTL seconds is stopped; the reaper checks every
+# SESSION_REAP_SECONDS and archives them (see core/sessions.py). Each call keeps its last
+# SESSION_MAX_TRANSCRIPT utterances and SESSION_MAX_ALERTS alerts in memory (see core/records.py)
+SESSION_STOPPED_TTL = int(os.getenv('SESSION_STOPPED_TTL', 300))
+SESSION_IDLE_TTL = int(os.getenv('SESSION_IDLE_TTL', 1800))
+SESSION_REAP_SECONDS = float(os.getenv('SESSION_REAP_SECONDS', 30))
+SESSION_MAX_TRANSCRIPT = int(os.getenv('SESSION_MAX_TRANSCRIPT', 2000))
+SESSION_MAX_ALERTS = int(os.getenv('SESSION_MAX_ALERTS', 500))
+
+# Reconnects: the last FANOUT_REPLAY_FRAMES socket frames of each call are kept so a dashboard that
+# rejoins with since_version gets only what it missed. REST transcript/alert pages hold API_PAGE_LIMIT
+# items unless ?limit= asks for another size, up to API_MAX_PAGE_LIMIT
+FANOUT_REPLAY_FRAMES = int(os.getenv('FANOUT_REPLAY_FRAMES', 200))
+API_PAGE_LIMIT = int(os.getenv('API_PAGE_LIMIT', 200))
+API_MAX_PAGE_LIMIT = int(os.getenv('API_MAX_PAGE_LIMIT', 1000))
+
+# Require at least this many meaningful characters to avoid noise/silence/Whisper hallucinations
+MIN_ANALYSIS_CHARS = 15
+
+# Shared OpenAI HTTP connection pool (see core/openai_pool.py)
+OPENAI_MAX_CONNECTIONS = int(os.getenv('OPENAI_MAX_CONNECTIONS', 64))
+OPENAI_MAX_KEEPALIVE = int(os.getenv('OPENAI_MAX_KEEPALIVE', 32))
+OPENAI_KEEPALIVE_EXPIRY = float(os.getenv('OPENAI_KEEPALIVE_EXPIRY', 60))
+OPENAI_HTTP2 = os.getenv('OPENAI_HTTP2', 'true').lower() == 'true'
+OPENAI_TIMEOUT = float(os.getenv('OPENAI_TIMEOUT', 30))
+OPENAI_CONNECT_TIMEOUT = float(os.getenv('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_WARMUP_CONNECTIONS = int(os.getenv('OPENAI_WARMUP_CONNECTIONS', 4))
+
+# Deadline and timeouts (seconds) for analysing one transcribed chunk
+CHUNK_DEADLINE = float(os.getenv('CHUNK_DEADLINE', 15))
+AGENT_TIMEOUTS = {
+    'emergency': float(os.getenv('AGENT_TIMEOUT_EMERGENCY', 8)),
+    'ae': float(os.getenv('AGENT_TIMEOUT_AE', 12)),
+    'appointment': float(os.getenv('AGENT_TIMEOUT_APPOINTMENT', 12)),
+    'sentiment': float(os.getenv('AGENT_TIMEOUT_SENTIMENT', 15)),
+    'fused': float(os.getenv('AGENT_TIMEOUT_FUSED', 15)),
+}
+AGENT_MAX_RETRIES = int(os.getenv('AGENT_MAX_RETRIES', 2))
+AGENT_WORKERS = int(os.getenv('AGENT_WORKERS', 32))
+
+# Hedge a slow emergency call with a duplicate after the agent's p95 latency
+EMERGENCY_HEDGING = os.getenv('EMERGENCY_HEDGING', 'true').lower() == 'true'
+HEDGE_MIN_DELAY = float(os.getenv('HEDGE_MIN_DELAY', 1.0))
+HEDGE_DEFAULT_DELAY = float(os.getenv('HEDGE_DEFAULT_DELAY', 3.0))
+
+# Provider quota shared by every OpenAI call in this process (see core/scheduler.py)
+LLM_RPM = int(os.getenv('LLM_RPM', 500))
+LLM_TPM = int(os.getenv('LLM_TPM', 200000))
+TRANSCRIPTION_RPM = int(os.getenv('TRANSCRIPTION_RPM', 50))
+SCHEDULER_MAX_QUEUE = int(os.getenv('SCHEDULER_MAX_QUEUE', 100))
+# Longest a request may queue for quota before it is shed (None = until its deadline)
+SCHEDULER_MAX_WAIT = {
+    'transcription': None,
+    'emergency': None,
+    'ae': float(os.getenv('SCHEDULER_MAX_WAIT_AE', 10)),
+    'appointment': float(os.getenv('SCHEDULER_MAX_WAIT_APPOINTMENT', 5)),
+    'sentiment': float(os.getenv('SCHEDULER_MAX_WAIT_SENTIMENT', 2)),
+}
+
+# Audio chunks a session may queue for transcription before new ones are refused
+PIPELINE_MAX_PENDING = int(os.getenv('PIPELINE_MAX_PENDING', 8))
+
+# Transcripts cached by audio hash: in-memory LRU budget, optional SQLite file and its TTL
+TRANSCRIPTION_CACHE_MAX_BYTES = int(os.getenv('TRANSCRIPTION_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+TRANSCRIPTION_CACHE_PATH = os.getenv('TRANSCRIPTION_CACHE_PATH', '')
+TRANSCRIPTION_CACHE_TTL = float(os.getenv('TRANSCRIPTION_CACHE_TTL', 7 * 24 * 3600))
+
+# Voice activity detection before Whisper: drop chunks with less speech than
+# VAD_MIN_SPEECH_MS, trim silent edges longer than VAD_MIN_TRIM_SECONDS (needs ffmpeg for webm)
+VAD_ENABLED = os.getenv('VAD_ENABLED', 'true').lower() == 'true'
+VAD_MIN_SPEECH_MS = int(os.getenv('VAD_MIN_SPEECH_MS', 250))
+VAD_ENERGY_MARGIN_DB = float(os.getenv('VAD_ENERGY_MARGIN_DB', 10))
+VAD_MIN_TRIM_SECONDS = float(os.getenv('VAD_MIN_TRIM_SECONDS', 0.5))
+
+# Long uploads are split at quiet points into ~UPLOAD_SEGMENT_SECONDS overlapping
+# segments, transcribed UPLOAD_WORKERS at a time
+UPLOAD_SEGMENT_SECONDS = float(os.getenv('UPLOAD_SEGMENT_SECONDS', 30))
+UPLOAD_SEGMENT_OVERLAP = float(os.getenv('UPLOAD_SEGMENT_OVERLAP', 1.0))
+UPLOAD_SEGMENT_MIN_BYTES = int(os.getenv('UPLOAD_SEGMENT_MIN_BYTES', 256 * 1024))
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 4))
+
+# Live streaming transcription: re-transcribe the open window every STREAM_STEP_SECONDS
+# of new audio (about one Whisper request per step per live call), finalize it after a
+# STREAM_FINAL_SILENCE_MS pause or at STREAM_MAX_WINDOW_SECONDS
+STREAM_STEP_SECONDS = float(os.getenv('STREAM_STEP_SECONDS', 1.0))
+STREAM_MAX_WINDOW_SECONDS = float(os.getenv('STREAM_MAX_WINDOW_SECONDS', 12))
+STREAM_FINAL_SILENCE_MS = int(os.getenv('STREAM_FINAL_SILENCE_MS', 700))
+STREAM_PROMPT_CHARS = int(os.getenv('STREAM_PROMPT_CHARS', 200))
+
+# Rolling clinical summary of the whole call shared by every agent's prompt (0 disables it)
+CLINICAL_SUMMARY_MAX_CHARS = int(os.getenv('CLINICAL_SUMMARY_MAX_CHARS', 600))
+
+# Vitals extracted from the transcript: alert when a temperature exceeds VITALS_FEVER_F (°F) or a
+# pain score rises VITALS_PAIN_RISE points above the lowest since the last pain alert
+VITALS_FEVER_F = float(os.getenv('VITALS_FEVER_F', 100.4))
+VITALS_PAIN_RISE = int(os.getenv('VITALS_PAIN_RISE', 3))
+VITALS_MAX_READINGS = int(os.getenv('VITALS_MAX_READINGS', 200))
+
+# Sentiment lane: the sentiment analyzer runs once per SENTIMENT_EVERY_UTTERANCES analysed
+# utterances (0 disables it), or sooner once the call has been quiet for SENTIMENT_IDLE_SECONDS
+SENTIMENT_EVERY_UTTERANCES = int(os.getenv('SENTIMENT_EVERY_UTTERANCES', 4))
+SENTIMENT_IDLE_SECONDS = float(os.getenv('SENTIMENT_IDLE_SECONDS', 3.0))
+
+# Acoustic features for the sentiment analyzer, extracted in ACOUSTIC_WORKERS processes
+# (0 disables); the sentiment agent waits at most ACOUSTIC_TIMEOUT seconds for them
+ACOUSTIC_WORKERS = int(os.getenv('ACOUSTIC_WORKERS', 2))
+ACOUSTIC_TIMEOUT = float(os.getenv('ACOUSTIC_TIMEOUT', 1.0))
+
+# Per-agent memo of results for repeated (statement, context) inputs; 0 entries disables it
+AGENT_MEMO_MAX_ENTRIES = int(os.getenv('AGENT_MEMO_MAX_ENTRIES', 2048))
+AGENT_MEMO_TTL = float(os.getenv('AGENT_MEMO_TTL', 3600))
+
+# Local relevance gate: skip agents an utterance is very unlikely to need
+RELEVANCE_GATE = os.getenv('RELEVANCE_GATE', 'true').lower() == 'true'
+# Emergency triage runs whenever its gate score reaches this, whatever the model file says
+GATE_EMERGENCY_MAX_THRESHOLD = float(os.getenv('GATE_EMERGENCY_MAX_THRESHOLD', 0.05))
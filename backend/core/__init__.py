@@ -0,0 +1,5 @@
+"""
+Core package initialization
+"""
+
+__all__ = ['analysis', 'routes', 'sessions']
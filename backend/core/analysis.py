@@ -0,0 +1,578 @@
+"""
+Analysis Engine
+Runs the clinical agents on a transcribed utterance and turns their results
+into session alerts. Shared by the Flask (threaded) and ASGI (asyncio) servers.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from agents.ae_detector import AdverseEventDetector
+from agents.appointment_agent import AppointmentAgent
+from agents.emergency_detector import EmergencyDetector
+from agents.sentiment_analyzer import SentimentMismatchAnalyzer
+from agents.fused_analyzer import FusedAnalyzer, AnalysisModeStats
+from agents.red_flags import RedFlagMatcher
+from agents.relevance_gate import GateStats, RelevanceGate, load_examples
+from audio.acoustics import AcousticAnalyzer
+from core.deadline import Deadline, LatencyWindow, once_per_key, once_per_key_async
+from core.openai_pool import get_factory
+from config import (
+    CHUNK_DEADLINE, AGENT_TIMEOUTS, AGENT_MAX_RETRIES, AGENT_WORKERS,
+    EMERGENCY_HEDGING, HEDGE_MIN_DELAY, HEDGE_DEFAULT_DELAY,
+    RELEVANCE_GATE, GATE_EMERGENCY_MAX_THRESHOLD, ACOUSTIC_TIMEOUT
+)
+
+
+# (result key, flag, alert type, default message, severity, action key)
+ALERT_RULES = [
+    ('ae', 'detected', 'adverse_event', 'Adverse event detected', 'high', 'recommended_action'),
+    ('appointment', 'issue_detected', 'appointment', 'Appointment issue detected', 'medium', 'suggested_action'),
+    ('emergency', 'is_emergency', 'emergency', 'Emergency detected', 'critical', 'action'),
+    ('sentiment', 'mismatch_detected', 'sentiment_mismatch', 'Sentiment-content mismatch detected', 'high',
+     'recommended_action'),
+]
+
+HEDGED_AGENT = 'emergency'
+
+# Vitals threshold -> (alert type, severity, action); raised from the extracted numbers alone
+VITAL_ALERT_RULES = {
+    'fever': ('fever', 'high',
+              'Check the wound and ask about chills, cough and urinary symptoms; arrange same-day review'),
+    'pain_increase': ('pain_increase', 'high',
+                      'Ask about the wound, bleeding and new symptoms; notify the surgical team'),
+}
+
+
+def agent_error_result(error):
+    return {"detected": False, "issue_detected": False, "is_emergency": False, "error": str(error)}
+
+
+def timed_out_result(agent):
+    """Explicit marker for an agent that missed the chunk deadline"""
+    return {agent.flag_key: False, "timed_out": True, "error": "agent timed out"}
+
+
+def skipped_result(agent):
+    """Placeholder for an agent the relevance gate did not call"""
+    return {agent.flag_key: False, "skipped": True}
+
+
+def timed_out_agents(results):
+    """Keys of the agents whose result is missing because of a timeout"""
+    return [key for key, *_ in ALERT_RULES if (results.get(key) or {}).get('timed_out')]
+
+
+def rate_limited_agents(results):
+    """Keys of the agents that got no answer because quota ran out (shed or 429)"""
+    return [key for key, *_ in ALERT_RULES if (results.get(key) or {}).get('rate_limited')]
+
+
+class DeadlineStats:
+    """How often chunks hit the deadline and how hedged requests fared"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.chunks = 0
+        self.deadline_misses = 0
+        self.agent_timeouts = {}
+        self.hedges_fired = 0
+        self.hedges_won = 0
+
+    def record_chunk(self, results):
+        timed_out = timed_out_agents(results)
+        with self._lock:
+            self.chunks += 1
+            if timed_out:
+                self.deadline_misses += 1
+            for key in timed_out:
+                self.agent_timeouts[key] = self.agent_timeouts.get(key, 0) + 1
+
+    def record_hedge(self, won=False):
+        with self._lock:
+            if won:
+                self.hedges_won += 1
+            else:
+                self.hedges_fired += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "chunks": self.chunks,
+                "deadline_misses": self.deadline_misses,
+                "agent_timeouts": dict(self.agent_timeouts),
+                "hedges_fired": self.hedges_fired,
+                "hedges_won": self.hedges_won
+            }
+
+
+class AnalysisEngine:
+    def __init__(self, api_key, mode='parallel', streaming=False,
+                 chunk_deadline=CHUNK_DEADLINE, hedging=EMERGENCY_HEDGING, gating=RELEVANCE_GATE):
+        self.mode = mode
+        self.streaming = streaming
+        self.chunk_deadline = chunk_deadline
+        self.hedging = hedging
+        self.clients = get_factory(api_key)
+        self.ae_detector = AdverseEventDetector(api_key)
+        self.appointment_agent = AppointmentAgent(api_key)
+        self.emergency_detector = EmergencyDetector(api_key)
+        self.sentiment_analyzer = SentimentMismatchAnalyzer(api_key)
+        # Voice features for the sentiment analyzer, extracted in worker processes
+        self.acoustics = AcousticAnalyzer()
+        # Emergency first: its section streams (and can alert) before the others
+        self.fused_analyzer = FusedAnalyzer(
+            api_key, [self.emergency_detector, self.ae_detector, self.appointment_agent]
+        )
+        for key, agent in list(self.agents.items()) + [('sentiment', self.sentiment_analyzer), ('fused', self.fused_analyzer)]:
+            agent.timeout = AGENT_TIMEOUTS[key]
+            agent.max_retries = AGENT_MAX_RETRIES
+        # Long-lived, so a chunk never pays for spinning up worker threads
+        self.executor = ThreadPoolExecutor(max_workers=AGENT_WORKERS, thread_name_prefix='agent')
+        self.hedge_latency = LatencyWindow()
+        # Compiled once; also used by the servers for provisional red-flag alerts
+        self.red_flags = RedFlagMatcher.load()
+        self.gate = RelevanceGate.load(
+            self.red_flags, emergency_max_threshold=GATE_EMERGENCY_MAX_THRESHOLD
+        ) if gating else None
+        self._gate_recall = None
+        self.stats = AnalysisModeStats()
+        self.deadline_stats = DeadlineStats()
+        self.gate_stats = GateStats()
+
+    def agent_usage(self):
+        """Per-agent token usage, latency and prefix-cache hit rate"""
+        usage = {agent.name: agent.usage.snapshot() for agent in self.agents.values()}
+        usage['sentiment'] = self.sentiment_analyzer.usage.snapshot()
+        usage['fused'] = self.fused_analyzer.usage.snapshot()
+        return usage
+
+    def memo_stats(self):
+        """Per-agent memo hit rates, with the prompt version results are keyed under"""
+        agents = list(self.agents.values()) + [self.sentiment_analyzer]
+        return {agent.name: dict(agent.memo.stats(), prompt_version=agent.prompt_version) for agent in agents}
+
+    def invalidate_memo(self):
+        for agent in list(self.agents.values()) + [self.sentiment_analyzer]:
+            agent.memo.invalidate()
+
+    @property
+    def agents(self):
+        return {
+            'ae': self.ae_detector,
+            'appointment': self.appointment_agent,
+            'emergency': self.emergency_detector,
+        }
+
+    def select_agents(self, transcript_text, gate_stats=None):
+        """Keys of the agents worth calling for this utterance, per the relevance gate"""
+        if self.gate is None:
+            return list(self.agents)
+        decision = self.gate.select(transcript_text)
+        # Only count agents this engine actually runs
+        decision = {
+            "called": [key for key in decision['called'] if key in self.agents],
+            "skipped": [key for key in decision['skipped'] if key in self.agents],
+        }
+        counted = decision
+        if self.mode == 'fused' and decision['called']:
+            # The fused request answers for every agent, so it only saves a call when all are skipped
+            counted = {"called": list(self.agents), "skipped": []}
+        for stats in (self.gate_stats, gate_stats):
+            if stats is not None:
+                stats.record(counted)
+        if decision['skipped']:
+            print(f"🚪 Gate skipped: {', '.join(decision['skipped'])}")
+        return decision['called']
+
+    def sentiment_wanted(self, window_text, gate_stats=None):
+        """The relevance gate's call on a sentiment window (always True without a gate)"""
+        if self.gate is None:
+            return True
+        wanted = 'sentiment' in self.gate.select(window_text)['called']
+        decision = {"called": ['sentiment'] if wanted else [], "skipped": [] if wanted else ['sentiment']}
+        for stats in (self.gate_stats, gate_stats):
+            if stats is not None:
+                # Its utterances were already counted when the other agents were gated
+                stats.record(decision, utterances=0)
+        return wanted
+
+    def analyze_sentiment(self, window, conversation_history, gate_stats=None, summary=None):
+        """
+        Run the sentiment analyzer on a window from SentimentCadence, with
+        the acoustic features of its latest utterance if they are ready
+        It queues behind the other agents for rate-limit quota and has no
+        chunk deadline: nothing waits on it.
+        Returns: {"sentiment": result}, shaped like analyze()'s results
+        """
+        agent = self.sentiment_analyzer
+        if not self.sentiment_wanted(window['text'], gate_stats):
+            print(f"🚪 Gate skipped: sentiment ({window['utterances']} utterance window)")
+            return {'sentiment': skipped_result(agent)}
+        acoustics = self.acoustics.result(window['acoustics'], ACOUSTIC_TIMEOUT)
+        print(f"🎭 Running sentiment analysis over {window['utterances']} utterance(s)"
+              f"{' with voice features' if acoustics else ''}")
+        return {'sentiment': agent.analyze(window['text'], acoustics, conversation_history, summary=summary)}
+
+    async def analyze_sentiment_async(self, window, conversation_history, gate_stats=None, summary=None):
+        """Async counterpart of analyze_sentiment()"""
+        agent = self.sentiment_analyzer
+        if not self.sentiment_wanted(window['text'], gate_stats):
+            print(f"🚪 Gate skipped: sentiment ({window['utterances']} utterance window)")
+            return {'sentiment': skipped_result(agent)}
+        acoustics = await self.acoustics.result_async(window['acoustics'], ACOUSTIC_TIMEOUT)
+        print(f"🎭 Running sentiment analysis over {window['utterances']} utterance(s)"
+              f"{' with voice features' if acoustics else ''}")
+        result = await agent.analyze_async(window['text'], acoustics, conversation_history, summary=summary)
+        return {'sentiment': result}
+
+    def gate_report(self):
+        """Gate model, thresholds and its recall on the labelled set"""
+        if self.gate is None:
+            return {"enabled": False}
+        if self._gate_recall is None:
+            self._gate_recall = self.gate.evaluate(load_examples())
+        return {
+            "enabled": True,
+            "version": self.gate.version,
+            "thresholds": self.gate.thresholds,
+            "labelled_set": self._gate_recall,
+            "cross_validated": self.gate.model.get('cross_validated')
+        }
+
+    def hedge_delay(self):
+        """Seconds to wait on the emergency call before sending a duplicate"""
+        p95 = self.hedge_latency.percentile(95)
+        if p95 is None:
+            return HEDGE_DEFAULT_DELAY
+        return max(HEDGE_MIN_DELAY, p95)
+
+    def _agent_call(self, key, agent, on_early, summary=None):
+        if self.streaming and on_early and key == 'emergency':
+            return lambda text, history, deadline: agent.analyze_stream(
+                text, history, on_early, deadline, summary=summary
+            )
+        return lambda text, history, deadline: agent.analyze(text, history, deadline, summary=summary)
+
+    def _agent_call_async(self, key, agent, on_early, summary=None):
+        if self.streaming and on_early and key == 'emergency':
+            return lambda text, history, deadline: agent.analyze_stream_async(
+                text, history, on_early, deadline, summary=summary
+            )
+        return lambda text, history, deadline: agent.analyze_async(text, history, deadline, summary=summary)
+
+    def _accept(self, results, key, result, twin_pending, hedged):
+        """
+        Keep the first usable answer per agent; an error is only kept once its
+        hedged twin (if any) has failed too. Returns True if accepted.
+        """
+        if key in results:
+            return False
+        if 'error' in result and twin_pending:
+            return False
+        results[key] = result
+        usage = result.get('usage')
+        if key == HEDGED_AGENT and usage:
+            self.hedge_latency.record(usage['latency'])
+        if hedged:
+            self.deadline_stats.record_hedge(won=True)
+        print(f"✅ {key} agent done{' (hedge)' if hedged else ''}")
+        return True
+
+    def _fill_timeouts(self, results, keys):
+        for key in keys:
+            if key not in results:
+                print(f"⏰ {key} agent missed the chunk deadline")
+                results[key] = timed_out_result(self.agents[key])
+        return results
+
+    def _hedge_at(self, keys):
+        if not self.hedging or HEDGED_AGENT not in keys:
+            return None
+        return time.monotonic() + self.hedge_delay()
+
+    def run_parallel_agents(self, transcript_text, conversation_history, on_early=None, deadline=None, keys=None,
+                            summary=None):
+        """
+        Run the AE, appointment and emergency agents (or just `keys`) as concurrent calls
+        Returns once every agent answered or the deadline passed; agents still
+        running by then get a `timed_out` result instead of holding the chunk.
+        """
+        keys = list(self.agents) if keys is None else keys
+        deadline = deadline or Deadline(self.chunk_deadline)
+        on_early = once_per_key(on_early)  # hedged duplicates must not alert twice
+        calls = {key: self._agent_call(key, self.agents[key], on_early, summary) for key in keys}
+        futures = {
+            self.executor.submit(call, transcript_text, conversation_history, deadline): (key, False)
+            for key, call in calls.items()
+        }
+        hedge_at = self._hedge_at(keys)
+        pending = set(futures)
+        results = {}
+
+        while pending and len(results) < len(calls) and not deadline.expired:
+            timeout = deadline.remaining()
+            if hedge_at is not None:
+                timeout = min(timeout, max(0.0, hedge_at - time.monotonic()))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                key, hedged = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ {key} agent error: {e}")
+                    result = agent_error_result(e)
+                twin_pending = any(futures[other][0] == key for other in pending)
+                self._accept(results, key, result, twin_pending, hedged)
+
+            if hedge_at is not None and time.monotonic() >= hedge_at:
+                hedge_at = None
+                if HEDGED_AGENT not in results:
+                    print(f"🪞 Hedging slow {HEDGED_AGENT} call")
+                    self.deadline_stats.record_hedge()
+                    hedge = self.executor.submit(calls[HEDGED_AGENT], transcript_text, conversation_history, deadline)
+                    futures[hedge] = (HEDGED_AGENT, True)
+                    pending.add(hedge)
+
+        # Stragglers finish on their own: their timeouts are clipped to the deadline
+        for future in pending:
+            future.cancel()
+        return self._fill_timeouts(results, keys)
+
+    async def run_parallel_agents_async(self, transcript_text, conversation_history, on_early=None, deadline=None,
+                                        keys=None, summary=None):
+        """Await the agents concurrently on the event loop, within the deadline"""
+        keys = list(self.agents) if keys is None else keys
+        deadline = deadline or Deadline(self.chunk_deadline)
+        on_early = once_per_key_async(on_early)
+        calls = {key: self._agent_call_async(key, self.agents[key], on_early, summary) for key in keys}
+        tasks = {
+            asyncio.ensure_future(call(transcript_text, conversation_history, deadline)): (key, False)
+            for key, call in calls.items()
+        }
+        hedge_at = self._hedge_at(keys)
+        pending = set(tasks)
+        results = {}
+
+        try:
+            while pending and len(results) < len(calls) and not deadline.expired:
+                timeout = deadline.remaining()
+                if hedge_at is not None:
+                    timeout = min(timeout, max(0.0, hedge_at - time.monotonic()))
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    key, hedged = tasks[task]
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"❌ {key} agent error: {e}")
+                        result = agent_error_result(e)
+                    twin_pending = any(tasks[other][0] == key for other in pending)
+                    self._accept(results, key, result, twin_pending, hedged)
+
+                if hedge_at is not None and time.monotonic() >= hedge_at:
+                    hedge_at = None
+                    if HEDGED_AGENT not in results:
+                        print(f"🪞 Hedging slow {HEDGED_AGENT} call")
+                        self.deadline_stats.record_hedge()
+                        hedge = asyncio.ensure_future(
+                            calls[HEDGED_AGENT](transcript_text, conversation_history, deadline)
+                        )
+                        tasks[hedge] = (HEDGED_AGENT, True)
+                        pending.add(hedge)
+        finally:
+            for task in pending:
+                task.cancel()
+        return self._fill_timeouts(results, keys)
+
+    def _skipped(self, results, keys):
+        for key, agent in self.agents.items():
+            if key not in keys:
+                results[key] = skipped_result(agent)
+        return results
+
+    def analyze(self, transcript_text, conversation_history, on_early=None, gate_stats=None, summary=None):
+        """
+        Run the configured analysis path on the agents the relevance gate
+        picks, within the chunk deadline, and record its per-chunk cost
+
+        With streaming enabled, on_early(key, partial) fires from the agent's
+        worker thread as soon as a partial result is safe to act on.
+        gate_stats (e.g. the session's) also gets the gate's decision.
+        summary is the session's rendered clinical state, shared by every agent.
+        """
+        keys = self.select_agents(transcript_text, gate_stats)
+        if not keys:
+            print("🚪 Gate: no agent worth calling for this utterance")
+            return self._skipped({}, keys)
+
+        started = time.perf_counter()
+        deadline = Deadline(self.chunk_deadline)
+        if self.mode == 'fused':
+            # One call either way: a fused request answers for all three agents
+            print(f"🚀 Running fused analysis for: {transcript_text[:80]}...")
+            if self.streaming and on_early:
+                results = self.fused_analyzer.analyze_stream(
+                    transcript_text, conversation_history, on_early, deadline, summary
+                )
+            else:
+                results = self.fused_analyzer.analyze(transcript_text, conversation_history, deadline, summary)
+        else:
+            print(f"🚀 Running {len(keys)} agent(s) in parallel for: {transcript_text[:80]}...")
+            results = self._skipped(
+                self.run_parallel_agents(transcript_text, conversation_history, on_early, deadline, keys, summary),
+                keys
+            )
+        self.stats.record(self.mode, results, time.perf_counter() - started)
+        self.deadline_stats.record_chunk(results)
+        return results
+
+    async def analyze_async(self, transcript_text, conversation_history, on_early=None, gate_stats=None,
+                            summary=None):
+        """Async counterpart of analyze(); on_early must be a coroutine function"""
+        keys = self.select_agents(transcript_text, gate_stats)
+        if not keys:
+            print("🚪 Gate: no agent worth calling for this utterance")
+            return self._skipped({}, keys)
+
+        started = time.perf_counter()
+        deadline = Deadline(self.chunk_deadline)
+        if self.mode == 'fused':
+            print(f"🚀 Running fused analysis for: {transcript_text[:80]}...")
+            if self.streaming and on_early:
+                results = await self.fused_analyzer.analyze_stream_async(
+                    transcript_text, conversation_history, on_early, deadline, summary
+                )
+            else:
+                results = await self.fused_analyzer.analyze_async(
+                    transcript_text, conversation_history, deadline, summary
+                )
+        else:
+            print(f"🚀 Running {len(keys)} agent(s) concurrently for: {transcript_text[:80]}...")
+            results = self._skipped(
+                await self.run_parallel_agents_async(
+                    transcript_text, conversation_history, on_early, deadline, keys, summary
+                ),
+                keys
+            )
+        self.stats.record(self.mode, results, time.perf_counter() - started)
+        self.deadline_stats.record_chunk(results)
+        return results
+
+
+def collect_alerts(session, results, early_alerts=None):
+    """
+    Turn agent results into session alerts, honouring the per-type cooldown
+    Results whose alert already went out early (see early_alert) are skipped.
+    Returns: list of newly added alerts, ready to emit
+    """
+    early_alerts = early_alerts or {}
+    alerts = []
+    for key, flag, alert_type, default_message, severity, action_key in ALERT_RULES:
+        if key in early_alerts:
+            continue
+        result = results.get(key, {})
+        if not (result and result.get(flag)):
+            continue
+        if not session.can_emit_alert(alert_type):
+            print(f"⏳ {alert_type} alert suppressed (cooldown)")
+            continue
+        alerts.append(session.add_alert(
+            alert_type,
+            result.get('message', default_message),
+            severity,
+            result.get(action_key)
+        ))
+    return alerts
+
+
+def early_alert(session, key, partial):
+    """
+    Raise the alert for a partial (still streaming) agent result
+    Returns: the alert marked `partial`, or None if nothing to raise
+    """
+    alerts = collect_alerts(session, {key: partial})
+    if not alerts:
+        return None
+    alert = alerts[0]
+    alert['partial'] = True
+    return alert
+
+
+def provisional_alerts(session, hits):
+    """
+    Raise alerts straight from red-flag lexicon hits, before any agent answers
+    Returns: {result key: alert}, to pass along as early alerts so the
+             agents' verdict confirms or retracts them
+    """
+    rules = {rule[0]: rule for rule in ALERT_RULES}
+    alerts = {}
+    for hit in hits:
+        key = hit['agent']
+        if key in alerts or key not in rules:
+            continue
+        _, _, alert_type, _, severity, _ = rules[key]
+        if not session.can_emit_alert(alert_type):
+            print(f"⏳ {alert_type} pre-alert suppressed (cooldown)")
+            continue
+        alert = session.add_alert(alert_type, f"🚩 {hit['label']}", severity, hit['action'])
+        alert['provisional'] = True
+        alert['matched'] = hit['phrase']
+        alerts[key] = alert
+    return alerts
+
+
+def vital_alerts(session, entry):
+    """
+    Raise alerts for vitals readings in a transcript entry that crossed a
+    threshold (see VitalsSeries.add); deterministic, no agent involved
+    Returns: list of alerts to emit
+    """
+    alerts = []
+    for reading in entry.get('vitals', ()):
+        if reading.get('threshold') not in VITAL_ALERT_RULES:
+            continue
+        alert_type, severity, action = VITAL_ALERT_RULES[reading['threshold']]
+        if not session.can_emit_alert(alert_type):
+            print(f"⏳ {alert_type} vitals alert suppressed (cooldown)")
+            continue
+        if alert_type == 'fever':
+            message = f"🌡️ Temperature {reading['value']:g}°F ({reading['celsius']:g}°C) reported"
+        else:
+            message = f"📈 Pain rose from {reading['baseline']:g}/10 to {reading['value']:g}/10"
+        alert = session.add_alert(alert_type, message, severity, action)
+        alert['vital'] = {"kind": reading['kind'], "value": reading['value'], "unit": reading['unit']}
+        alert['matched'] = reading['phrase']
+        alerts.append(alert)
+    return alerts
+
+
+def complete_early_alerts(session, results, early_alerts):
+    """
+    Settle alerts raised ahead of the full result (partial stream or red-flag
+    pre-alert): confirmed ones get the agent's details, ones the agent answered
+    negatively are retracted. Without a verdict (error, timeout) they stand.
+    Returns: list of updated alerts, to emit as `alert_update`
+    """
+    updated = []
+    for key, flag, alert_type, default_message, severity, action_key in ALERT_RULES:
+        alert = early_alerts.get(key)
+        if alert is None:
+            continue
+        result = results.get(key) or {}
+        if result.get(flag):
+            alert['message'] = result.get('message', alert['message'])
+            alert['action'] = result.get(action_key) or alert['action']
+            for marker in ('partial', 'provisional'):
+                if marker in alert:
+                    alert[marker] = False
+        elif result and 'error' not in result and not result.get('skipped'):
+            session.retract_alert(alert)
+            print(f"↩️ {alert_type} pre-alert retracted by the {key} agent")
+        else:
+            continue
+        updated.append(alert)
+    return updated
@@ -0,0 +1,141 @@
+"""
+Deadlines, Retries and Hedging
+Time budget helpers that bound how long one chunk's analysis can take
+"""
+
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+import openai
+
+
+# Transient failures worth another attempt; anything else fails fast
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+
+class DeadlineExceeded(Exception):
+    """The chunk's time budget ran out before the call could (re)start"""
+
+
+class Deadline:
+    """End-to-end time budget for one chunk, shared by all its agent calls"""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self):
+        return self.remaining() <= 0
+
+    def timeout_for(self, per_call_timeout):
+        """Per-call timeout clipped to what is left of the budget"""
+        return min(per_call_timeout, self.remaining())
+
+
+def backoff_delay(attempt, base=0.25, cap=2.0):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def _next_timeout(per_call_timeout, deadline):
+    timeout = per_call_timeout if deadline is None else deadline.timeout_for(per_call_timeout)
+    if timeout <= 0:
+        raise DeadlineExceeded("chunk deadline passed")
+    return timeout
+
+
+def retry_call(fn, per_call_timeout, deadline=None, max_retries=2):
+    """
+    Call fn(timeout) with bounded, jittered retries on transient errors,
+    never sleeping or starting an attempt past the deadline
+    """
+    attempt = 0
+    while True:
+        try:
+            return fn(_next_timeout(per_call_timeout, deadline))
+        except RETRYABLE_ERRORS as e:
+            delay = backoff_delay(attempt)
+            if attempt >= max_retries or (deadline and deadline.remaining() <= delay):
+                raise
+            print(f"🔁 Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            time.sleep(delay)
+            attempt += 1
+
+
+async def retry_call_async(fn, per_call_timeout, deadline=None, max_retries=2):
+    """Async counterpart of retry_call(); fn(timeout) returns an awaitable"""
+    attempt = 0
+    while True:
+        try:
+            return await fn(_next_timeout(per_call_timeout, deadline))
+        except RETRYABLE_ERRORS as e:
+            delay = backoff_delay(attempt)
+            if attempt >= max_retries or (deadline and deadline.remaining() <= delay):
+                raise
+            print(f"🔁 Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def is_timeout(error):
+    return isinstance(error, (DeadlineExceeded, openai.APITimeoutError))
+
+
+class LatencyWindow:
+    """Recent latencies of one agent, for picking a p95-based hedge delay"""
+
+    def __init__(self, size=200, min_samples=20):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=size)
+        self.min_samples = min_samples
+
+    def record(self, latency):
+        with self._lock:
+            self._samples.append(latency)
+
+    def percentile(self, pct):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def once_per_key(callback):
+    """Let callback(key, ...) fire only once per key, e.g. across hedged duplicates"""
+    if callback is None:
+        return None
+    fired = set()
+    lock = threading.Lock()
+
+    def wrapper(key, *args):
+        with lock:
+            if key in fired:
+                return
+            fired.add(key)
+        callback(key, *args)
+    return wrapper
+
+
+def once_per_key_async(callback):
+    if callback is None:
+        return None
+    fired = set()
+
+    async def wrapper(key, *args):
+        if key in fired:
+            return
+        fired.add(key)
+        await callback(key, *args)
+    return wrapper
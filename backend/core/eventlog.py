@@ -0,0 +1,294 @@
+"""
+Session Event Log
+Durable, append-only record of each call: its start, transcript entries,
+alerts (and their updates), agent results and stop, one JSON line per event
+with a per-session sequence number, in EVENT_LOG_DIR/<session>.log.
+
+Appending only queues the line; a writer thread commits everything queued
+every EVENT_LOG_FLUSH_MS with one write and one fsync per file (group
+commit), so no request waits on the disk. On stop the log is compacted into
+<session>.snapshot.json, and once the session leaves memory the snapshot is
+moved to EVENT_LOG_DIR/archive/. At startup, replaying snapshots and logs
+rebuilds the sessions a crash or restart interrupted.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from urllib.parse import quote, unquote
+from config import EVENT_LOG_DIR, EVENT_LOG_FLUSH_MS
+
+LOG_SUFFIX = '.log'
+SNAPSHOT_SUFFIX = '.snapshot.json'
+ARCHIVE_DIR = 'archive'
+
+
+def _fsync_write(path, text):
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(text)
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+class Operation(str):
+    """A queued compact/archive request, told apart from queued log lines"""
+
+
+class EventLog:
+    """
+    Per-session append-only logs with group commit
+
+    append() assigns the event its sequence number and queues it; the writer
+    thread does the I/O. compact() queues the replacement of the session's
+    log by a snapshot replayed from disk (after its earlier events land),
+    archive() the same followed by moving the snapshot out of recovery's way.
+    flush() waits until everything queued so far is on disk.
+    """
+
+    def __init__(self, directory=EVENT_LOG_DIR, flush_ms=EVENT_LOG_FLUSH_MS):
+        self.directory = directory
+        self.interval = flush_ms / 1000
+        self._cond = threading.Condition()
+        self._pending = []  # (session_id, line), or (session_id, 'compact' / 'archive') operations
+        self._seqs = {}  # session_id -> last sequence number
+        self._files = {}  # session_id -> open log file
+        self._written = 0  # batches committed
+        self._queued = 0  # batches handed to the writer
+        self._urgent = False  # a flush or compaction is waiting: commit without the gather delay
+        self._oldest = None  # monotonic time the oldest pending event was queued
+        self._thread = None
+        self.events = 0
+        self.commits = 0
+        self.fsyncs = 0
+        if self.enabled:
+            os.makedirs(os.path.join(directory, ARCHIVE_DIR), exist_ok=True)
+
+    @property
+    def enabled(self):
+        return bool(self.directory)
+
+    def _path(self, session_id, suffix, archived=False):
+        directory = os.path.join(self.directory, ARCHIVE_DIR) if archived else self.directory
+        return os.path.join(directory, quote(session_id, safe='') + suffix)
+
+    def append(self, session_id, event_type, data=None):
+        """Queue one event; returns its sequence number (None when logging is off)"""
+        if not self.enabled:
+            return None
+        with self._cond:
+            seq = self._seqs.get(session_id, 0) + 1
+            self._seqs[session_id] = seq
+            line = json.dumps({
+                "seq": seq, "type": event_type, "ts": datetime.now().isoformat(), "data": data
+            }, default=str)
+            self._pending.append((session_id, line + "\n"))
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            self.events += 1
+            self._start()
+            self._cond.notify()
+            return seq
+
+    def compact(self, session_id):
+        """Replace the session's log with a snapshot of everything logged so far"""
+        self._queue_operation(session_id, 'compact')
+
+    def archive(self, session_id):
+        """Compact a session that left memory and move its snapshot to the archive"""
+        self._queue_operation(session_id, 'archive')
+        with self._cond:
+            self._seqs.pop(session_id, None)
+
+    def _queue_operation(self, session_id, operation):
+        if not self.enabled:
+            return
+        with self._cond:
+            self._pending.append((session_id, Operation(operation)))
+            self._urgent = True
+            self._start()
+            self._cond.notify()
+
+    def flush(self, timeout=5.0):
+        """Block until everything queued so far is committed"""
+        if not self.enabled:
+            return
+        with self._cond:
+            # The batch being written now, plus one more for whatever is still pending
+            target = self._queued + (1 if self._pending else 0)
+            if self._written >= target:
+                return
+            self._urgent = True
+            self._cond.notify()
+            self._cond.wait_for(lambda: self._written >= target, timeout)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._writer, name='event-log', daemon=True)
+            self._thread.start()
+
+    def _writer(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending, None)
+                # Let a burst of appends gather into one commit, at most EVENT_LOG_FLUSH_MS after the first
+                deadline = self._oldest + self.interval if self._oldest is not None else time.monotonic()
+                while not self._urgent:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch, self._pending = self._pending, []
+                self._urgent = False
+                self._oldest = None
+                self._queued += 1
+                number = self._queued
+            try:
+                self._commit(batch)
+            except OSError as e:
+                print(f"❌ Event log write failed: {e}")
+            with self._cond:
+                self._written = number
+                self._cond.notify_all()
+
+    def _commit(self, batch):
+        lines = {}
+        for session_id, item in batch:
+            if not isinstance(item, Operation):
+                lines.setdefault(session_id, []).append(item)
+                continue
+            # Land the events queued before the operation, then swap the log for a snapshot
+            self._write_lines(lines)
+            lines = {}
+            self._write_snapshot(session_id)
+            if item == 'archive':
+                self._move_to_archive(session_id)
+        self._write_lines(lines)
+        self.commits += 1
+
+    def _write_lines(self, lines):
+        for session_id, chunk in lines.items():
+            handle = self._files.get(session_id)
+            if handle is None:
+                handle = self._files[session_id] = open(self._path(session_id, LOG_SUFFIX), 'a', encoding='utf-8')
+            handle.write("".join(chunk))
+            handle.flush()
+            os.fsync(handle.fileno())
+            self.fsyncs += 1
+
+    def _write_snapshot(self, session_id):
+        if not os.path.exists(self._path(session_id, LOG_SUFFIX)):
+            return  # nothing logged since the last snapshot
+        snapshot = self._replay(session_id)
+        if snapshot is None:
+            return
+        snapshot['start_time'] = snapshot['start_time'].isoformat()
+        path = self._path(session_id, SNAPSHOT_SUFFIX)
+        _fsync_write(path + '.tmp', json.dumps(snapshot, default=str))
+        os.replace(path + '.tmp', path)
+        handle = self._files.pop(session_id, None)
+        if handle:
+            handle.close()
+        log_path = self._path(session_id, LOG_SUFFIX)
+        if os.path.exists(log_path):
+            os.remove(log_path)
+        self.fsyncs += 1
+        print(f"💾 Session {session_id} compacted to a snapshot (seq {snapshot['last_seq']})")
+
+    def _move_to_archive(self, session_id):
+        path = self._path(session_id, SNAPSHOT_SUFFIX)
+        if os.path.exists(path):
+            os.replace(path, self._path(session_id, SNAPSHOT_SUFFIX, archived=True))
+
+    def load_archived(self, session_id):
+        """The archived record of a session that left memory, or None (same shape as recover()'s)"""
+        if not self.enabled:
+            return None
+        path = self._path(session_id, SNAPSHOT_SUFFIX, archived=True)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as handle:
+            record = json.load(handle)
+        record['start_time'] = datetime.fromisoformat(record['start_time'])
+        return record
+
+    def recover(self):
+        """
+        Rebuild every logged session from its snapshot plus later events
+        Returns: list of records {"session_id", "start_time", "is_active",
+                 "transcript", "alerts", "last_seq"}, oldest first
+        """
+        if not self.enabled:
+            return []
+        session_ids = set()
+        for name in os.listdir(self.directory):
+            for suffix in (LOG_SUFFIX, SNAPSHOT_SUFFIX):
+                if name.endswith(suffix):
+                    session_ids.add(unquote(name[:-len(suffix)]))
+        records = [record for record in map(self._replay, session_ids) if record]
+        records.sort(key=lambda record: record['start_time'])
+        with self._cond:
+            for record in records:
+                self._seqs[record['session_id']] = record['last_seq']
+        return records
+
+    def _replay(self, session_id):
+        record = None
+        snapshot_path = self._path(session_id, SNAPSHOT_SUFFIX)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, encoding='utf-8') as handle:
+                record = json.load(handle)
+        alerts = {alert['id']: alert for alert in (record or {}).get('alerts', [])}
+        log_path = self._path(session_id, LOG_SUFFIX)
+        if os.path.exists(log_path):
+            with open(log_path, 'rb+') as handle:
+                valid = 0
+                for line in handle:
+                    try:
+                        event = json.loads(line)
+                    except ValueError:
+                        # Torn final line from a crash mid-write: cut it off so new events start clean
+                        handle.truncate(valid)
+                        break
+                    valid += len(line)
+                    if record is not None and event['seq'] <= record['last_seq']:
+                        continue
+                    data = event['data']
+                    if event['type'] == 'start':
+                        record = {"session_id": session_id, "start_time": data['start_time'], "is_active": True,
+                                  "transcript": [], "alerts": [], "last_seq": 0}
+                    elif record is None:
+                        continue  # nothing to attach to without the start event
+                    elif event['type'] == 'transcript':
+                        record['transcript'].append(data)
+                    elif event['type'] == 'alert':
+                        alerts[data['id']] = data
+                    elif event['type'] == 'stop':
+                        record['is_active'] = False
+                    record['last_seq'] = event['seq']
+        if record is None:
+            return None
+        record['alerts'] = sorted(alerts.values(), key=lambda alert: alert['id'])
+        record['start_time'] = datetime.fromisoformat(record['start_time'])
+        return record
+
+    def stats(self):
+        with self._cond:
+            return {
+                "enabled": self.enabled,
+                "events": self.events,
+                "commits": self.commits,
+                "fsyncs": self.fsyncs,
+                "pending": len(self._pending),
+                # How long the oldest queued event has waited; stays under EVENT_LOG_FLUSH_MS when healthy
+                "lag_ms": round((time.monotonic() - self._oldest) * 1000, 1) if self._oldest is not None else 0.0,
+                "open_logs": len(self._files),
+                "events_per_fsync": round(self.events / self.fsyncs, 2) if self.fsyncs else 0.0
+            }
+
+
+# One per process; everything queued is committed before exit
+event_log = EventLog()
+atexit.register(event_log.flush)
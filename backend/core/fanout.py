@@ -0,0 +1,185 @@
+"""
+Socket Fan-out
+Room-scoped delivery of session updates. Each dashboard subscribes to one
+call (or to every call, for a ward display) with a minimum alert severity,
+and sits in the room for that subscription. Everything one analysis pass
+produces (alerts, alert updates, transcript lines, partial-result notices)
+goes out as a single versioned frame per room, filtered on the server, so a
+tick costs one emit per distinct subscription rather than one per client,
+and nobody receives calls or severities they did not ask for. The last
+FANOUT_REPLAY_FRAMES ticks of each call are kept, so a dashboard rejoining
+after a network blip is sent only the frames it missed.
+"""
+
+import threading
+from core.store import session_store
+
+SEVERITIES = ('low', 'medium', 'high', 'critical')
+SEVERITY_RANK = {severity: rank for rank, severity in enumerate(SEVERITIES)}
+ALL_SESSIONS = '*'
+
+# Frame fields that are not alerts: only sent to subscribers that want the full feed
+DETAIL_FIELDS = ('transcript', 'timed_out', 'rate_limited')
+
+
+def subscription_room(session_id, min_severity, alerts_only):
+    return f"{session_id}|{min_severity}|{'alerts' if alerts_only else 'all'}"
+
+
+def parse_room(room):
+    """(session_id, min_severity, alerts_only) of a subscription room"""
+    session_id, min_severity, kind = room.rsplit('|', 2)
+    return session_id, min_severity, kind == 'alerts'
+
+
+def room_session_id(room):
+    return parse_room(room)[0]
+
+
+class SessionFanout:
+    """
+    Subscriptions and frame building for the socket servers
+
+    subscribe()/unsubscribe() track which room each socket belongs in (the
+    server does the actual join_room/leave_room); frames() turns one tick's
+    output into (room, frame) pairs for the rooms that have subscribers.
+    Room membership counts and frame versions live in the session store, so
+    with several workers the one running a call also sees subscribers
+    connected to the others. Frame versions count up per session, so a
+    client can order frames; a filtered subscription sees gaps where nothing
+    passed its filter. replay() rebuilds the frames after a version from the
+    buffered ticks, for one subscription's filter.
+    """
+
+    def __init__(self, store=session_store):
+        self._lock = threading.Lock()
+        self.store = store
+        self._subscriptions = {}  # sid -> room, for this worker's sockets
+        self.frames_built = 0
+        self.emits = 0
+        self.filtered = 0
+        self.replayed = 0
+
+    def subscribe(self, sid, session_id, min_severity='low', alerts_only=False):
+        """
+        Move a socket to the room for this subscription
+        Returns: (room to join, previous room to leave or None)
+        """
+        if min_severity not in SEVERITY_RANK:
+            raise ValueError(f"min_severity must be one of {', '.join(SEVERITIES)}")
+        room = subscription_room(session_id, min_severity, bool(alerts_only))
+        with self._lock:
+            previous = self._subscriptions.get(sid)
+            if previous == room:
+                return room, None
+            self._subscriptions[sid] = room
+        if previous:
+            self.store.remove_room(room_session_id(previous), previous)
+        self.store.add_room(session_id, room)
+        return room, previous
+
+    def unsubscribe(self, sid):
+        """Forget a socket (on disconnect); returns the room it was in, if any"""
+        with self._lock:
+            room = self._subscriptions.pop(sid, None)
+        if room:
+            self.store.remove_room(room_session_id(room), room)
+        return room
+
+    def forget(self, session_id):
+        """Drop a finished session's frame counter and replay buffer"""
+        self.store.forget(session_id)
+
+    def frames(self, session_id, alerts=(), alert_updates=(), **details):
+        """
+        One tick of a session's output, as frames for the rooms that want it
+        Returns: list of (room, frame); frame = {"session_id", "version",
+                 "alerts", "alert_updates", plus any non-empty DETAIL_FIELDS}
+        """
+        details = {key: value for key, value in details.items() if key in DETAIL_FIELDS and value}
+        if not (alerts or alert_updates or details):
+            return []
+        version = self.store.next_version(session_id)
+        self.store.push_frame(session_id, version, {
+            "alerts": list(alerts), "alert_updates": list(alert_updates), "details": details
+        })
+        rooms = self.store.rooms(session_id) + self.store.rooms(ALL_SESSIONS)
+
+        # One frame per distinct filter, shared by every room that uses it
+        built = {}
+        out = []
+        for room in rooms:
+            _, min_severity, alerts_only = parse_room(room)
+            key = (SEVERITY_RANK[min_severity], alerts_only)
+            if key not in built:
+                built[key] = self._frame(session_id, version, key, alerts, alert_updates, details)
+            if built[key] is not None:
+                out.append((room, built[key]))
+        with self._lock:
+            self.frames_built += 1
+            self.emits += len(out)
+            self.filtered += len(rooms) - len(out)
+        return out
+
+    def replay(self, session_id, since_version, min_severity='low', alerts_only=False):
+        """
+        The frames of a session after `since_version`, as one subscription sees them
+        Returns: (frames, latest version); frames is None when the buffer no
+                 longer reaches back that far and the client must resync over REST
+        """
+        if min_severity not in SEVERITY_RANK:
+            raise ValueError(f"min_severity must be one of {', '.join(SEVERITIES)}")
+        latest = self.store.version(session_id)
+        if since_version >= latest:
+            return [], latest
+        ticks = self.store.frames_since(session_id, since_version)
+        if not ticks or ticks[0][0] > since_version + 1:
+            return None, latest
+        key = (SEVERITY_RANK[min_severity], bool(alerts_only))
+        frames = []
+        for version, tick in ticks:
+            frame = self._frame(session_id, version, key, tick['alerts'], tick['alert_updates'], tick['details'])
+            if frame is not None:
+                frames.append(dict(frame, replayed=True))
+        with self._lock:
+            self.replayed += len(frames)
+        return frames, latest
+
+    @staticmethod
+    def _frame(session_id, version, key, alerts, alert_updates, details):
+        min_rank, alerts_only = key
+
+        def passes(alert):
+            return SEVERITY_RANK.get(alert.get('severity'), 0) >= min_rank
+
+        frame = {
+            "session_id": session_id,
+            "version": version,
+            "alerts": [alert for alert in alerts if passes(alert)],
+            "alert_updates": [alert for alert in alert_updates if passes(alert)]
+        }
+        if not alerts_only:
+            frame.update(details)
+        if not (frame['alerts'] or frame['alert_updates'] or any(key in frame for key in DETAIL_FIELDS)):
+            return None
+        return frame
+
+    def stats(self):
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+            stats = {
+                "subscribers": len(subscriptions),
+                "frames_built": self.frames_built,
+                "emits": self.emits,
+                "filtered": self.filtered,
+                "replayed": self.replayed
+            }
+        rooms = {}
+        for room in subscriptions:
+            rooms[room] = rooms.get(room, 0) + 1
+        stats['rooms'] = rooms
+        return stats
+
+
+# Shared by both socket servers and the REST metrics
+fanout = SessionFanout()
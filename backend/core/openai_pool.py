@@ -0,0 +1,274 @@
+"""
+Shared OpenAI Client Pool
+One keep-alive HTTP pool (per sync/async flavour) shared by every agent and
+the audio processor, with bounded concurrency, warm-up and pool metrics
+"""
+
+from openai import AsyncOpenAI, OpenAI
+import asyncio
+import importlib.util
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from config import (
+    OPENAI_MAX_CONNECTIONS, OPENAI_MAX_KEEPALIVE, OPENAI_KEEPALIVE_EXPIRY,
+    OPENAI_HTTP2, OPENAI_TIMEOUT, OPENAI_CONNECT_TIMEOUT, OPENAI_WARMUP_CONNECTIONS
+)
+
+
+class PoolMetrics:
+    """In-flight requests and time spent waiting for a free pool slot"""
+
+    def __init__(self, limit):
+        self._lock = threading.Lock()
+        self.limit = limit
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = 0
+        self.waited = 0  # requests that found the pool saturated
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def acquired(self, wait):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            if wait > 0.001:
+                self.waited += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+    def released(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "saturation": self.in_flight / self.limit if self.limit else 0,
+                "requests": self.requests,
+                "saturated_requests": self.waited,
+                "avg_wait": self.wait_total / self.requests if self.requests else 0.0,
+                "max_wait": self.wait_max
+            }
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """Response body that frees its pool slot once closed"""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+def _once(fn):
+    done = []
+
+    def wrapper():
+        if not done:
+            done.append(True)
+            fn()
+    return wrapper
+
+
+class MeteredTransport(httpx.BaseTransport):
+    """
+    Caps concurrent requests at the pool size so that waiting for a connection
+    happens here, where it can be measured, instead of inside httpcore
+    """
+
+    def __init__(self, transport, metrics):
+        self._transport = transport
+        self._metrics = metrics
+        self._slots = threading.BoundedSemaphore(metrics.limit)
+
+    def _release(self):
+        self._metrics.released()
+        self._slots.release()
+
+    def handle_request(self, request):
+        started = time.perf_counter()
+        self._slots.acquire()
+        self._metrics.acquired(time.perf_counter() - started)
+        release = _once(self._release)
+        try:
+            response = self._transport.handle_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions
+        )
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncMeteredTransport(httpx.AsyncBaseTransport):
+    def __init__(self, transport, metrics):
+        self._transport = transport
+        self._metrics = metrics
+        self._slots = None  # created on first use, inside the running loop
+
+    def _release(self):
+        self._metrics.released()
+        self._slots.release()
+
+    async def handle_async_request(self, request):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self._metrics.limit)
+        started = time.perf_counter()
+        await self._slots.acquire()
+        self._metrics.acquired(time.perf_counter() - started)
+        release = _once(self._release)
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class OpenAIClientFactory:
+    """Builds the shared OpenAI / AsyncOpenAI clients on one tuned pool config"""
+
+    def __init__(self, api_key, max_connections=OPENAI_MAX_CONNECTIONS,
+                 max_keepalive=OPENAI_MAX_KEEPALIVE, keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+                 http2=OPENAI_HTTP2, timeout=OPENAI_TIMEOUT, connect_timeout=OPENAI_CONNECT_TIMEOUT):
+        self.api_key = api_key
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive,
+            keepalive_expiry=keepalive_expiry
+        )
+        # HTTP/2 needs the optional `h2` package (pip install httpx[http2])
+        self.http2 = http2 and importlib.util.find_spec('h2') is not None
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.sync_metrics = PoolMetrics(max_connections)
+        self.async_metrics = PoolMetrics(max_connections)
+        self._lock = threading.Lock()
+        self._client = None
+        self._async_client = None
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                transport = httpx.HTTPTransport(limits=self.limits, http2=self.http2)
+                self._client = OpenAI(
+                    api_key=self.api_key,
+                    timeout=self.timeout,
+                    http_client=httpx.Client(
+                        transport=MeteredTransport(transport, self.sync_metrics),
+                        timeout=self.timeout
+                    )
+                )
+            return self._client
+
+    def async_client(self):
+        with self._lock:
+            if self._async_client is None:
+                transport = httpx.AsyncHTTPTransport(limits=self.limits, http2=self.http2)
+                self._async_client = AsyncOpenAI(
+                    api_key=self.api_key,
+                    timeout=self.timeout,
+                    http_client=httpx.AsyncClient(
+                        transport=AsyncMeteredTransport(transport, self.async_metrics),
+                        timeout=self.timeout
+                    )
+                )
+            return self._async_client
+
+    def _warm_connections(self, connections):
+        # With HTTP/2 every request multiplexes over one connection
+        if connections <= 0:
+            return 0
+        return 1 if self.http2 else min(connections, self.limits.max_connections)
+
+    def warm_up(self, connections=OPENAI_WARMUP_CONNECTIONS):
+        """Open keep-alive connections (TLS included) before the first real call"""
+        count = self._warm_connections(connections)
+        if not count:
+            return
+        client = self.client().with_options(max_retries=0)
+        started = time.perf_counter()
+        try:
+            # Concurrent requests force distinct connections into the pool
+            with ThreadPoolExecutor(max_workers=count) as executor:
+                list(executor.map(lambda _: client.models.list(), range(count)))
+            print(f"🔥 Warmed {count} OpenAI connection(s) in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"⚠️ OpenAI connection warm-up failed: {e}")
+
+    async def warm_up_async(self, connections=OPENAI_WARMUP_CONNECTIONS):
+        count = self._warm_connections(connections)
+        if not count:
+            return
+        client = self.async_client().with_options(max_retries=0)
+        started = time.perf_counter()
+        try:
+            await asyncio.gather(*(client.models.list() for _ in range(count)))
+            print(f"🔥 Warmed {count} async OpenAI connection(s) in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            print(f"⚠️ OpenAI connection warm-up failed: {e}")
+
+    def metrics(self):
+        return {
+            "http2": self.http2,
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "sync": self.sync_metrics.snapshot(),
+            "async": self.async_metrics.snapshot()
+        }
+
+
+_factories = {}
+_factories_lock = threading.Lock()
+
+
+def get_factory(api_key):
+    """Process-wide factory for this API key; every component shares its pool"""
+    with _factories_lock:
+        if api_key not in _factories:
+            _factories[api_key] = OpenAIClientFactory(api_key)
+        return _factories[api_key]
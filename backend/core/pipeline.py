@@ -0,0 +1,185 @@
+"""
+Session Pipeline
+Per-call ordered transcription -> analysis queue with backpressure.
+One transcription worker and one analysis worker run per session at most,
+so utterances are committed and analysed in the order they were received.
+"""
+
+import threading
+from collections import deque
+from config import PIPELINE_MAX_PENDING
+
+
+class SessionPipeline:
+    """
+    Bounded, ordered work queue of one call
+
+    Audio chunks get a sequence number on submit() and wait (at most
+    `max_pending` of them) for the session's transcription worker. Transcribed
+    utterances then wait for the analysis worker, which takes everything
+    queued at once: when the agents fall behind, several utterances are
+    coalesced into a single analysis pass instead of N stale ones.
+
+    The server owns the workers; submit() / add_utterance() return True when
+    the caller must start one, next_audio() / next_batch() return None when
+    the worker should exit.
+    """
+
+    def __init__(self, max_pending=PIPELINE_MAX_PENDING):
+        self._lock = threading.Lock()
+        self.max_pending = max_pending
+        self._next_seq = 0
+        self._audio = deque()  # (seq, audio_data) waiting for transcription
+        self._utterances = []  # transcribed, waiting for analysis
+        self._transcribing = False
+        self._analyzing = False
+        self.backpressure = False
+        self.submitted = 0
+        self.dropped = 0
+        self.analyses = 0
+        self.coalesced = 0
+
+    def submit(self, audio_data):
+        """
+        Queue an audio chunk
+        Returns: (seq, start_worker), or (None, False) if the queue is full
+        """
+        with self._lock:
+            if len(self._audio) >= self.max_pending:
+                self.dropped += 1
+                self.backpressure = True
+                return None, False
+            seq = self._next_seq
+            self._next_seq += 1
+            self._audio.append((seq, audio_data))
+            self.submitted += 1
+            start = not self._transcribing
+            self._transcribing = True
+            return seq, start
+
+    def reserve_seq(self):
+        """Sequence number for an utterance that didn't come through submit() (live stream)"""
+        with self._lock:
+            seq = self._next_seq
+            self._next_seq += 1
+            return seq
+
+    @property
+    def queued(self):
+        return len(self._audio)
+
+    @property
+    def busy(self):
+        """True while audio or utterances are queued or a worker is running"""
+        with self._lock:
+            return self._transcribing or self._analyzing or bool(self._audio or self._utterances)
+
+    def next_audio(self):
+        """Oldest chunk to transcribe, or None once the queue is empty"""
+        with self._lock:
+            if not self._audio:
+                self._transcribing = False
+                return None
+            return self._audio.popleft()
+
+    def worker_died(self):
+        """The transcription worker exited without draining the queue: let the next submit() start one"""
+        with self._lock:
+            self._transcribing = False
+
+    def relieved(self):
+        """True (once) when the queue has drained to half after backpressure"""
+        with self._lock:
+            if self.backpressure and len(self._audio) <= self.max_pending // 2:
+                self.backpressure = False
+                return True
+            return False
+
+    def add_utterance(self, seq, entry, history_len, analyze=True, pre_alerts=None, acoustics=None):
+        """
+        Queue a transcribed utterance (its transcript entry) for analysis
+        history_len is the transcript length right after the entry was added;
+        utterances too short to analyse still pass through to keep emits ordered.
+        pre_alerts are the provisional alerts its red flags raised, by agent key.
+        acoustics is the pending acoustic feature extraction of its audio, if any.
+        Returns: True if the caller must start the analysis worker
+        """
+        with self._lock:
+            self._utterances.append({
+                "seq": seq,
+                "text": entry['text'],
+                "timestamp": entry['timestamp'],
+                "history_len": history_len,
+                "analyze": analyze,
+                "pre_alerts": pre_alerts or {},
+                "acoustics": acoustics
+            })
+            start = not self._analyzing
+            self._analyzing = True
+            return start
+
+    def next_batch(self):
+        """Every utterance waiting for analysis, or None once there are none"""
+        with self._lock:
+            if not self._utterances:
+                self._analyzing = False
+                return None
+            batch = self._utterances
+            self._utterances = []
+            if any(utterance['analyze'] for utterance in batch):
+                self.analyses += 1
+                self.coalesced += sum(1 for utterance in batch if utterance['analyze']) - 1
+            return batch
+
+    def stats(self):
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "dropped": self.dropped,
+                "queued_audio": len(self._audio),
+                "queued_utterances": len(self._utterances),
+                "analyses": self.analyses,
+                "coalesced_utterances": self.coalesced,
+                "backpressure": self.backpressure
+            }
+
+
+def batch_text(batch):
+    """Statement to analyse for a batch: its analysable utterances, in order"""
+    return " ".join(utterance['text'] for utterance in batch if utterance['analyze'])
+
+
+def batch_pre_alerts(batch):
+    """Provisional alerts raised for a batch, first per agent, for its analysis to settle"""
+    alerts = {}
+    for utterance in batch:
+        for key, alert in utterance['pre_alerts'].items():
+            alerts.setdefault(key, alert)
+    return alerts
+
+
+def batch_acoustics(batch):
+    """Pending acoustic features of a batch's latest analysable utterance (None if not extracted)"""
+    for utterance in reversed(batch):
+        if utterance['analyze'] and utterance['acoustics'] is not None:
+            return utterance['acoustics']
+    return None
+
+
+def batch_history(session, batch):
+    """Transcript as it stood after the batch's last utterance, immune to later appends"""
+    return session.transcript[:batch[-1]['history_len']]
+
+
+def upload_progress(session_id, seq, plan, index):
+    """`upload_progress` payload once segment `index` of a split recording is transcribed"""
+    total = len(plan['ranges'])
+    return {
+        "session_id": session_id,
+        "seq": seq,
+        "segment": index + 1,
+        "segments": total,
+        "transcribed_seconds": round(plan['ranges'][index][1], 1),
+        "duration": round(plan['duration'], 1),
+        "done": index + 1 == total
+    }
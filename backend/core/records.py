@@ -0,0 +1,197 @@
+"""
+Session Records
+Compact in-memory form of a call's transcript and alerts. Entries and alerts
+are __slots__ objects that keep their time as monotonic seconds since the
+call started and only format an ISO timestamp when serialized (to_dict()).
+They still read like the dicts they replace (entry['text'],
+alert.get('severity'), alert['retracted'] = True), so the agents and alert
+rules work on them unchanged.
+
+Memory per call is bounded: the transcript keeps its last
+SESSION_MAX_TRANSCRIPT entries and the alerts their last SESSION_MAX_ALERTS
+(older ones remain in the event log and the session store). An entry costs
+its text plus ~100 bytes; an alert ~250 bytes plus its message and action.
+The socket replay buffer adds up to FANOUT_REPLAY_FRAMES serialized ticks.
+With the defaults (2000 utterances of ~80 characters, 500 alerts) a call
+holds at most ~0.5 MB of transcript and alerts, plus the bounded vitals
+series (VITALS_MAX_READINGS per kind), clinical summary and audio queue
+(PIPELINE_MAX_PENDING chunks).
+"""
+
+from datetime import datetime, timedelta
+from config import SESSION_MAX_TRANSCRIPT
+
+
+class TranscriptEntry:
+    """
+    One utterance; `seq` is its 1-based position in the call (the REST
+    cursor), `elapsed` its time in seconds since `origin`, the call's start_time
+    """
+
+    __slots__ = ('seq', 'origin', 'elapsed', 'speaker', 'text', 'vitals')
+
+    def __init__(self, seq, origin, elapsed, speaker, text, vitals=None):
+        self.seq = seq
+        self.origin = origin
+        self.elapsed = elapsed
+        self.speaker = speaker
+        self.text = text
+        self.vitals = vitals
+
+    @property
+    def timestamp(self):
+        return (self.origin + timedelta(seconds=self.elapsed)).isoformat()
+
+    @classmethod
+    def from_dict(cls, entry, origin, seq):
+        elapsed = (datetime.fromisoformat(entry['timestamp']) - origin).total_seconds()
+        return cls(entry.get('seq', seq), origin, elapsed, entry['speaker'], entry['text'], entry.get('vitals'))
+
+    def __getitem__(self, key):
+        if key == 'timestamp':
+            return self.timestamp
+        if key not in ('seq', 'speaker', 'text', 'vitals') or (key == 'vitals' and self.vitals is None):
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        entry = {"seq": self.seq, "timestamp": self.timestamp, "speaker": self.speaker, "text": self.text}
+        if self.vitals:
+            entry['vitals'] = self.vitals
+        return entry
+
+
+class AlertRecord:
+    """
+    One alert: fixed fields in slots, the optional markers rules add
+    (provisional, partial, retracted, matched, vital) in `extra`. `rev` is
+    the session-wide revision it was last persisted at (the REST cursor:
+    raising or updating an alert gives it a new one)
+    """
+
+    __slots__ = ('id', 'rev', 'origin', 'elapsed', 'type', 'message', 'severity', 'action', 'extra')
+    FIELDS = ('id', 'rev', 'type', 'message', 'severity', 'action')
+
+    def __init__(self, alert_id, origin, elapsed, alert_type, message, severity, action=None):
+        self.id = alert_id
+        self.rev = 0
+        self.origin = origin
+        self.elapsed = elapsed
+        self.type = alert_type
+        self.message = message
+        self.severity = severity
+        self.action = action
+        self.extra = None
+
+    @property
+    def timestamp(self):
+        return (self.origin + timedelta(seconds=self.elapsed)).isoformat()
+
+    @classmethod
+    def from_dict(cls, alert, origin):
+        elapsed = (datetime.fromisoformat(alert['timestamp']) - origin).total_seconds()
+        record = cls(alert['id'], origin, elapsed, alert['type'], alert['message'], alert['severity'],
+                     alert.get('action'))
+        for key, value in alert.items():
+            if key not in cls.FIELDS and key != 'timestamp':
+                record[key] = value
+        record.rev = alert.get('rev', alert['id'])
+        return record
+
+    def __getitem__(self, key):
+        if key == 'timestamp':
+            return self.timestamp
+        if key in self.FIELDS:
+            return getattr(self, key)
+        if self.extra and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self.FIELDS:
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+
+    def __contains__(self, key):
+        return key == 'timestamp' or key in self.FIELDS or bool(self.extra and key in self.extra)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def to_dict(self):
+        alert = {
+            "id": self.id,
+            "rev": self.rev,
+            "timestamp": self.timestamp,
+            "type": self.type,
+            "message": self.message,
+            "severity": self.severity,
+            "action": self.action
+        }
+        if self.extra:
+            alert.update(self.extra)
+        return alert
+
+
+class Transcript:
+    """
+    A call's utterances, of which (at least) the last `maxlen` are kept
+
+    Indexes and len() count every utterance of the call, so positions
+    recorded earlier (a batch's history_len) stay valid after the oldest
+    entries are dropped; slices just start at the oldest one still held.
+    Entries are dropped an eighth of `maxlen` at a time, keeping appends
+    amortized O(1).
+    """
+
+    def __init__(self, maxlen=SESSION_MAX_TRANSCRIPT):
+        self.maxlen = maxlen
+        self.dropped = 0
+        self._entries = []
+
+    def append(self, entry):
+        self._entries.append(entry)
+        if len(self._entries) > self.maxlen + max(1, self.maxlen // 8):
+            excess = len(self._entries) - self.maxlen
+            del self._entries[:excess]
+            self.dropped += excess
+
+    def __len__(self):
+        return self.dropped + len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            return self._entries[max(start - self.dropped, 0):max(stop - self.dropped, 0):step]
+        if index < 0:
+            return self._entries[index]
+        if index < self.dropped:
+            raise IndexError(f"utterance {index} is no longer held in memory")
+        return self._entries[index - self.dropped]
+
+    def since(self, seq, limit):
+        """
+        Up to `limit` held entries after position `seq`; when `seq` is older
+        than `dropped`, they start at the oldest one held (the caller tells
+        the client its cursor skipped entries)
+        """
+        start = max(seq - self.dropped, 0)
+        return self._entries[start:start + limit]
+
+    def to_list(self):
+        return [entry.to_dict() for entry in self._entries]
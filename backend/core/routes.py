@@ -0,0 +1,273 @@
+"""
+REST API
+Session and stats routes, registered on both the Flask and ASGI servers
+"""
+
+from flask import Blueprint, Response, request, jsonify
+from datetime import datetime
+from core.sessions import CallSession, active_sessions, close_session, start_session as create_session
+from core.store import session_store
+from core.scheduler import get_scheduler
+from core.fanout import fanout
+from core.eventlog import event_log
+from agents.vitals import VitalsSeries
+from config import API_PAGE_LIMIT, API_MAX_PAGE_LIMIT
+
+
+def create_api_blueprint(engine, audio_processor):
+    """Build the REST blueprint around the shared analysis engine and audio processor"""
+    api = Blueprint('api', __name__)
+
+    def find_session(session_id):
+        """This worker's session, or a read-only view of one another worker runs"""
+        session = active_sessions.get(session_id)
+        if session is None:
+            record = session_store.load(session_id)
+            session = CallSession.restore(record) if record else None
+        return session
+
+    def serialize(item):
+        """Held entries and alerts serialize themselves; an archived record's already are dicts"""
+        return item if isinstance(item, dict) else item.to_dict()
+
+    def revision(alert):
+        return alert.get('rev', alert['id'])
+
+    def page_args():
+        """(since, limit) cursor arguments of a delta request; ValueError if malformed"""
+        since = int(request.args.get('since', 0))
+        limit = int(request.args.get('limit', API_PAGE_LIMIT))
+        if since < 0 or not 0 < limit <= API_MAX_PAGE_LIMIT:
+            raise ValueError(f"since must be >= 0 and limit between 1 and {API_MAX_PAGE_LIMIT}")
+        return since, limit
+
+    def conditional(tag, build):
+        """
+        304 if the client's If-None-Match already names this version of the
+        resource, else the JSON from build() - only serialized when needed
+        """
+        if request.if_none_match.contains_weak(tag):
+            response = Response(status=304)
+        else:
+            response = jsonify(build())
+        response.set_etag(tag, weak=True)
+        return response
+
+    @api.route('/health', methods=['GET'])
+    def health_check():
+        """Health check endpoint"""
+        return jsonify({"status": "healthy", "service": "MedCall Backend"})
+
+    @api.route('/api/analysis/stats', methods=['GET'])
+    def get_analysis_stats():
+        """Token and latency cost per chunk of the fused vs. three-call analysis paths"""
+        report = engine.stats.report()
+        report['mode'] = engine.mode
+        report['deadline'] = engine.deadline_stats.snapshot()
+        report['deadline']['chunk_deadline'] = engine.chunk_deadline
+        report['deadline']['hedge_delay'] = engine.hedge_delay() if engine.hedging else None
+        return jsonify(report)
+
+    @api.route('/api/metrics/agents', methods=['GET'])
+    def get_agent_metrics():
+        """Per-agent usage, including cached vs. total prompt tokens"""
+        return jsonify(engine.agent_usage())
+
+    @api.route('/api/metrics/pool', methods=['GET'])
+    def get_pool_metrics():
+        """Saturation and wait time of the shared OpenAI connection pool"""
+        return jsonify(engine.clients.metrics())
+
+    @api.route('/api/metrics/scheduler', methods=['GET'])
+    def get_scheduler_metrics():
+        """Rate-limit queue depth, wait times and shed requests per priority class"""
+        return jsonify(get_scheduler().metrics())
+
+    @api.route('/api/metrics/memo', methods=['GET'])
+    def get_memo_metrics():
+        """Hit rate of each agent's result memo"""
+        return jsonify(engine.memo_stats())
+
+    @api.route('/api/metrics/memo', methods=['DELETE'])
+    def clear_memo():
+        """Drop every memoized agent result (e.g. after editing a prompt)"""
+        engine.invalidate_memo()
+        return jsonify(engine.memo_stats())
+
+    @api.route('/api/metrics/transcription_cache', methods=['GET'])
+    def get_transcription_cache_metrics():
+        """Hits and misses of the audio-hash transcription cache"""
+        return jsonify(audio_processor.cache.stats())
+
+    @api.route('/api/metrics/vad', methods=['GET'])
+    def get_vad_metrics():
+        """Silent chunks kept from Whisper, silence trimmed and per-chunk speech ratios"""
+        return jsonify(audio_processor.vad_stats.snapshot())
+
+    @api.route('/api/metrics/acoustics', methods=['GET'])
+    def get_acoustic_metrics():
+        """Utterances measured for the sentiment analyzer and average extraction time"""
+        return jsonify(engine.acoustics.metrics())
+
+    @api.route('/api/metrics/fanout', methods=['GET'])
+    def get_fanout_metrics():
+        """Socket subscriptions per room, frames built and emits sent or filtered out"""
+        return jsonify(fanout.stats())
+
+    @api.route('/api/metrics/eventlog', methods=['GET'])
+    def get_event_log_stats():
+        """Group-commit counters of the durable session event log"""
+        return jsonify(event_log.stats())
+
+    @api.route('/api/metrics/gate', methods=['GET'])
+    def get_gate_metrics():
+        """Agent calls saved by the relevance gate, and its recall on the labelled set"""
+        report = engine.gate_report()
+        report['stats'] = engine.gate_stats.snapshot()
+        return jsonify(report)
+
+    @api.route('/api/session/start', methods=['POST'])
+    def start_session():
+        """Start a new call monitoring session"""
+        session_id = request.json.get('session_id', str(datetime.now().timestamp()))
+
+        session = create_session(session_id)
+
+        return jsonify({
+            "session_id": session_id,
+            "status": "active",
+            "start_time": session.start_time.isoformat()
+        })
+
+    @api.route('/api/session/<session_id>/stop', methods=['POST'])
+    def stop_session(session_id):
+        """Stop a call monitoring session"""
+        session = find_session(session_id)
+        if not session:
+            return jsonify({"error": "Session not found"}), 404
+
+        session_store.set_active(session_id, False)
+        local = session_id in active_sessions
+        owner = session_store.owner(session_id)
+        if local:
+            close_session(session)
+        else:
+            session.is_active = False
+            if owner:
+                session_store.forward(owner, 'stop', session_id, None)
+
+        summary = {
+            "session_id": session_id,
+            "duration": (datetime.now() - session.start_time).total_seconds(),
+            "total_alerts": sum(session.alert_counts.values()),
+            "alerts_by_type": dict(session.alert_counts),
+            "transcript_length": len(session.transcript),
+            "clinical_state": session.clinical.snapshot(),
+            "vitals": session.vitals.snapshot()['latest'],
+            "worker": session_store.worker_id if local else owner
+        }
+        # Pipeline counters only exist on the worker running the call
+        if local:
+            summary.update({
+                "pipeline": session.pipeline.stats(),
+                "gate": session.gate_stats.snapshot(),
+                "vad": session.vad_stats.snapshot(),
+                "streaming": session.live.stats(),
+                "sentiment": session.sentiment.stats()
+            })
+            summary['gate']['recall'] = engine.gate_report().get('labelled_set')
+
+        return jsonify(summary)
+
+    @api.route('/api/session/<session_id>/alerts', methods=['GET'])
+    def get_alerts(session_id):
+        """
+        Alerts raised or changed after revision ?since= (default 0: all),
+        oldest first, at most ?limit= of them; `next` is the cursor to ask for
+        the following page or, later, for what changed since
+        """
+        session = find_session(session_id)
+        if session:
+            (alerts, latest), start_time = session.alerts_snapshot(), session.start_time
+        else:
+            # A call that left memory: page its archived record as read instead of rebuilding the session
+            record = event_log.load_archived(session_id)
+            if not record:
+                return jsonify({"error": "Session not found"}), 404
+            alerts, start_time = record['alerts'], record['start_time']
+            latest = max(map(revision, alerts), default=0)
+        try:
+            since, limit = page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def build():
+            changed = sorted((alert for alert in alerts if revision(alert) > since), key=revision)
+            page = changed[:limit]
+            return {
+                "alerts": [serialize(alert) for alert in page],
+                "since": since,
+                "next": revision(page[-1]) if page else max(since, latest),
+                "has_more": len(changed) > limit,
+                "latest": latest
+            }
+
+        return conditional(f"{session_id}-{start_time.timestamp()}-a{latest}", build)
+
+    @api.route('/api/session/<session_id>/transcript', methods=['GET'])
+    def get_transcript(session_id):
+        """
+        Transcript entries after position ?since= (default 0: from the start),
+        at most ?limit= of them; `next` is the cursor for the following page.
+        `truncated` means entries after ?since= are no longer held in memory:
+        the page starts at `first`, the oldest one still held
+        """
+        session = find_session(session_id)
+        if session:
+            transcript, start_time = session.transcript, session.start_time
+            total, dropped = len(transcript), transcript.dropped
+        else:
+            # The archive holds the whole transcript, already serialized
+            record = event_log.load_archived(session_id)
+            if not record:
+                return jsonify({"error": "Session not found"}), 404
+            transcript, start_time = record['transcript'], record['start_time']
+            total, dropped = len(transcript), 0
+        try:
+            since, limit = page_args()
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        def build():
+            start = max(since, dropped)
+            page = transcript.since(since, limit) if session else transcript[start:start + limit]
+            following = start + len(page) if page else max(since, total)
+            return {
+                "transcript": [serialize(entry) for entry in page],
+                "since": since,
+                "next": following,
+                "has_more": following < total,
+                "truncated": since < dropped,
+                "first": dropped + 1,
+                "total": total
+            }
+
+        return conditional(f"{session_id}-{start_time.timestamp()}-t{total}", build)
+
+    @api.route('/api/session/<session_id>/vitals', methods=['GET'])
+    def get_vitals(session_id):
+        """Get the vitals time series extracted from a session's transcript"""
+        session = find_session(session_id)
+        if session:
+            return jsonify(session.vitals.snapshot())
+        record = event_log.load_archived(session_id)
+        if not record:
+            return jsonify({"error": "Session not found"}), 404
+        # Only the series, from the readings the archived entries carry (already stamped)
+        vitals = VitalsSeries()
+        for entry in record['transcript']:
+            if entry.get('vitals'):
+                vitals.add(entry['vitals'], entry['vitals'][0]['minute'], entry['timestamp'])
+        return jsonify(vitals.snapshot())
+
+    return api
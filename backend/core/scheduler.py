@@ -0,0 +1,340 @@
+"""
+Rate-Limit Scheduler
+Process-wide RPM/TPM token buckets in front of every OpenAI call, handing
+out quota by priority so emergency triage is served before lower-value work
+"""
+
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import openai
+from core.deadline import DeadlineExceeded
+from config import LLM_RPM, LLM_TPM, TRANSCRIPTION_RPM, SCHEDULER_MAX_QUEUE, SCHEDULER_MAX_WAIT
+
+
+# Lower runs first. Transcription feeds every agent, so it ranks with emergency.
+PRIORITIES = {
+    'transcription': 0,
+    'emergency': 0,
+    'ae': 1,
+    'appointment': 2,
+    'sentiment': 3,
+}
+
+# Requests per minute / tokens per minute, per model (None = unlimited)
+MODEL_LIMITS = {
+    'whisper-1': (TRANSCRIPTION_RPM, None),
+}
+DEFAULT_LIMITS = (LLM_RPM, LLM_TPM)
+
+POLL_INTERVAL = 0.05  # async waiters re-check this often while queued behind others
+
+
+class RequestShed(Exception):
+    """Dropped by the scheduler to keep quota for higher-priority work"""
+
+
+def is_rate_limited(error):
+    return isinstance(error, (RequestShed, openai.RateLimitError))
+
+
+class TokenBucket:
+    """Refills `per_minute` units evenly over a minute; may go into debt on settle()"""
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0 if per_minute else None
+        self.level = float(per_minute or 0)
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        if self.rate is None:
+            return
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_for(self, amount, now):
+        """Seconds until `amount` units are available (requests larger than the bucket wait for a full one)"""
+        if self.rate is None:
+            return 0.0
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount):
+        if self.rate is not None:
+            self.level = min(self.capacity, self.level - amount)
+
+    def drain(self, now):
+        self._refill(now)
+        if self.rate is not None:
+            self.level = min(self.level, 0.0)
+
+
+class _ModelQuota:
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.waiters = []  # heap of (priority, seq, tokens)
+        self.paused_until = 0.0
+
+    def queued_ahead(self, priority):
+        """Tokens already waiting at the same or a higher priority"""
+        return sum(tokens for waiter_priority, _, tokens in self.waiters if waiter_priority <= priority)
+
+
+class ClassStats:
+    def __init__(self):
+        self.requests = 0
+        self.granted = 0
+        self.shed = 0
+        self.queued = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "granted": self.granted,
+            "shed": self.shed,
+            "queued": self.queued,
+            "avg_wait": self.wait_total / self.granted if self.granted else 0.0,
+            "max_wait": self.wait_max
+        }
+
+
+class LLMScheduler:
+    """
+    Priority queue in front of the provider quota
+
+    acquire() blocks until the model's request and token buckets can cover
+    the call and no higher-priority request is waiting for the same model.
+    A request is shed (RequestShed) instead of waiting when the queue is
+    full, when the work queued ahead of it cannot clear within its class's
+    max wait, or when the chunk deadline would pass first. Emergency and
+    transcription have no max wait and are never shed up front: only the
+    deadline can drop them.
+    """
+
+    def __init__(self, max_queue=SCHEDULER_MAX_QUEUE, max_wait=SCHEDULER_MAX_WAIT):
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._quotas = {}
+        self._stats = {name: ClassStats() for name in PRIORITIES}
+
+    def _quota(self, model):
+        if model not in self._quotas:
+            self._quotas[model] = _ModelQuota(*MODEL_LIMITS.get(model, DEFAULT_LIMITS))
+        return self._quotas[model]
+
+    def _wait_limit(self, work_class, deadline, started, now):
+        """Seconds this request may still wait, or None when unbounded"""
+        limits = []
+        max_wait = self.max_wait.get(work_class)
+        if max_wait is not None:
+            limits.append(max_wait - (now - started))
+        if deadline is not None:
+            limits.append(deadline.remaining())
+        return min(limits) if limits else None
+
+    def _shed(self, work_class, reason, deadline=None):
+        self._stats[work_class].shed += 1
+        print(f"🚦 Shed {work_class} request: {reason}")
+        if deadline is not None and deadline.expired:
+            raise DeadlineExceeded(f"chunk deadline passed while queued for rate limit ({work_class})")
+        raise RequestShed(f"{work_class} request shed: {reason}")
+
+    def _enqueue(self, work_class, tokens, model, deadline):
+        """Admission control; returns the waiter ticket"""
+        quota = self._quota(model)
+        priority = PRIORITIES[work_class]
+        self._stats[work_class].requests += 1
+
+        if priority > 0 and len(quota.waiters) >= self.max_queue:
+            self._shed(work_class, f"queue full ({len(quota.waiters)} waiting)")
+
+        now = time.monotonic()
+        limit = self._wait_limit(work_class, deadline, now, now)
+        if priority > 0 and limit is not None and quota.tokens.rate:
+            quota.tokens.wait_for(0, now)  # refill before reading the level
+            backlog = (quota.queued_ahead(priority) + tokens - max(quota.tokens.level, 0)) / quota.tokens.rate
+            if backlog > limit:
+                self._shed(work_class, f"~{backlog:.1f}s of quota queued ahead", deadline)
+
+        ticket = (priority, next(self._seq), tokens)
+        heapq.heappush(quota.waiters, ticket)
+        self._stats[work_class].queued += 1
+        return quota, ticket
+
+    def _try_grant(self, quota, ticket, now):
+        """0 when the ticket got its quota, otherwise seconds to wait before retrying"""
+        if quota.waiters[0] != ticket:
+            return None  # someone more urgent (or older) goes first
+        if quota.paused_until > now:
+            return quota.paused_until - now
+        wait = max(quota.requests.wait_for(1, now), quota.tokens.wait_for(ticket[2], now))
+        if wait > 0:
+            return wait
+        quota.requests.take(1)
+        quota.tokens.take(ticket[2])
+        heapq.heappop(quota.waiters)
+        return 0.0
+
+    def _dequeue(self, quota, ticket, work_class):
+        self._stats[work_class].queued -= 1
+        if ticket in quota.waiters:
+            quota.waiters.remove(ticket)
+            heapq.heapify(quota.waiters)
+        self._cond.notify_all()
+
+    def _granted(self, work_class, waited):
+        stats = self._stats[work_class]
+        stats.granted += 1
+        stats.wait_total += waited
+        stats.wait_max = max(stats.wait_max, waited)
+
+    def acquire(self, work_class, tokens, model, deadline=None):
+        """
+        Block until the call may go out
+        Returns: seconds spent waiting, to take off the call's own timeout
+        """
+        started = time.monotonic()
+        with self._cond:
+            quota, ticket = self._enqueue(work_class, tokens, model, deadline)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = self._try_grant(quota, ticket, now)
+                    if wait == 0:
+                        break
+                    limit = self._wait_limit(work_class, deadline, started, now)
+                    if limit is not None and limit <= 0:
+                        self._shed(work_class, f"no quota within {now - started:.1f}s", deadline)
+                    timeouts = [t for t in (wait, limit) if t is not None]
+                    self._cond.wait(min(timeouts) if timeouts else None)
+            finally:
+                self._dequeue(quota, ticket, work_class)
+            waited = time.monotonic() - started
+            self._granted(work_class, waited)
+        return waited
+
+    async def acquire_async(self, work_class, tokens, model, deadline=None):
+        """Async counterpart of acquire(); polls instead of blocking the loop"""
+        started = time.monotonic()
+        with self._cond:
+            quota, ticket = self._enqueue(work_class, tokens, model, deadline)
+        try:
+            while True:
+                with self._cond:
+                    now = time.monotonic()
+                    wait = self._try_grant(quota, ticket, now)
+                    if wait == 0:
+                        break
+                    limit = self._wait_limit(work_class, deadline, started, now)
+                    if limit is not None and limit <= 0:
+                        self._shed(work_class, f"no quota within {now - started:.1f}s", deadline)
+                await asyncio.sleep(min(t for t in (wait, limit, POLL_INTERVAL) if t is not None))
+        finally:
+            with self._cond:
+                self._dequeue(quota, ticket, work_class)
+        waited = time.monotonic() - started
+        with self._cond:
+            self._granted(work_class, waited)
+        return waited
+
+    def settle(self, model, estimated, actual):
+        """Correct the token bucket once the real usage of a call is known"""
+        with self._cond:
+            self._quota(model).tokens.take(actual - estimated)
+            self._cond.notify_all()
+
+    def throttle(self, model, retry_after=1.0):
+        """The provider answered 429 anyway: pause the model's queue briefly"""
+        with self._cond:
+            quota = self._quota(model)
+            now = time.monotonic()
+            quota.requests.drain(now)
+            quota.paused_until = max(quota.paused_until, now + retry_after)
+
+    def metrics(self):
+        with self._cond:
+            now = time.monotonic()
+            models = {}
+            for model, quota in self._quotas.items():
+                quota.requests.wait_for(0, now)  # refill before reporting levels
+                quota.tokens.wait_for(0, now)
+                models[model] = {
+                    "queue_depth": len(quota.waiters),
+                    "rpm_limit": quota.requests.capacity,
+                    "tpm_limit": quota.tokens.capacity,
+                    "requests_available": quota.requests.level if quota.requests.rate else None,
+                    "tokens_available": quota.tokens.level if quota.tokens.rate else None,
+                    "paused": quota.paused_until > now
+                }
+            return {
+                "max_queue": self.max_queue,
+                "models": models,
+                "classes": {name: stats.snapshot() for name, stats in self._stats.items()}
+            }
+
+
+def _retry_after(error):
+    headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after', 1.0))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def scheduled(work_class, tokens, model, deadline, create):
+    """
+    Wrap create(timeout) so every attempt (retries included) first waits for
+    quota; the time spent queued comes off the attempt's timeout
+    """
+    scheduler = get_scheduler()
+
+    def attempt(timeout):
+        waited = scheduler.acquire(work_class, tokens, model, deadline)
+        if timeout is not None and timeout - waited <= 0:
+            raise DeadlineExceeded(f"no time left after {waited:.1f}s queued for rate limit")
+        try:
+            return create(None if timeout is None else timeout - waited)
+        except openai.RateLimitError as e:
+            scheduler.throttle(model, _retry_after(e))
+            raise
+    return attempt
+
+
+def scheduled_async(work_class, tokens, model, deadline, create):
+    """Async counterpart of scheduled(); create(timeout) returns an awaitable"""
+    scheduler = get_scheduler()
+
+    async def attempt(timeout):
+        waited = await scheduler.acquire_async(work_class, tokens, model, deadline)
+        if timeout is not None and timeout - waited <= 0:
+            raise DeadlineExceeded(f"no time left after {waited:.1f}s queued for rate limit")
+        try:
+            return await create(None if timeout is None else timeout - waited)
+        except openai.RateLimitError as e:
+            scheduler.throttle(model, _retry_after(e))
+            raise
+    return attempt
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """The process-wide scheduler every OpenAI call goes through"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = LLMScheduler()
+        return _scheduler
@@ -0,0 +1,82 @@
+"""
+Sentiment Lane
+Deferred, low-priority scheduling of the sentiment mismatch analyzer. Rather
+than a fourth call per chunk, analysed utterances accumulate into a window
+that is analysed once every N utterances, or once the patient goes quiet
+(a turn boundary), after the safety-critical agents have had their turn.
+"""
+
+import threading
+import time
+from core.pipeline import batch_acoustics
+from config import SENTIMENT_EVERY_UTTERANCES, SENTIMENT_IDLE_SECONDS
+
+
+class SentimentCadence:
+    """
+    Window of utterances waiting for the sentiment analyzer, per session
+
+    add() and next_window() follow the pipeline's worker contract: add()
+    returns True when the caller must start the session's sentiment worker,
+    next_window() returns None when that worker should exit. Until a window
+    is due, next_window() returns {"wait": seconds} for the worker to sleep.
+    """
+
+    def __init__(self, every=SENTIMENT_EVERY_UTTERANCES, idle_seconds=SENTIMENT_IDLE_SECONDS):
+        self._lock = threading.Lock()
+        self.every = every
+        self.idle_seconds = idle_seconds
+        self._pending = []
+        self._last_added = 0.0
+        self._working = False
+        self.utterances = 0
+        self.windows = 0
+
+    @property
+    def enabled(self):
+        return self.every > 0
+
+    def add(self, batch):
+        """Queue a batch's analysable utterances; True if the caller must start the worker"""
+        utterances = [utterance for utterance in batch if utterance['analyze']]
+        if not self.enabled or not utterances:
+            return False
+        with self._lock:
+            self._pending.extend(utterances)
+            self.utterances += len(utterances)
+            self._last_added = time.monotonic()
+            if self._working:
+                return False
+            self._working = True
+            return True
+
+    def next_window(self):
+        """
+        Next window to analyse, or None once nothing is pending
+        Returns: {"text", "history_len", "acoustics", "utterances"}, or {"wait": seconds}
+        """
+        with self._lock:
+            if not self._pending:
+                self._working = False
+                return None
+            quiet = time.monotonic() - self._last_added
+            if len(self._pending) < self.every and quiet < self.idle_seconds:
+                return {"wait": self.idle_seconds - quiet}
+            window = self._pending
+            self._pending = []
+            self.windows += 1
+            return {
+                "text": " ".join(utterance['text'] for utterance in window),
+                "history_len": window[-1]['history_len'],
+                "acoustics": batch_acoustics(window),
+                "utterances": len(window)
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                "utterances": self.utterances,
+                "windows": self.windows,
+                "pending": len(self._pending),
+                "windows_per_utterance": round(self.windows / self.utterances, 2) if self.utterances else 0.0
+            }
@@ -0,0 +1,276 @@
+"""
+Call Sessions
+In-memory state of the calls being monitored by this worker, mirrored to the
+session store (core/store.py) so other workers can find and serve them, and
+to the event log (core/eventlog.py) so a restart can bring them back. Calls
+stay in memory until reap_sessions() archives them: SESSION_STOPPED_TTL
+seconds after they stop, or once idle for SESSION_IDLE_TTL. What one call
+holds is bounded; see core/records.py.
+"""
+
+import itertools
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from config import SESSION_STOPPED_TTL, SESSION_IDLE_TTL, SESSION_MAX_ALERTS
+from core.pipeline import SessionPipeline
+from core.sentiment import SentimentCadence
+from agents.clinical_state import ClinicalState
+from agents.vitals import VitalsSeries, extract_vitals
+from agents.relevance_gate import GateStats
+from audio.streaming import LiveTranscriber
+from audio.vad import VADStats
+from core.store import session_store
+from core.eventlog import event_log
+from core.fanout import fanout
+from core.records import AlertRecord, Transcript, TranscriptEntry
+
+
+class CallSession:
+    ALERT_COOLDOWN_SECONDS = 30
+
+    def __init__(self, session_id, store=session_store):
+        self.session_id = session_id
+        self.store = store
+        self.transcript = Transcript()
+        self.alerts = deque(maxlen=SESSION_MAX_ALERTS)  # read through alerts_snapshot() off the analysis thread
+        self.alert_counts = {}  # alert_type -> alerts not retracted, kept as they are raised
+        self.start_time = datetime.now()
+        self._clock = time.monotonic()  # start_time on the monotonic clock
+        self.last_activity = self._clock
+        self.stopped_at = None
+        self.is_active = True
+        self._last_alert_time = {}  # alert_type -> monotonic time
+        self._alert_seq = 0
+        self._alert_revs = itertools.count(1)
+        self.alert_rev = 0  # latest revision handed out, see revise_alerts()
+        self.pipeline = SessionPipeline()
+        self.gate_stats = GateStats()
+        self.vad_stats = VADStats()
+        self.live = LiveTranscriber()
+        self.sentiment = SentimentCadence()
+        self.clinical = ClinicalState()
+        self.vitals = VitalsSeries()
+        # Guards the alerts (and their revisions) against readers on other threads
+        self._lock = threading.Lock()
+        self._transcript_lock = threading.Lock()
+
+    def elapsed(self):
+        """Seconds since the call started, on the monotonic clock"""
+        return time.monotonic() - self._clock
+
+    def add_transcript(self, text, speaker="user"):
+        """
+        Append an utterance; its position is assigned and it is appended,
+        mirrored and logged in one step, as the live stream and the chunk
+        transcription can commit to the same call at once
+        """
+        readings = extract_vitals(text)
+        with self._transcript_lock:
+            self.last_activity = time.monotonic()
+            seq = len(self.transcript) + 1
+            entry = TranscriptEntry(seq, self.start_time, self.last_activity - self._clock, speaker, text)
+            if readings:
+                # Readings past a threshold come back marked; see vital_alerts()
+                entry.vitals = readings
+                self.vitals.add(readings, int(entry.elapsed // 60), entry.timestamp)
+            self.transcript.append(entry)
+            record = entry.to_dict()
+            self.store.append_transcript(self.session_id, record)
+            event_log.append(self.session_id, 'transcript', record)
+            self.clinical.update(text, entry.elapsed, readings)
+        return entry
+
+    @classmethod
+    def restore(cls, record, store=session_store):
+        """
+        Rebuild a call another worker was running from its mirrored record:
+        transcript, alerts and the state derived from them carry over, the
+        audio pipeline starts empty
+        """
+        session = cls(record['session_id'], store)
+        session.start_time = record['start_time']
+        session._clock = time.monotonic() - (datetime.now() - session.start_time).total_seconds()
+        session.is_active = record['is_active']
+        if not session.is_active:
+            session.stopped_at = session.last_activity
+        for alert in record['alerts']:
+            alert = AlertRecord.from_dict(alert, session.start_time)
+            session.alerts.append(alert)
+            session._alert_seq = max(session._alert_seq, alert.id)
+            session.alert_rev = max(session.alert_rev, alert.rev)
+            if not alert.get('retracted'):
+                session.alert_counts[alert.type] = session.alert_counts.get(alert.type, 0) + 1
+        session._alert_revs = itertools.count(session.alert_rev + 1)
+        for entry in record['transcript']:
+            entry = TranscriptEntry.from_dict(entry, session.start_time, len(session.transcript) + 1)
+            if entry.vitals:
+                session.vitals.add(entry.vitals, int(entry.elapsed // 60), entry.timestamp)
+            session.clinical.update(entry.text, entry.elapsed, entry.vitals or ())
+            session.transcript.append(entry)
+        return session
+
+    def can_emit_alert(self, alert_type):
+        last = self._last_alert_time.get(alert_type)
+        if last is None:
+            return True
+        return time.monotonic() - last >= self.ALERT_COOLDOWN_SECONDS
+
+    def add_alert(self, alert_type, message, severity, action=None):
+        self._alert_seq += 1
+        now = time.monotonic()
+        alert = AlertRecord(self._alert_seq, self.start_time, now - self._clock, alert_type, message, severity, action)
+        with self._lock:
+            self.alerts.append(alert)
+            self.alert_counts[alert_type] = self.alert_counts.get(alert_type, 0) + 1
+        self._last_alert_time[alert_type] = now
+        return alert
+
+    def revise_alerts(self, alerts):
+        """Give alerts being persisted (new or changed) the next revisions"""
+        with self._lock:
+            for alert in alerts:
+                alert.rev = self.alert_rev = next(self._alert_revs)
+
+    def alerts_snapshot(self):
+        """(a copy of the held alerts, the latest revision), safe to read while alerts are added"""
+        with self._lock:
+            return list(self.alerts), self.alert_rev
+
+    def retract_alert(self, alert):
+        """Withdraw a provisional alert the agents did not confirm, lifting its cooldown"""
+        with self._lock:
+            if not alert.get('retracted'):
+                self.alert_counts[alert['type']] -= 1
+                if not self.alert_counts[alert['type']]:
+                    del self.alert_counts[alert['type']]
+        alert['retracted'] = True
+        alert['provisional'] = False
+        self._last_alert_time.pop(alert['type'], None)
+
+
+# Sessions whose pipelines run in this worker
+active_sessions = {}
+
+
+def start_session(session_id, store=session_store):
+    """Create a call on this worker, which owns it from now on"""
+    session = CallSession(session_id, store)
+    active_sessions[session_id] = session
+    store.claim(session_id)
+    store.create(session)
+    event_log.append(session_id, 'start', {"start_time": session.start_time.isoformat()})
+    return session
+
+
+def close_session(session):
+    """Stop a call running on this worker and compact its event log into a snapshot"""
+    session.is_active = False
+    session.stopped_at = time.monotonic()
+    event_log.append(session.session_id, 'stop')
+    event_log.compact(session.session_id)
+
+
+def record_alerts(session_id, alerts, store=session_store):
+    """
+    Persist new or updated alerts: mirrored to the store, appended to the event log
+    Returns: the alerts as dicts, ready to emit
+    """
+    session = active_sessions.get(session_id)
+    if session:
+        session.revise_alerts(alerts)
+    alerts = [alert.to_dict() for alert in alerts]
+    store.save_alerts(session_id, alerts)
+    for alert in alerts:
+        event_log.append(session_id, 'alert', alert)
+    return alerts
+
+
+def record_results(session_id, results):
+    """Log one analysis pass's agent results (kept for audit, not replayed)"""
+    event_log.append(session_id, 'results', results)
+
+
+def session_exists(session_id, store=session_store):
+    return session_id in active_sessions or store.exists(session_id)
+
+
+def locate_session(session_id, store=session_store):
+    """
+    Where a call's pipeline runs
+    Returns: (session, None) when this worker owns it, (None, worker id) when
+             another live worker does, (None, None) for an unknown or stopped
+             session. An active call whose owner stopped renewing its lease is
+             taken over here; a stopped one is never brought back to life.
+    """
+    session = active_sessions.get(session_id)
+    if session or not store.exists(session_id):
+        return session, None
+    owner = store.owner(session_id)
+    if owner and owner != store.worker_id:
+        return None, owner
+    record = store.load(session_id)
+    if record is None or not record['is_active']:
+        return None, None
+    if not store.claim(session_id):
+        return None, store.owner(session_id)
+    session = active_sessions.setdefault(session_id, CallSession.restore(record, store))
+    print(f"🛟 Took over session {session_id} ({len(session.transcript)} utterances) from a stopped worker")
+    return session, None
+
+
+def recover_sessions(store=session_store):
+    """
+    Rebuild active_sessions from the event log at startup
+    Sessions another live worker already owns are left to it.
+    Returns: number of sessions recovered
+    """
+    recovered = 0
+    for record in event_log.recover():
+        session_id = record['session_id']
+        if session_id in active_sessions or not store.claim(session_id):
+            continue
+        session = active_sessions[session_id] = CallSession.restore(record, store)
+        if not store.exists(session_id):
+            # The store lost the call too (a fresh Redis): mirror it again
+            store.create(session)
+            for entry in session.transcript:
+                store.append_transcript(session_id, entry.to_dict())
+            store.save_alerts(session_id, [alert.to_dict() for alert in session.alerts_snapshot()[0]])
+        recovered += 1
+    if recovered:
+        print(f"♻️ Recovered {recovered} session(s) from the event log")
+    return recovered
+
+
+def reap_sessions(store=session_store, now=None):
+    """
+    Archive calls out of memory: stopped ones SESSION_STOPPED_TTL seconds
+    after they stopped, active ones once they have had no utterance for
+    SESSION_IDLE_TTL (those are stopped first). Calls with audio or analysis
+    still in flight are left for the next pass. Their records stay readable
+    from the event log archive; their mirror in the session store is deleted.
+    Returns: ids of the sessions removed
+    """
+    now = time.monotonic() if now is None else now
+    reaped = []
+    for session_id, session in list(active_sessions.items()):
+        if session.pipeline.busy:
+            continue
+        if session.is_active:
+            if now - session.last_activity < SESSION_IDLE_TTL:
+                continue
+            print(f"💤 Session {session_id} idle for {int(now - session.last_activity)}s - stopping it")
+            store.set_active(session_id, False)
+            close_session(session)
+        elif now - session.stopped_at < SESSION_STOPPED_TTL:
+            continue
+        active_sessions.pop(session_id, None)
+        event_log.archive(session_id)
+        fanout.forget(session_id)
+        store.archive(session_id)
+        reaped.append(session_id)
+    if reaped:
+        print(f"🗄️ Archived {len(reaped)} session(s) out of memory, {len(active_sessions)} still held")
+    return reaped
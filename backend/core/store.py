@@ -0,0 +1,305 @@
+"""
+Session Store
+Where call state lives beyond the worker process running the call. A
+session's pipeline (queues, worker flags, locks) only exists in the process
+that owns it; the store records who that owner is, mirrors the session's
+transcript and alerts so any worker can serve them, holds the socket
+fan-out's room registry, frame versions and replay buffer, and carries audio
+that reached the wrong worker over to the owner.
+
+    memory  one process, nothing shared (the default)
+    redis   any Redis-protocol server; required for several workers
+"""
+
+import base64
+import json
+import threading
+from collections import deque
+from datetime import datetime
+from config import SESSION_STORE, REDIS_URL, WORKER_ID, SESSION_OWNER_TTL, FANOUT_REPLAY_FRAMES
+
+PREFIX = 'medcall'
+# Keys kept per call besides its owner lease
+MIRRORED_KINDS = ('session', 'transcript', 'alerts', 'rooms', 'version', 'frames')
+
+
+class MemorySessionStore:
+    """
+    Single-process store: every session is local, so ownership and mirroring
+    are no-ops and only the fan-out bookkeeping is kept, in plain dicts
+    """
+
+    shared = False
+
+    def __init__(self, worker_id=WORKER_ID):
+        self._lock = threading.Lock()
+        self.worker_id = worker_id
+        self._rooms = {}  # session_id (or '*') -> {room: members}
+        self._versions = {}  # session_id -> last frame version
+        self._frames = {}  # session_id -> deque of (version, tick), the replay buffer
+
+    # Ownership and mirroring: nothing to share
+    def claim(self, session_id):
+        return True
+
+    def owner(self, session_id):
+        return self.worker_id
+
+    def heartbeat(self, session_ids):
+        pass
+
+    def release(self, session_id):
+        pass
+
+    def archive(self, session_id):
+        self.forget(session_id)
+
+    def create(self, session):
+        pass
+
+    def append_transcript(self, session_id, entry):
+        pass
+
+    def save_alerts(self, session_id, alerts):
+        pass
+
+    def set_active(self, session_id, active):
+        pass
+
+    def exists(self, session_id):
+        return False  # beyond active_sessions, which callers check first
+
+    def load(self, session_id):
+        return None
+
+    def forward(self, worker_id, event, session_id, data, sid=None):
+        raise RuntimeError("the memory session store has no other workers to forward to")
+
+    def poll(self):
+        return []
+
+    # Socket fan-out registry
+    def add_room(self, key, room):
+        with self._lock:
+            rooms = self._rooms.setdefault(key, {})
+            rooms[room] = rooms.get(room, 0) + 1
+
+    def remove_room(self, key, room):
+        with self._lock:
+            rooms = self._rooms.get(key, {})
+            rooms[room] = rooms.get(room, 0) - 1
+            if rooms[room] <= 0:
+                rooms.pop(room)
+            if not rooms:
+                self._rooms.pop(key, None)
+
+    def rooms(self, key):
+        with self._lock:
+            return list(self._rooms.get(key, ()))
+
+    def next_version(self, session_id):
+        with self._lock:
+            self._versions[session_id] = self._versions.get(session_id, 0) + 1
+            return self._versions[session_id]
+
+    def version(self, session_id):
+        with self._lock:
+            return self._versions.get(session_id, 0)
+
+    def push_frame(self, session_id, version, tick, limit=FANOUT_REPLAY_FRAMES):
+        with self._lock:
+            self._frames.setdefault(session_id, deque(maxlen=limit)).append((version, tick))
+
+    def frames_since(self, session_id, version):
+        """Buffered ticks after `version`, oldest first, as (version, tick)"""
+        with self._lock:
+            return [frame for frame in self._frames.get(session_id, ()) if frame[0] > version]
+
+    def forget(self, session_id):
+        with self._lock:
+            self._versions.pop(session_id, None)
+            self._frames.pop(session_id, None)
+
+
+class RedisSessionStore:
+    """
+    Store shared by every worker through a Redis-protocol server
+
+    Ownership is a lease: claim() sets medcall:owner:<id> to this worker for
+    `owner_ttl` seconds and heartbeat() renews it for the sessions still
+    running here, so if a worker dies its calls can be claimed by whichever
+    worker next receives their audio. Transcript entries are appended to a
+    list and alerts kept in a hash by id, so each update is one small write.
+    Audio for a session owned elsewhere is published on the owner's channel
+    and picked up by its poll().
+    """
+
+    shared = True
+
+    def __init__(self, url=REDIS_URL, worker_id=WORKER_ID, owner_ttl=SESSION_OWNER_TTL, client=None):
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise RuntimeError("SESSION_STORE=redis needs the redis package (pip install redis)")
+            client = redis.Redis.from_url(url)
+        self.redis = client
+        self.worker_id = worker_id
+        self.owner_ttl = owner_ttl
+        self.channel = f"{PREFIX}:worker:{worker_id}"
+        self._pubsub = None
+        print(f"🗄️ Redis session store at {url} (worker {worker_id})")
+
+    def _key(self, kind, session_id):
+        return f"{PREFIX}:{kind}:{session_id}"
+
+    # Ownership
+    def claim(self, session_id):
+        """Take a session that has no live owner (or already is ours); True if we own it"""
+        key = self._key('owner', session_id)
+        if self.redis.set(key, self.worker_id, nx=True, ex=self.owner_ttl):
+            return True
+        return self.owner(session_id) == self.worker_id
+
+    def owner(self, session_id):
+        owner = self.redis.get(self._key('owner', session_id))
+        return owner.decode() if owner else None
+
+    def heartbeat(self, session_ids):
+        """Renew the leases of the sessions running on this worker"""
+        session_ids = list(session_ids)
+        if not session_ids:
+            return
+        keys = [self._key('owner', session_id) for session_id in session_ids]
+        owners = self.redis.mget(keys)
+        pipe = self.redis.pipeline(transaction=False)
+        for key, owner in zip(keys, owners):
+            if owner is None or owner.decode() == self.worker_id:
+                pipe.set(key, self.worker_id, ex=self.owner_ttl)
+        pipe.execute()
+
+    def release(self, session_id):
+        key = self._key('owner', session_id)
+        if self.owner(session_id) == self.worker_id:
+            self.redis.delete(key)
+
+    def archive(self, session_id):
+        """Drop every key of a call that left memory (its record lives on in the event log archive)"""
+        self.release(session_id)
+        self.redis.delete(*(self._key(kind, session_id) for kind in MIRRORED_KINDS))
+
+    # Mirrored session record
+    def create(self, session):
+        self.redis.hset(self._key('session', session.session_id), mapping={
+            "start_time": session.start_time.isoformat(),
+            "is_active": int(session.is_active)
+        })
+
+    def append_transcript(self, session_id, entry):
+        self.redis.rpush(self._key('transcript', session_id), json.dumps(entry))
+
+    def save_alerts(self, session_id, alerts):
+        if alerts:
+            self.redis.hset(self._key('alerts', session_id), mapping={
+                str(alert['id']): json.dumps(alert) for alert in alerts
+            })
+
+    def set_active(self, session_id, active):
+        self.redis.hset(self._key('session', session_id), "is_active", int(active))
+
+    def exists(self, session_id):
+        return bool(self.redis.exists(self._key('session', session_id)))
+
+    def load(self, session_id):
+        """
+        The mirrored record of a session, or None
+        Returns: {"session_id", "start_time", "is_active", "owner", "transcript", "alerts"}
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.hgetall(self._key('session', session_id))
+        pipe.lrange(self._key('transcript', session_id), 0, -1)
+        pipe.hvals(self._key('alerts', session_id))
+        pipe.get(self._key('owner', session_id))
+        meta, transcript, alerts, owner = pipe.execute()
+        if not meta:
+            return None
+        return {
+            "session_id": session_id,
+            "start_time": datetime.fromisoformat(meta[b'start_time'].decode()),
+            "is_active": meta[b'is_active'] == b'1',
+            "owner": owner.decode() if owner else None,
+            "transcript": [json.loads(entry) for entry in transcript],
+            "alerts": sorted((json.loads(alert) for alert in alerts), key=lambda alert: alert['id'])
+        }
+
+    # Session affinity
+    def forward(self, worker_id, event, session_id, data, sid=None):
+        """Hand a socket message for one of `worker_id`'s sessions over to it"""
+        binary = isinstance(data, (bytes, bytearray, memoryview))
+        message = {
+            "event": event,
+            "session_id": session_id,
+            "sid": sid,
+            "binary": binary,
+            "data": base64.b64encode(data).decode('ascii') if binary else data
+        }
+        return self.redis.publish(f"{PREFIX}:worker:{worker_id}", json.dumps(message))
+
+    def poll(self):
+        """Messages forwarded to this worker since the last poll (never blocks)"""
+        if self._pubsub is None:
+            self._pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self.channel)
+        messages = []
+        while True:
+            raw = self._pubsub.get_message(timeout=0.0)
+            if raw is None:
+                return messages
+            message = json.loads(raw['data'])
+            if message['binary']:
+                message['data'] = base64.b64decode(message['data'])
+            messages.append(message)
+
+    # Socket fan-out registry
+    def add_room(self, key, room):
+        self.redis.hincrby(self._key('rooms', key), room, 1)
+
+    def remove_room(self, key, room):
+        if self.redis.hincrby(self._key('rooms', key), room, -1) <= 0:
+            self.redis.hdel(self._key('rooms', key), room)
+
+    def rooms(self, key):
+        return [room.decode() for room in self.redis.hkeys(self._key('rooms', key))]
+
+    def next_version(self, session_id):
+        return self.redis.incr(self._key('version', session_id))
+
+    def version(self, session_id):
+        return int(self.redis.get(self._key('version', session_id)) or 0)
+
+    def push_frame(self, session_id, version, tick, limit=FANOUT_REPLAY_FRAMES):
+        key = self._key('frames', session_id)
+        pipe = self.redis.pipeline(transaction=False)
+        pipe.rpush(key, json.dumps([version, tick]))
+        pipe.ltrim(key, -limit, -1)
+        pipe.execute()
+
+    def frames_since(self, session_id, version):
+        """Buffered ticks after `version`, oldest first, as (version, tick)"""
+        frames = (json.loads(frame) for frame in self.redis.lrange(self._key('frames', session_id), 0, -1))
+        return [(frame_version, tick) for frame_version, tick in frames if frame_version > version]
+
+    def forget(self, session_id):
+        self.redis.delete(self._key('version', session_id), self._key('frames', session_id))
+
+
+def create_session_store(kind=SESSION_STORE):
+    if kind == 'redis':
+        return RedisSessionStore()
+    if kind != 'memory':
+        raise ValueError(f"Unknown SESSION_STORE '{kind}' (expected memory or redis)")
+    return MemorySessionStore()
+
+
+# One per process, shared by the sessions, the fan-out and both servers
+session_store = create_session_store()
@@ -0,0 +1,12 @@
+"""
+Test configuration
+config.py refuses to load without an API key; the tests never call OpenAI,
+and build their own event logs in temporary directories
+"""
+
+import os
+
+os.environ.setdefault('OPENAI_API_KEY', 'sk-test')
+os.environ['EVENT_LOG_DIR'] = ''
+os.environ.setdefault('ACOUSTIC_WORKERS', '0')
+os.environ.setdefault('OPENAI_WARMUP_CONNECTIONS', '0')
@@ -0,0 +1,138 @@
+"""
+EventLog: recovery after a torn write, snapshot-plus-tail replay and archiving
+Each test writes with one EventLog and recovers with a fresh one, as a restart would.
+"""
+
+import json
+import os
+from datetime import datetime
+import pytest
+from core.eventlog import LOG_SUFFIX, SNAPSHOT_SUFFIX, EventLog
+
+START = datetime(2026, 1, 1, 9, 0, 0)
+
+
+def entry(index):
+    return {"seq": index, "timestamp": START.isoformat(), "speaker": "user", "text": f"utterance {index}"}
+
+
+def alert(alert_id, rev, **extra):
+    return dict({"id": alert_id, "rev": rev, "timestamp": START.isoformat(), "type": "emergency",
+                 "message": "m", "severity": "high", "action": None}, **extra)
+
+
+@pytest.fixture
+def log_dir(tmp_path):
+    return str(tmp_path)
+
+
+def start_call(log, session_id='call', utterances=0):
+    log.append(session_id, 'start', {"start_time": START.isoformat()})
+    for index in range(1, utterances + 1):
+        log.append(session_id, 'transcript', entry(index))
+
+
+def test_recover_replays_the_log(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, utterances=3)
+    log.append('call', 'alert', alert(1, 4))
+    log.append('call', 'alert', alert(1, 5, retracted=True))
+    log.flush()
+
+    [record] = EventLog(log_dir).recover()
+    assert record['session_id'] == 'call'
+    assert record['start_time'] == START
+    assert record['is_active'] is True
+    assert [item['text'] for item in record['transcript']] == ['utterance 1', 'utterance 2', 'utterance 3']
+    assert record['alerts'] == [alert(1, 5, retracted=True)]
+    assert record['last_seq'] == 6
+
+
+def test_torn_last_line_is_cut_off(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, utterances=2)
+    log.flush()
+    path = os.path.join(log_dir, 'call' + LOG_SUFFIX)
+    with open(path, 'a', encoding='utf-8') as handle:
+        handle.write('{"seq": 4, "type": "transcr')  # crash mid-write
+    size = os.path.getsize(path)
+
+    restarted = EventLog(log_dir, flush_ms=5)
+    [record] = restarted.recover()
+    assert len(record['transcript']) == 2
+    assert record['last_seq'] == 3
+    assert os.path.getsize(path) < size
+
+    # Events logged after recovery start on a clean line and continue the sequence
+    assert restarted.append('call', 'transcript', entry(3)) == 4
+    restarted.flush()
+    [record] = EventLog(log_dir).recover()
+    assert [item['text'] for item in record['transcript']] == ['utterance 1', 'utterance 2', 'utterance 3']
+    assert record['last_seq'] == 4
+
+
+def test_snapshot_plus_tail(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, utterances=2)
+    log.append('call', 'alert', alert(1, 1))
+    log.compact('call')
+    log.append('call', 'transcript', entry(3))
+    log.append('call', 'alert', alert(1, 2, provisional=False))
+    log.append('call', 'stop')
+    log.flush()
+    assert os.path.exists(os.path.join(log_dir, 'call' + SNAPSHOT_SUFFIX))
+    assert os.path.exists(os.path.join(log_dir, 'call' + LOG_SUFFIX))
+
+    [record] = EventLog(log_dir).recover()
+    assert [item['text'] for item in record['transcript']] == ['utterance 1', 'utterance 2', 'utterance 3']
+    assert record['alerts'] == [alert(1, 2, provisional=False)]
+    assert record['is_active'] is False
+    assert record['last_seq'] == 7
+
+
+def test_tail_events_already_in_the_snapshot_are_not_replayed_twice(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, utterances=2)
+    log.compact('call')
+    log.flush()
+    # A crash between writing the snapshot and removing the log leaves both behind
+    with open(os.path.join(log_dir, 'call' + LOG_SUFFIX), 'w', encoding='utf-8') as handle:
+        handle.write(json.dumps({"seq": 2, "type": "transcript", "ts": "", "data": entry(1)}) + "\n")
+
+    [record] = EventLog(log_dir).recover()
+    assert len(record['transcript']) == 2
+    assert record['last_seq'] == 3
+
+
+def test_archived_calls_leave_recovery(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, 'gone', utterances=1)
+    log.append('gone', 'stop')
+    start_call(log, 'kept', utterances=1)
+    log.archive('gone')
+    log.flush()
+
+    restarted = EventLog(log_dir)
+    assert [record['session_id'] for record in restarted.recover()] == ['kept']
+    archived = restarted.load_archived('gone')
+    assert archived['is_active'] is False
+    assert archived['start_time'] == START
+    assert [item['text'] for item in archived['transcript']] == ['utterance 1']
+    assert restarted.load_archived('kept') is None
+
+
+def test_session_ids_are_escaped_in_file_names(log_dir):
+    log = EventLog(log_dir, flush_ms=5)
+    start_call(log, '../call/1', utterances=1)
+    log.flush()
+    assert sorted(os.listdir(log_dir)) == ['..%2Fcall%2F1' + LOG_SUFFIX, 'archive']
+    [record] = EventLog(log_dir).recover()
+    assert record['session_id'] == '../call/1'
+
+
+def test_disabled_log_does_nothing():
+    log = EventLog('', flush_ms=5)
+    assert log.append('call', 'start', {"start_time": START.isoformat()}) is None
+    log.flush()
+    assert log.recover() == []
+    assert log.load_archived('call') is None
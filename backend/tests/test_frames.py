@@ -0,0 +1,72 @@
+"""
+Binary audio frames: build_frame/parse_frame round-trips and malformed headers
+"""
+
+import pytest
+from audio.frames import HEADER, MAGIC, PCM_S16LE, FrameError, build_frame, parse_frame
+
+
+@pytest.mark.parametrize('wrap', [bytes, bytearray, memoryview])
+def test_round_trip(wrap):
+    payload = bytes(range(256)) * 4
+    frame = parse_frame(wrap(build_frame('call-1', 42, 1, 48000, payload)))
+    assert (frame.session_id, frame.seq, frame.codec, frame.sample_rate) == ('call-1', 42, 1, 48000)
+    assert bytes(frame.payload) == payload
+    assert frame.filename == 'audio.webm'
+    assert frame.codec_name == 'webm'
+
+
+def test_payload_is_a_view_of_the_received_buffer():
+    data = bytearray(build_frame('s', 1, PCM_S16LE, 16000, b'\x01\x02\x03\x04'))
+    frame = parse_frame(data)
+    assert isinstance(frame.payload, memoryview)
+    data[-1] = 0xff
+    assert bytes(frame.payload) == b'\x01\x02\x03\xff'
+
+
+def test_utf8_session_id_and_empty_payload():
+    frame = parse_frame(build_frame('appel-é', 7, PCM_S16LE, 16000, b''))
+    assert frame.session_id == 'appel-é'
+    assert len(frame.payload) == 0
+    assert frame.filename == 'audio.wav'
+
+
+def test_unknown_codec_falls_back_to_webm():
+    frame = parse_frame(build_frame('s', 1, 99, 0, b'x'))
+    assert frame.codec_name == 'unknown'
+    assert frame.filename == 'audio.webm'
+
+
+def test_too_short():
+    with pytest.raises(FrameError, match='too short'):
+        parse_frame(build_frame('s', 1, 1, 0, b'')[:HEADER.size - 1])
+
+
+def test_bad_magic():
+    data = build_frame('s', 1, 1, 0, b'audio')
+    with pytest.raises(FrameError, match='magic'):
+        parse_frame(b'XXXX' + data[len(MAGIC):])
+
+
+def test_unsupported_version():
+    data = bytearray(build_frame('s', 1, 1, 0, b'audio'))
+    data[4] = 2
+    with pytest.raises(FrameError, match='version 2'):
+        parse_frame(data)
+
+
+def test_truncated_session_id():
+    data = build_frame('a-long-session-id', 1, 1, 0, b'')
+    with pytest.raises(FrameError, match='truncated'):
+        parse_frame(data[:HEADER.size + 3])
+
+
+def test_session_id_not_utf8():
+    data = HEADER.pack(MAGIC, 1, 1, 0, 1, 2) + b'\xff\xfe' + b'audio'
+    with pytest.raises(FrameError, match='UTF-8'):
+        parse_frame(data)
+
+
+def test_frame_error_is_a_value_error():
+    with pytest.raises(ValueError):
+        parse_frame(b'')
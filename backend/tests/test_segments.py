@@ -0,0 +1,79 @@
+"""
+split_at_silence: cuts land in pauses and always move forward, whatever the target length
+"""
+
+import threading
+import numpy as np
+import pytest
+from audio.segments import split_at_silence
+from audio.vad import VoiceActivityDetector
+
+RATE = 16000
+
+
+def noise(seconds, seed=0):
+    return (np.random.default_rng(seed).standard_normal(int(seconds * RATE)) * 0.2).astype(np.float32)
+
+
+def with_pause(seconds, pause_at, pause_seconds=0.5):
+    samples = noise(seconds)
+    samples[int(pause_at * RATE):int((pause_at + pause_seconds) * RATE)] = 0
+    return samples
+
+
+def split(samples, target, overlap=0.0, search=5.0):
+    # A cut that doesn't advance loops forever: fail instead of hanging the suite (the thread is a daemon)
+    result = []
+    thread = threading.Thread(target=lambda: result.append(
+        split_at_silence(VoiceActivityDetector(), samples, RATE, target, overlap, search)
+    ), daemon=True)
+    thread.start()
+    thread.join(10)
+    assert result, f"split_at_silence did not finish for a {target}s target"
+    return result[0]
+
+
+@pytest.mark.parametrize('target', [30, 10, 5, 3, 1, 0.5, 0.01])
+def test_segments_cover_the_recording_and_advance(target):
+    samples = noise(60)
+    ranges = split(samples, target)
+    assert ranges[0][0] == 0
+    assert ranges[-1][1] == len(samples)
+    for (begin, end), (next_begin, _) in zip(ranges, ranges[1:]):
+        assert begin < end == next_begin
+
+
+@pytest.mark.parametrize('target', [5, 3, 1])
+def test_target_at_or_below_the_search_window_is_not_looked_up_before_the_last_cut(target):
+    # A long pause right at the start must not pull every cut back to it
+    samples = with_pause(30, 0.1, pause_seconds=0.8)
+    ranges = split(samples, target)
+    assert len(ranges) >= 30 / (1.5 * target)
+    assert all(end - begin <= 1.5 * target * RATE + 400 for begin, end in ranges[:-1])
+
+
+def test_cut_lands_in_the_pause():
+    samples = with_pause(25, 11.5)
+    first_end = split(samples, 10)[0][1]
+    assert 11.5 * RATE <= first_end <= 12 * RATE
+
+
+def test_short_target_still_finds_a_nearby_pause():
+    samples = with_pause(10, 2.3, pause_seconds=0.3)
+    first_end = split(samples, 2)[0][1]
+    assert 2.3 * RATE <= first_end <= 2.6 * RATE
+
+
+def test_overlap_is_added_on_both_sides_and_clipped_at_the_ends():
+    samples = noise(40)
+    plain = split(samples, 10)
+    overlapped = split(samples, 10, overlap=1.0)
+    assert overlapped[0][0] == 0 and overlapped[-1][1] == len(samples)
+    for (begin, end), (wide_begin, wide_end) in zip(plain[1:-1], overlapped[1:-1]):
+        assert (wide_begin, wide_end) == (begin - RATE, end + RATE)
+
+
+@pytest.mark.parametrize('seconds', [0, 3, 12])
+def test_recordings_shorter_than_a_target_plus_search_are_one_segment(seconds):
+    samples = noise(seconds)
+    assert split(samples, 10) == [(0, len(samples))]
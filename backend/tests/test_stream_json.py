@@ -0,0 +1,66 @@
+"""
+IncrementalJSONParser: fields must come out the same however the stream is split
+"""
+
+import json
+import pytest
+from agents.stream_json import IncrementalJSONParser
+
+RESPONSE = (
+    '{"is_emergency": true, "reason": "says \\"I can\'t breathe\\" {twice}", '
+    '"path": "C:\\\\temp\\\\", "signals": [{"kind": "breath", "score": 0.9}, [1, 2]], '
+    '"nested": {"a": {"b": "}"}}, "confidence": 0.85}'
+)
+
+
+def feed_in_chunks(text, size):
+    parser = IncrementalJSONParser()
+    completed = []
+    for start in range(0, len(text), size):
+        completed += parser.feed(text[start:start + size])
+    return parser, completed
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 16, len(RESPONSE)])
+def test_split_input_matches_json_loads(size):
+    parser, completed = feed_in_chunks(RESPONSE, size)
+    expected = json.loads(RESPONSE)
+    assert parser.fields == expected
+    assert completed == list(expected)
+    assert parser.done
+
+
+def test_fields_complete_as_soon_as_their_value_closes():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"is_emergency": tr') == []
+    assert parser.feed('ue, "reason": "chest') == ['is_emergency']
+    assert parser.fields == {"is_emergency": True}
+    assert parser.feed(' pain"') == []
+    assert parser.feed('}') == ['reason']
+    assert parser.fields['reason'] == "chest pain"
+
+
+def test_escaped_quotes_and_backslashes_do_not_end_strings():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": "x\\\\", "b": "say \\"hi\\", ok"}')
+    assert parser.fields == {"a": "x\\", "b": 'say "hi", ok'}
+
+
+def test_text_before_the_object_is_ignored():
+    parser = IncrementalJSONParser()
+    parser.feed('```json\n{"severity": "high"}\n```')
+    assert parser.fields == {"severity": "high"}
+    assert parser.done
+
+
+def test_unfinished_object_keeps_only_closed_fields():
+    parser = IncrementalJSONParser()
+    parser.feed('{"a": 1, "b": [1, 2')
+    assert parser.fields == {"a": 1}
+    assert not parser.done
+
+
+def test_malformed_value_is_skipped():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"a": tru, "b": 2}') == ['b']
+    assert parser.fields == {"b": 2}
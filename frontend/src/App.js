@@ -1,4 +1,5 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
+import axios from 'axios';
 import './App.css';
 import CallMonitor from './components/CallMonitor';
 import AlertDashboard from './components/AlertDashboard';
@@ -7,17 +8,46 @@ import SessionControl from './components/SessionControl';
 import AudioFileUpload from './components/AudioFileUpload';
 import { Activity } from 'lucide-react';
 
+const API_URL = process.env.REACT_APP_API_URL || 'http://localhost:5001';
+
+// Every item of a cursor-paged endpoint after `since`, the cursor after them,
+// and whether the server no longer held some of them (`truncated`)
+async function fetchPages(url, key, since) {
+  const items = [];
+  let cursor = since;
+  let truncated = false;
+  for (let more = true; more;) {
+    const { data } = await axios.get(url, { params: { since: cursor } });
+    items.push(...data[key]);
+    truncated = truncated || Boolean(data.truncated);
+    cursor = data.next;
+    more = data.has_more;
+  }
+  return { items, next: cursor, truncated };
+}
+
 function App() {
   const [sessionId, setSessionId] = useState(null);
   const [isSessionActive, setIsSessionActive] = useState(false);
   const [alerts, setAlerts] = useState([]);
   const [transcript, setTranscript] = useState([]);
+  // Live text not yet in the transcript: finalized segments awaiting analysis + the open window
+  const [pendingFinals, setPendingFinals] = useState([]);
+  const [partial, setPartial] = useState('');
+  // Latest state for the resync below, which runs from a socket callback
+  const alertsRef = useRef(alerts);
+  alertsRef.current = alerts;
+  // Utterances of the call accounted for (the transcript cursor), gap markers aside
+  const transcriptCursorRef = useRef(0);
 
   const handleSessionStart = (newSessionId) => {
     setSessionId(newSessionId);
     setIsSessionActive(true);
     setAlerts([]);
     setTranscript([]);
+    transcriptCursorRef.current = 0;
+    setPendingFinals([]);
+    setPartial('');
   };
 
   const handleSessionStop = () => {
@@ -28,8 +58,50 @@ function App() {
     setAlerts(prev => [...prev, alert]);
   };
 
+  const handleAlertUpdate = (updated) => {
+    // A provisional red-flag alert the AI agents did not confirm is withdrawn
+    if (updated.retracted) {
+      setAlerts(prev => prev.filter(alert => alert.id !== updated.id));
+      return;
+    }
+    setAlerts(prev => prev.map(alert => (alert.id === updated.id ? updated : alert)));
+  };
+
   const handleTranscriptUpdate = (entry) => {
     setTranscript(prev => [...prev, entry]);
+    transcriptCursorRef.current += 1;
+    setPendingFinals(prev => (prev[0] === entry.text ? prev.slice(1) : prev));
+  };
+
+  // Reconnected after missing more frames than the server keeps: fetch only what changed since our cursors
+  const handleResync = async () => {
+    const alertSince = alertsRef.current.reduce((max, alert) => Math.max(max, alert.rev || 0), 0);
+    const { items: changed } = await fetchPages(`${API_URL}/api/session/${sessionId}/alerts`, 'alerts', alertSince);
+    changed.forEach((alert) => {
+      if (alertsRef.current.some(known => known.id === alert.id) || alert.retracted) {
+        handleAlertUpdate(alert);
+      } else {
+        handleNewAlert(alert);
+      }
+    });
+    const { items: missed, next, truncated } = await fetchPages(
+      `${API_URL}/api/session/${sessionId}/transcript`, 'transcript', transcriptCursorRef.current
+    );
+    if (truncated) {
+      // The server dropped utterances between our cursor and its oldest held one: show the gap
+      setTranscript(prev => [...prev, { gap: true, text: '[…]' }]);
+    }
+    missed.forEach(handleTranscriptUpdate);
+    transcriptCursorRef.current = next;
+  };
+
+  const handleTranscriptPartial = ({ text, final }) => {
+    if (final) {
+      if (text) setPendingFinals(prev => [...prev, text]);
+      setPartial('');
+    } else {
+      setPartial(text);
+    }
   };
 
   return (
@@ -63,7 +135,10 @@ function App() {
                 <CallMonitor
                   sessionId={sessionId}
                   onAlert={handleNewAlert}
+                  onAlertUpdate={handleAlertUpdate}
                   onTranscriptUpdate={handleTranscriptUpdate}
+                  onTranscriptPartial={handleTranscriptPartial}
+                  onResync={handleResync}
                 />
               </div>
 
@@ -85,7 +160,7 @@ function App() {
           {/* Transcript */}
           {isSessionActive && (
             <div className="transcript-section">
-              <TranscriptView transcript={transcript} />
+              <TranscriptView transcript={transcript} partial={[...pendingFinals, partial].join(' ').trim()} />
             </div>
           )}
         </div>
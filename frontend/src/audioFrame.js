@@ -0,0 +1,44 @@
+// Binary `audio_frame` wire format; mirrors backend/audio/frames.py
+//   magic "MCAF" | version u8 | codec u8 | sample rate u32 | seq u32 | session id length u16 | session id | audio
+const MAGIC = [0x4d, 0x43, 0x41, 0x46];
+const VERSION = 1;
+const HEADER_SIZE = 16;
+
+const CODECS = { webm: 1, wav: 2, mp3: 3, mpeg: 3, ogg: 4, m4a: 5, mp4: 5, pcm: 6 };
+export const PCM_CODEC = CODECS.pcm;
+
+// Codec id from a MIME type ("audio/webm;codecs=opus") or file name ("call.wav")
+export function codecId(typeOrName = '') {
+  const match = typeOrName.toLowerCase().match(/(?:audio\/(?:x-)?|\.)(\w+)/);
+  return (match && CODECS[match[1]]) || 0;
+}
+
+export function buildAudioFrame(sessionId, seq, codec, sampleRate, audioBuffer) {
+  const session = new TextEncoder().encode(sessionId);
+  const frame = new Uint8Array(HEADER_SIZE + session.length + audioBuffer.byteLength);
+  const header = new DataView(frame.buffer);
+  frame.set(MAGIC, 0);
+  header.setUint8(4, VERSION);
+  header.setUint8(5, codec);
+  header.setUint32(6, sampleRate || 0);
+  header.setUint32(10, seq);
+  header.setUint16(14, session.length);
+  frame.set(session, HEADER_SIZE);
+  frame.set(new Uint8Array(audioBuffer), HEADER_SIZE + session.length);
+  return frame.buffer;
+}
+
+// Float samples at `inputRate` -> 16-bit PCM at `outputRate` (box-filter downsampling)
+export function toPcm16(samples, inputRate, outputRate = 16000) {
+  const ratio = inputRate / outputRate;
+  const pcm = new Int16Array(Math.floor(samples.length / ratio));
+  for (let i = 0; i < pcm.length; i++) {
+    const start = Math.floor(i * ratio);
+    const end = Math.min(samples.length, Math.floor((i + 1) * ratio));
+    let sum = 0;
+    for (let j = start; j < end; j++) sum += samples[j];
+    const value = Math.max(-1, Math.min(1, sum / Math.max(1, end - start)));
+    pcm[i] = value < 0 ? value * 0x8000 : value * 0x7fff;
+  }
+  return pcm;
+}
@@ -1,5 +1,5 @@
 import React from 'react';
-import { AlertTriangle, Calendar, AlertCircle, Shield } from 'lucide-react';
+import { AlertTriangle, Calendar, AlertCircle, Shield, Thermometer, TrendingUp } from 'lucide-react';
 import './AlertDashboard.css';
 
 function AlertDashboard({ alerts }) {
@@ -13,6 +13,10 @@ function AlertDashboard({ alerts }) {
         return <AlertCircle size={20} />;
       case 'sentiment_mismatch':
         return <Shield size={20} />;
+      case 'fever':
+        return <Thermometer size={20} />;
+      case 'pain_increase':
+        return <TrendingUp size={20} />;
       default:
         return <AlertTriangle size={20} />;
     }
@@ -82,6 +86,10 @@ function AlertDashboard({ alerts }) {
                 <div className="alert-message">
                   {alert.message}
                 </div>
+
+                {alert.provisional && (
+                  <div className="alert-provisional">Unconfirmed — AI agents are checking</div>
+                )}
                 
                 {alert.action && (
                   <div className="alert-action">
@@ -1,6 +1,7 @@
 import React, { useState, useRef, useEffect } from 'react';
 import io from 'socket.io-client';
 import { Upload, File } from 'lucide-react';
+import { buildAudioFrame, codecId } from '../audioFrame';
 import './AudioFileUpload.css';
 
 const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || 'http://localhost:5001';
@@ -8,8 +9,11 @@ const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || 'http://localhost:5001';
 function AudioFileUpload({ sessionId }) {
   const [uploading, setUploading] = useState(false);
   const [fileName, setFileName] = useState('');
+  const [progress, setProgress] = useState(null);
   const socketRef = useRef(null);
   const fileInputRef = useRef(null);
+  const frameSeqRef = useRef(0);
+  const segmentedRef = useRef(false);
 
   useEffect(() => {
     // Cleanup socket connection on component unmount
@@ -27,6 +31,8 @@ function AudioFileUpload({ sessionId }) {
 
     console.log('🔌 Initializing socket connection for file upload to:', SOCKET_URL);
     socketRef.current = io(SOCKET_URL, {
+      // WebSocket first: a long-polling handshake can land on a different backend worker
+      transports: ['websocket', 'polling'],
       reconnection: true,
       reconnectionDelay: 1000,
       reconnectionDelayMax: 5000,
@@ -43,8 +49,17 @@ function AudioFileUpload({ sessionId }) {
       console.log('✅ Successfully joined session:', data);
     });
 
-    socketRef.current.on('transcript_update', () => {
-      setUploading(false);
+    // Short files come back as one transcript; long ones report per-segment progress
+    socketRef.current.on('session_frame', (frame) => {
+      if (frame.session_id === sessionId && frame.transcript && !segmentedRef.current) setUploading(false);
+    });
+
+    socketRef.current.on('upload_progress', (update) => {
+      if (update.session_id !== sessionId) return;
+      console.log(`✂️ Segment ${update.segment}/${update.segments} transcribed`);
+      segmentedRef.current = !update.done;
+      setProgress(update.done ? null : update);
+      if (update.done) setUploading(false);
     });
 
     socketRef.current.on('connect_error', (error) => {
@@ -68,30 +83,28 @@ function AudioFileUpload({ sessionId }) {
 
     setFileName(file.name);
     setUploading(true);
+    setProgress(null);
 
     try {
       initializeSocket();
 
-      const reader = new FileReader();
-      reader.onload = async (e) => {
-        // Give socket time to connect if needed
-        if (!socketRef.current.connected) {
-          console.log('⏳ Waiting for socket to connect...');
-          await new Promise(resolve => {
-            socketRef.current.once('connect', resolve);
-            setTimeout(resolve, 2000); // Timeout after 2s
-          });
-        }
-
-        const base64Audio = e.target.result.split(',')[1];
-        console.log('📤 Emitting audio_chunk with sessionId:', sessionId);
-        socketRef.current.emit('audio_chunk', {
-          session_id: sessionId,
-          audio: base64Audio
+      const audioBuffer = await file.arrayBuffer();
+
+      // Give socket time to connect if needed
+      if (!socketRef.current.connected) {
+        console.log('⏳ Waiting for socket to connect...');
+        await new Promise(resolve => {
+          socketRef.current.once('connect', resolve);
+          setTimeout(resolve, 2000); // Timeout after 2s
         });
-      };
+      }
 
-      reader.readAsDataURL(file);
+      // Raw file bytes in a binary frame; the server reads the codec from its header
+      const frame = buildAudioFrame(
+        sessionId, frameSeqRef.current++, codecId(file.type || file.name), 0, audioBuffer
+      );
+      console.log('📤 Emitting audio_frame with sessionId:', sessionId);
+      socketRef.current.emit('audio_frame', frame);
 
     } catch (error) {
       console.error('File upload error:', error);
@@ -120,7 +133,9 @@ function AudioFileUpload({ sessionId }) {
         {uploading ? (
           <>
             <File size={20} className="spinning" />
-            Processing {fileName}...
+            {progress
+              ? `Transcribing ${fileName}: ${Math.round(progress.transcribed_seconds)}s of ${Math.round(progress.duration)}s`
+              : `Processing ${fileName}...`}
           </>
         ) : (
           <>
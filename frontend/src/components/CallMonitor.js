@@ -1,13 +1,21 @@
 import React, { useEffect, useRef, useState } from 'react';
 import io from 'socket.io-client';
 import { Mic, MicOff, Loader } from 'lucide-react';
+import { buildAudioFrame, codecId, PCM_CODEC, toPcm16 } from '../audioFrame';
 import './CallMonitor.css';
 
 const SOCKET_URL = process.env.REACT_APP_SOCKET_URL || 'http://localhost:5001';
+// Stream short PCM slices for live partial transcripts instead of one blob per recording
+const STREAMING = process.env.REACT_APP_STREAMING_TRANSCRIPTION !== 'false';
+const STREAM_SLICE_MS = 250;
+const STREAM_SAMPLE_RATE = 16000;
+// Lowest alert severity this dashboard is sent: low, medium, high or critical
+const MIN_SEVERITY = process.env.REACT_APP_MIN_ALERT_SEVERITY || 'low';
 
-function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
+function CallMonitor({ sessionId, onAlert, onAlertUpdate, onTranscriptUpdate, onTranscriptPartial, onResync }) {
   const [isRecording, setIsRecording] = useState(false);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
+  const [isBackpressured, setIsBackpressured] = useState(false);
   const [audioLevel, setAudioLevel] = useState(0);
   const socketRef = useRef(null);
   const mediaRecorderRef = useRef(null);
@@ -15,9 +23,18 @@ function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
   const analyserRef = useRef(null);
   const streamRef = useRef(null);
   const isRecordingRef = useRef(false);
+  const frameSeqRef = useRef(0);
+  const streamerRef = useRef(null);
+  const lastVersionRef = useRef(0);
+  // While rejoining, replayed frames can interleave with live ones: track what arrived since the cursor
+  const resumeRef = useRef(null);
 
   useEffect(() => {
+    lastVersionRef.current = 0;
+    resumeRef.current = null;
     socketRef.current = io(SOCKET_URL, {
+      // WebSocket first: a long-polling handshake can land on a different backend worker
+      transports: ['websocket', 'polling'],
       reconnection: true,
       reconnectionDelay: 1000,
       reconnectionDelayMax: 5000,
@@ -26,18 +43,70 @@ function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
 
     socketRef.current.on('connect', () => {
       console.log('✅ Socket connected:', socketRef.current.id);
-      socketRef.current.emit('join_session', { session_id: sessionId });
+      // On a reconnect, ask only for the frames missed since the last one seen
+      const since = lastVersionRef.current;
+      resumeRef.current = { since, seen: new Set() };
+      socketRef.current.emit('join_session', { session_id: sessionId, min_severity: MIN_SEVERITY, since_version: since });
     });
 
-    socketRef.current.on('alert', (alert) => {
-      console.log('🔔 Alert received:', alert);
-      onAlert(alert);
+    socketRef.current.on('joined', (data) => {
+      if (data.session_id !== sessionId) return;
+      resumeRef.current = null;
+      if (data.resync) {
+        console.warn(`🔄 Missed more than the server buffers (now at version ${data.version}) - catching up over REST`);
+        lastVersionRef.current = Math.max(lastVersionRef.current, data.version);
+        onResync?.();
+      } else if (data.replayed) {
+        console.log(`⏪ Replayed ${data.replayed} missed frame(s)`);
+      }
     });
 
-    socketRef.current.on('transcript_update', (update) => {
-      console.log('📝 Transcript received:', update);
-      onTranscriptUpdate(update);
-      setIsAnalyzing(false);
+    // Everything one analysis pass produced, filtered server-side to MIN_SEVERITY
+    socketRef.current.on('session_frame', (frame) => {
+      if (frame.session_id !== sessionId) return;
+      const resume = resumeRef.current;
+      if (resume) {
+        if (frame.version <= resume.since || resume.seen.has(frame.version)) return;
+        resume.seen.add(frame.version);
+      } else if (frame.version <= lastVersionRef.current) {
+        return;
+      }
+      lastVersionRef.current = Math.max(lastVersionRef.current, frame.version);
+      frame.alerts.forEach((alert) => {
+        console.log('🔔 Alert received:', alert);
+        onAlert(alert);
+      });
+      // Alerts raised early from a partial agent stream get their full details later
+      frame.alert_updates.forEach((alert) => {
+        console.log('🔁 Alert updated:', alert);
+        onAlertUpdate?.(alert);
+      });
+      // Some agents missed the chunk deadline; their verdict for this chunk is unknown
+      if (frame.timed_out) {
+        console.warn(`⏰ Analysis timed out after ${frame.timed_out.deadline}s for: ${frame.timed_out.agents.join(', ')}`);
+      }
+      if (frame.rate_limited) {
+        console.warn(`🚦 No verdict (rate limited) for: ${frame.rate_limited.join(', ')}`);
+      }
+      if (frame.transcript) {
+        frame.transcript.forEach((update) => {
+          console.log('📝 Transcript received:', update);
+          onTranscriptUpdate(update);
+        });
+        setIsAnalyzing(false);
+      }
+    });
+
+    // Live window re-transcribed while the patient is still speaking
+    socketRef.current.on('transcript_partial', (update) => {
+      if (update.session_id === sessionId) onTranscriptPartial?.(update);
+    });
+
+    // The server's per-session queue is full: audio sent meanwhile is dropped
+    socketRef.current.on('backpressure', ({ active }) => {
+      console.warn(active ? '🚦 Server backlog full - chunk dropped' : '✅ Server backlog cleared');
+      setIsBackpressured(active);
+      if (active) setIsAnalyzing(false);
     });
 
     socketRef.current.on('disconnect', () => console.log('❌ Socket disconnected'));
@@ -61,35 +130,11 @@ function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
       source.connect(analyserRef.current);
       analyserRef.current.fftSize = 256;
 
-      const mimeType = MediaRecorder.isTypeSupported('audio/webm;codecs=opus')
-        ? 'audio/webm;codecs=opus'
-        : 'audio/webm';
-
-      const recorder = new MediaRecorder(stream, { mimeType });
-      mediaRecorderRef.current = recorder;
-      const chunks = [];
-
-      recorder.ondataavailable = (e) => {
-        if (e.data.size > 0) chunks.push(e.data);
-      };
-
-      recorder.onstop = () => {
-        if (chunks.length > 0) {
-          const blob = new Blob(chunks, { type: mimeType });
-          const reader = new FileReader();
-          reader.onloadend = () => {
-            const base64Audio = reader.result.split(',')[1];
-            socketRef.current?.emit('audio_chunk', {
-              session_id: sessionId,
-              audio: base64Audio
-            });
-            setIsAnalyzing(true);
-          };
-          reader.readAsDataURL(blob);
-        }
-      };
-
-      recorder.start();
+      if (STREAMING) {
+        startStreaming(source);
+      } else {
+        startRecorder(stream);
+      }
       isRecordingRef.current = true;
       setIsRecording(true);
       visualizeAudio();
@@ -99,8 +144,85 @@ function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
     }
   };
 
+  // One blob per recording, sent when it stops
+  const startRecorder = (stream) => {
+    const mimeType = MediaRecorder.isTypeSupported('audio/webm;codecs=opus')
+      ? 'audio/webm;codecs=opus'
+      : 'audio/webm';
+
+    const recorder = new MediaRecorder(stream, { mimeType });
+    mediaRecorderRef.current = recorder;
+    const chunks = [];
+
+    recorder.ondataavailable = (e) => {
+      if (e.data.size > 0) chunks.push(e.data);
+    };
+
+    const sampleRate = audioContextRef.current.sampleRate;
+    recorder.onstop = async () => {
+      if (chunks.length > 0) {
+        // Raw bytes in a binary frame: no data URL, no base64 on the wire
+        const blob = new Blob(chunks, { type: mimeType });
+        const frame = buildAudioFrame(
+          sessionId, frameSeqRef.current++, codecId(mimeType), sampleRate, await blob.arrayBuffer()
+        );
+        socketRef.current?.emit('audio_frame', frame);
+        setIsAnalyzing(true);
+      }
+    };
+
+    recorder.start();
+  };
+
+  // Timesliced 16 kHz PCM frames; the server re-transcribes a rolling window
+  const startStreaming = (source) => {
+    const context = audioContextRef.current;
+    const processor = context.createScriptProcessor(4096, 1, 1);
+    const sliceLength = Math.round(context.sampleRate * STREAM_SLICE_MS / 1000);
+    let pending = [];
+    let pendingLength = 0;
+
+    const flush = () => {
+      if (!pendingLength) return;
+      const samples = new Float32Array(pendingLength);
+      let offset = 0;
+      pending.forEach(block => { samples.set(block, offset); offset += block.length; });
+      pending = [];
+      pendingLength = 0;
+      const pcm = toPcm16(samples, context.sampleRate, STREAM_SAMPLE_RATE);
+      socketRef.current?.emit('audio_stream', buildAudioFrame(
+        sessionId, frameSeqRef.current++, PCM_CODEC, STREAM_SAMPLE_RATE, pcm.buffer
+      ));
+    };
+
+    processor.onaudioprocess = (e) => {
+      const block = e.inputBuffer.getChannelData(0);
+      pending.push(new Float32Array(block));
+      pendingLength += block.length;
+      if (pendingLength >= sliceLength) flush();
+    };
+    source.connect(processor);
+    processor.connect(context.destination);
+    streamerRef.current = { processor, flush };
+  };
+
+  const stopStreaming = () => {
+    const { processor, flush } = streamerRef.current;
+    streamerRef.current = null;
+    processor.onaudioprocess = null;
+    processor.disconnect();
+    flush();
+    // Empty payload: end of stream, the server finalizes what it has
+    socketRef.current?.emit('audio_stream', buildAudioFrame(
+      sessionId, frameSeqRef.current++, PCM_CODEC, STREAM_SAMPLE_RATE, new ArrayBuffer(0)
+    ));
+  };
+
   const stopRecording = () => {
     isRecordingRef.current = false;
+    if (streamerRef.current) {
+      stopStreaming();
+    }
     if (mediaRecorderRef.current && mediaRecorderRef.current.state === 'recording') {
       mediaRecorderRef.current.stop();
     }
@@ -130,6 +252,7 @@ function CallMonitor({ sessionId, onAlert, onTranscriptUpdate }) {
   };
 
   const statusText = () => {
+    if (isBackpressured) return '🚦 Server is catching up — recent audio was not analyzed';
     if (isAnalyzing) return '⏳ Analyzing with AI agents...';
     if (isRecording) return '🎤 Recording — press Stop when done';
     return '🎙️ Click "Start Recording" to begin';
@@ -2,13 +2,13 @@ import React, { useEffect, useRef } from 'react';
 import { FileText } from 'lucide-react';
 import './TranscriptView.css';
 
-function TranscriptView({ transcript }) {
+function TranscriptView({ transcript, partial = '' }) {
   const transcriptEndRef = useRef(null);
 
   useEffect(() => {
     // Auto-scroll to bottom when new transcript arrives
     transcriptEndRef.current?.scrollIntoView({ behavior: 'smooth' });
-  }, [transcript]);
+  }, [transcript, partial]);
 
   const fullText = transcript.map(e => e.text?.trim()).filter(Boolean).join(' ');
 
@@ -20,7 +20,7 @@ function TranscriptView({ transcript }) {
       </div>
 
       <div className="transcript-container">
-        {transcript.length === 0 ? (
+        {transcript.length === 0 && !partial ? (
           <div className="no-transcript">
             <FileText size={48} color="#d1d5db" />
             <p>No transcript yet</p>
@@ -29,6 +29,7 @@ function TranscriptView({ transcript }) {
         ) : (
           <div className="transcript-text">
             {fullText}
+            {partial && <span className="transcript-partial"> {partial}</span>}
             <div ref={transcriptEndRef} />
           </div>
         )}